@@ -0,0 +1,336 @@
+"""
+Shared tool-calling loop for the review, conference and ideation agents.
+
+The conversation grows across turns: each model reply (with its tool
+calls) and every tool result stay in the history, so the model always
+sees what it already found. A tool call that repeats an earlier name and
+arguments within the run is not executed again. A run stops after
+`max_iterations` tool rounds or once `max_tokens` (estimated, or as
+reported by the model) are used; the answer is then written from what
+was gathered so far.
+
+Structured agents bind their output schema as one more tool next to the
+search tools and pass it as `schema`: the model searches, then answers by
+calling the schema tool, so a run needs no extra round trip to format the
+answer. (with_structured_output on a tool-bound model would replace the
+search tools.) If the model answers in plain text or the budget runs out,
+`writer` (the model with structured output) writes the answer from the
+gathered notes instead.
+
+Streaming callers read the answer while it is generated: partial_answer
+parses the schema tool's arguments, or the writer's JSON text, from the
+chunks received so far.
+
+arun_agent is the loop as a coroutine (ainvoke on the model, tool calls
+as tasks); run_agent runs it on the shared event loop (aio.py).
+"""
+import json
+import os
+
+import aio
+import tracing
+from conversation_memory import estimate_tokens
+from tool_cache import normalize_args
+from tools import arun_tool_calls, run_tool_calls
+
+MAX_ITERATIONS = int(os.getenv("AGENT_MAX_ITERATIONS", "4"))
+MAX_TOKENS = int(os.getenv("AGENT_MAX_TOKENS", "60000"))
+
+writer_prompt = """
+Research notes gathered with the search tools for this request (numbered results per search):
+
+{notes}
+
+Answer the request above from these notes and what you already know.
+"""
+
+finish_prompt = "Search only as much as you need. When you have enough information, give the final answer by calling the `{name}` tool."
+
+# Streamed runs: the answer is written by `writer`, whose JSON text streams (tool-call arguments may arrive whole)
+search_finish_prompt = (
+    "Search only as much as you need. When you have enough information, reply with just DONE: "
+    "the `{name}` answer is written from your search results in the next step."
+)
+
+
+def _text(content) -> str:
+    if isinstance(content, list):
+        return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return content or ""
+
+
+def _message_tokens(messages) -> int:
+    total = 0
+    for m in messages:
+        content = m[1] if isinstance(m, tuple) else getattr(m, "content", m)
+        if hasattr(content, "model_dump_json"):  # structured output
+            content = content.model_dump_json()
+        total += estimate_tokens(_text(content))
+        for call in getattr(m, "tool_calls", None) or []:
+            total += estimate_tokens(json.dumps(call["args"], default=str))
+    return total
+
+
+def _call_key(call) -> str:
+    return json.dumps([call["name"], normalize_args(call["args"])], sort_keys=True, default=str)
+
+
+def count_tokens(prompt, response) -> int:
+    """Tokens used by one LLM round trip (reported usage when the model gives it, else estimated)."""
+    usage = getattr(response, "usage_metadata", None) or {}
+    if usage.get("total_tokens"):
+        return usage["total_tokens"]
+    return _message_tokens(prompt) + _message_tokens([response])
+
+
+def answer_tool_calls(tool_calls, tools, query=None, results=None, verbose=False, run_id=None, schema=None):
+    """
+    Runs the tool calls of one model turn, skipping any already in `results`
+    (call key -> note from earlier in the run). Returns the ToolMessages in
+    call order, the notes of the calls that ran, and how many were reused.
+    A call to the `schema` tool that reached here did not validate: its
+    ToolMessage carries the validation error so the model can fix it.
+    """
+    messages, to_run, reused = _plan_tool_calls(tool_calls, tools, results, verbose, schema)
+    tool_messages = run_tool_calls(to_run, tools, query=query, run_id=run_id)
+    return _answers(tool_calls, to_run, tool_messages, messages, verbose), _notes(to_run, tool_messages), reused
+
+
+async def aanswer_tool_calls(tool_calls, tools, query=None, results=None, verbose=False, run_id=None, schema=None):
+    """answer_tool_calls as a coroutine."""
+    messages, to_run, reused = _plan_tool_calls(tool_calls, tools, results, verbose, schema)
+    tool_messages = await arun_tool_calls(to_run, tools, query=query, run_id=run_id)
+    return _answers(tool_calls, to_run, tool_messages, messages, verbose), _notes(to_run, tool_messages), reused
+
+
+def _plan_tool_calls(tool_calls, tools, results, verbose, schema=None):
+    """(call id -> ToolMessage for calls that are not run, calls to run, how many were reused)"""
+    from langchain_core.messages import ToolMessage
+    results = results or {}
+    known = {t.name for t in tools}
+    messages, to_run, reused = {}, [], 0
+    for call in tool_calls:
+        key = _call_key(call)
+        if key in results or any(_call_key(c) == key for c in to_run):
+            reused += 1
+            content = f"Tool '{call['name']}' was already called with these arguments; use the earlier result."
+        elif schema is not None and call["name"] == schema.__name__:
+            content = _schema_call_error(call, schema)
+        elif call["name"] not in known:
+            content = f"Error: unknown tool '{call['name']}'"
+        else:
+            to_run.append(call)
+            if verbose:
+                print(f" Model invoked tool: {call['name']} | Args: {call['args']}")
+            continue
+        messages[call["id"]] = ToolMessage(content=content, name=call["name"], tool_call_id=call["id"])
+    return messages, to_run, reused
+
+
+def _schema_call_error(call, schema) -> str:
+    try:
+        schema.model_validate(call["args"])
+    except ValueError as e:
+        return f"Error: invalid arguments for '{schema.__name__}', fix them and call it again.\n{e}"
+    return f"'{schema.__name__}' answer received."
+
+
+def _answers(tool_calls, to_run, tool_messages, messages, verbose):
+    for call, tool_message in zip(to_run, tool_messages):
+        if verbose:
+            print(f" Tool result snippet: {tool_message.content[:300]}...")
+        messages[call["id"]] = tool_message
+    return [messages[call["id"]] for call in tool_calls]
+
+
+def _notes(to_run, tool_messages):
+    return {
+        _call_key(call): f"{call['name']}({json.dumps(call['args'], default=str)}):\n{tool_message.content}"
+        for call, tool_message in zip(to_run, tool_messages)
+    }
+
+
+def notes_messages(request, results):
+    """The original request plus the tool results as plain notes, for the final answer."""
+    prompt = list(request)
+    if results:
+        prompt.append(("human", writer_prompt.format(notes="\n\n".join(results.values()))))
+    return prompt
+
+
+def schema_answer(response, schema):
+    """The schema instance if the model answered by calling the schema tool, else None."""
+    for call in getattr(response, "tool_calls", None) or []:
+        if call["name"] == schema.__name__:
+            try:
+                return schema.model_validate(call["args"])
+            except ValueError:
+                return None
+    return None
+
+
+def with_finish_prompt(messages, schema, prompt: str = finish_prompt):
+    messages = list(messages)
+    messages.insert(1, ("system", prompt.format(name=schema.__name__)))
+    return messages
+
+
+def partial_answer(message, schema):
+    """
+    The schema answer in a streamed message (its chunks added together) so
+    far: the `schema` tool call's arguments, or else JSON text content.
+    Returns (dict or None, complete).
+    """
+    from langchain_core.utils.json import parse_partial_json
+    chunks = getattr(message, "tool_call_chunks", None) or []
+    calls = [c for c in chunks if c.get("name") == schema.__name__]
+    if chunks and not calls:
+        return None, False  # a search turn
+    text = (calls[0].get("args") or "") if calls else _text(message.content)
+    try:
+        return json.loads(text), True
+    except ValueError:
+        pass
+    try:
+        parsed = parse_partial_json(text)
+    except ValueError:
+        parsed = None
+    return (parsed if isinstance(parsed, dict) else None), False
+
+
+class AgentRun:
+    """State of one loop run: the growing message history plus its budget counters."""
+
+    def __init__(self, messages, tools, query=None, max_iterations=MAX_ITERATIONS, max_tokens=MAX_TOKENS, verbose=False,
+                 schema=None):
+        self.messages = list(messages)
+        self.request_length = len(self.messages)
+        self.tools = tools
+        self.query = query
+        self.max_iterations = max_iterations
+        self.max_tokens = max_tokens
+        self.verbose = verbose
+        self.schema = schema
+        self.iterations = 0
+        self.tokens = 0
+        self.llm_calls = 0
+        self.tool_calls = 0
+        self.reused_calls = 0
+        self.stop_reason = None
+        self.results = {}   # call key -> note with the tool output, for this run
+
+    def count(self, prompt, response):
+        self.llm_calls += 1
+        self.tokens += count_tokens(prompt, response)
+
+    def over_budget(self) -> bool:
+        if self.iterations >= self.max_iterations:
+            self.stop_reason = "max_iterations"
+        elif self.tokens >= self.max_tokens:
+            self.stop_reason = "max_tokens"
+        return self.stop_reason is not None
+
+    def run_tools(self, response):
+        """Runs the new tool calls in `response` and appends it plus one ToolMessage per call."""
+        self._add_tool_results(response, *answer_tool_calls(
+            response.tool_calls, self.tools, self.query, self.results, self.verbose, schema=self.schema,
+        ))
+
+    async def arun_tools(self, response):
+        self._add_tool_results(response, *await aanswer_tool_calls(
+            response.tool_calls, self.tools, self.query, self.results, self.verbose, schema=self.schema,
+        ))
+
+    def _add_tool_results(self, response, tool_messages, new_results, reused):
+        self.iterations += 1
+        self.results.update(new_results)
+        self.tool_calls += len(new_results)
+        self.reused_calls += reused
+        self.messages.append(response)
+        self.messages.extend(tool_messages)
+
+    def writer_messages(self):
+        return notes_messages(self.messages[:self.request_length], self.results)
+
+    def finish(self):
+        tracing.annotate(
+            agent_iterations=self.iterations,
+            agent_llm_calls=self.llm_calls,
+            agent_tool_calls=self.tool_calls,
+            agent_reused_calls=self.reused_calls,
+            agent_tokens=self.tokens,
+            agent_stop=self.stop_reason or "done",
+        )
+        if self.stop_reason and self.verbose:
+            print(f" Agent loop stopped early ({self.stop_reason})")
+
+
+def run_agent(llm, messages, tools, query=None, schema=None, writer=None, final_llm=None,
+              max_iterations=MAX_ITERATIONS, max_tokens=MAX_TOKENS, verbose=False):
+    """Runs the tool loop (arun_agent) and returns (answer, run)."""
+    return aio.run(arun_agent(llm, messages, tools, query, schema, writer, final_llm, max_iterations, max_tokens, verbose))
+
+
+async def arun_agent(llm, messages, tools, query=None, schema=None, writer=None, final_llm=None,
+                     max_iterations=MAX_ITERATIONS, max_tokens=MAX_TOKENS, verbose=False):
+    """
+    Runs the tool loop and returns (answer, run).
+    `llm` has the tools (and `schema`, if given) bound. With `schema` the
+    answer is a schema instance, taken from the model's call to the schema
+    tool or else written by `writer`. Without it, the answer is the model's
+    last message; when the budget runs out mid-loop, `final_llm` (the model
+    without tools) writes it from the notes so far.
+    """
+    if schema is not None:
+        messages = with_finish_prompt(messages, schema)
+    run = AgentRun(messages, tools, query, max_iterations, max_tokens, verbose, schema)
+    response = None
+    while not run.over_budget():
+        prompt = list(run.messages)
+        response = await llm.ainvoke(prompt)
+        run.count(prompt, response)
+        if schema is not None:
+            answer = schema_answer(response, schema)
+            if answer is not None:
+                run.finish()
+                return answer, run
+        if not getattr(response, "tool_calls", None):
+            break
+        await run.arun_tools(response)
+        response = None
+
+    if writer is not None:
+        prompt = run.writer_messages()
+        answer = await writer.ainvoke(prompt)
+        run.count(prompt, answer)
+    elif response is not None:
+        answer = response
+    else:
+        prompt = run.writer_messages() if final_llm is not None else list(run.messages)
+        answer = await (final_llm or llm).ainvoke(prompt)
+        run.count(prompt, answer)
+    run.finish()
+    return answer, run
+
+
+def stream_agent(llm, messages, tools, query=None, final_llm=None,
+                 max_iterations=MAX_ITERATIONS, max_tokens=MAX_TOKENS):
+    """Like run_agent for text answers, but yields the answer text as the model streams it."""
+    run = AgentRun(messages, tools, query, max_iterations, max_tokens)
+    while True:
+        if run.over_budget() and final_llm is not None:
+            model, prompt = final_llm, run.writer_messages()
+        else:
+            model, prompt = llm, list(run.messages)
+        response = None
+        for chunk in model.stream(prompt):
+            response = chunk if response is None else response + chunk
+            text = _text(chunk.content)
+            if text:
+                yield text
+        if response is not None:
+            run.count(prompt, response)
+        if response is None or not response.tool_calls or run.stop_reason:
+            break
+        run.run_tools(response)
+    run.finish()
@@ -0,0 +1,143 @@
+"""
+Shared event loop for the async pipelines (areview_papers,
+aget_conferences, aquery_level, arun_ideation_chat).
+
+Async clients are tied to the event loop they were created on: the
+Gemini HTTP session, the aiosqlite checkpointer of the work_agents
+graph. (Search tools run their sync clients in worker threads, on the
+pooled HTTP session of tools.py.) All of them live on one loop, run by a daemon thread
+started on first use, so they are created once and shared by every
+caller, whatever loop or thread it calls from:
+
+    result = await call(arun_graph(...), timeout=60)   # from any event loop
+    result = run(areview_papers("graph neural networks"))   # from sync code
+
+Cancelling the awaiting task (or a `timeout`) cancels the work on the
+shared loop too. The sync pipelines are thin wrappers that `run` their
+async versions, so both paths share the clients and the request
+coalescing.
+"""
+import asyncio
+import contextvars
+import os
+import queue
+import threading
+from concurrent.futures import Future, InvalidStateError
+
+PIPELINE_TIMEOUT = float(os.getenv("PIPELINE_TIMEOUT", "600"))
+
+_lock = threading.Lock()
+_loop = None
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    """The shared event loop, started on first call."""
+    global _loop
+    if _loop is None:
+        with _lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="aio", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def on_loop() -> bool:
+    try:
+        return asyncio.get_running_loop() is _loop
+    except RuntimeError:
+        return False
+
+
+def submit(coro) -> Future:
+    """
+    Schedules `coro` on the shared loop, in a copy of the caller's context
+    (so its spans nest under the caller's), and returns a concurrent Future.
+    Cancelling the Future cancels the task.
+    """
+    loop = get_loop()
+    context = contextvars.copy_context()
+    future = Future()
+
+    def start():
+        # The Future stays pending (not running) so that cancel() keeps working while the task runs
+        if future.cancelled():
+            coro.close()
+            return
+        task = loop.create_task(coro, context=context)
+        task.add_done_callback(lambda t: _copy_result(t, future))
+
+        def cancel(f):
+            if f.cancelled():
+                loop.call_soon_threadsafe(task.cancel)
+        future.add_done_callback(cancel)
+
+    loop.call_soon_threadsafe(start)
+    return future
+
+
+def _copy_result(task, future):
+    if task.cancelled():
+        future.cancel()
+        return
+    try:
+        if task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+    except InvalidStateError:
+        pass  # cancelled by the caller meanwhile
+
+
+async def _bounded(coro, timeout):
+    async with asyncio.timeout(timeout):
+        return await coro
+
+
+async def call(coro, timeout: float = None):
+    """Awaits `coro` on the shared loop; raises TimeoutError after `timeout` seconds (cancelling it)."""
+    if on_loop():
+        return await _bounded(coro, timeout)
+    return await asyncio.wrap_future(submit(_bounded(coro, timeout)))
+
+
+def run(coro, timeout: float = None):
+    """Sync counterpart of `call`, for code that is not running in an event loop."""
+    if on_loop():
+        coro.close()
+        raise RuntimeError("aio.run called from the shared event loop; await aio.call instead")
+    future = submit(_bounded(coro, timeout))
+    try:
+        return future.result()
+    except BaseException:
+        future.cancel()  # e.g. KeyboardInterrupt while waiting
+        raise
+
+
+def iterate(agen, timeout: float = None):
+    """
+    Runs the async generator `agen` on the shared loop and yields its items
+    here as they come. Closing this generator early cancels `agen`.
+    """
+    items = queue.Queue()
+
+    async def pump():
+        try:
+            async with asyncio.timeout(timeout):
+                async for item in agen:
+                    items.put((True, item))
+            items.put((False, None))
+        except Exception as e:
+            items.put((False, e))
+
+    future = submit(pump())
+    try:
+        while True:
+            more, value = items.get()
+            if not more:
+                if value is not None:
+                    raise value
+                return
+            yield value
+    finally:
+        future.cancel()
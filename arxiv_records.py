@@ -0,0 +1,126 @@
+"""
+Structured arXiv search for the literature review agents.
+
+The `arxiv` tool returns one typed record per paper instead of a text
+blob: id, title, authors, published year, abs/pdf URLs and abstract. The
+review model then names papers by arXiv id and writes only
+key_contribution, relevance and the summary; review.py fills the factual
+fields of SimplePaperInfo from the records (see paper_fields). Records
+seen by this process are kept in memory, and ids the model names that
+were not seen (e.g. after a restart) are fetched in one id_list query.
+"""
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+MAX_RESULTS = int(os.getenv("ARXIV_MAX_RESULTS", "10"))
+# Upper bound on what a search may ask for (the model picks max_results); 100 is one arXiv API page
+MAX_RESULTS_CAP = int(os.getenv("ARXIV_MAX_RESULTS_CAP", "100"))
+MAX_REMEMBERED = 2000
+
+ARXIV_ID = re.compile(r"(\d{4}\.\d{4,5}|[a-z\-]+(?:\.[A-Z]{2})?/\d{7})(?:v\d+)?", re.IGNORECASE)
+
+_lock = threading.Lock()
+_known = OrderedDict()   # arXiv id -> record, most recently used last
+
+
+def normalize_id(value) -> str:
+    """Bare arXiv id without version from an id, "arXiv:..." or abs/pdf URL; None if there is none."""
+    match = ARXIV_ID.search(str(value or ""))
+    return match.group(1) if match else None
+
+
+def record_from_result(result) -> dict:
+    """Turns an arxiv.Result into a plain, JSON-serializable record."""
+    arxiv_id = normalize_id(result.entry_id)
+    return {
+        "id": arxiv_id,
+        "title": " ".join(result.title.split()),
+        "authors": [author.name for author in result.authors],
+        "year": result.published.year if result.published else None,
+        "abs_url": f"https://arxiv.org/abs/{arxiv_id}",
+        "pdf_url": f"https://arxiv.org/pdf/{arxiv_id}",
+        "abstract": " ".join(result.summary.split()),
+    }
+
+
+def remember(records):
+    """Keeps records from a search so their papers can be filled in later without another request."""
+    if not isinstance(records, list):
+        return
+    with _lock:
+        for record in records:
+            if isinstance(record, dict) and record.get("id"):
+                _known[record["id"]] = record
+                _known.move_to_end(record["id"])
+        while len(_known) > MAX_REMEMBERED:
+            _known.popitem(last=False)
+
+
+def search(query: str, max_results: int = MAX_RESULTS):
+    """Search arXiv for research papers. Returns one record per paper with its arXiv id, title, authors, year, links and abstract."""
+    import arxiv
+    from tools import get_arxiv_client
+    max_results = max(1, min(int(max_results or MAX_RESULTS), MAX_RESULTS_CAP))
+    request = arxiv.Search(query=query[:300], max_results=max_results)
+    records = [record_from_result(r) for r in get_arxiv_client().results(request)]
+    remember(records)
+    return records
+
+
+def _fetch(ids):
+    import arxiv
+    from tools import get_arxiv_client
+    request = arxiv.Search(id_list=list(ids), max_results=len(ids))
+    return [record_from_result(r) for r in get_arxiv_client().results(request)]
+
+
+def lookup(ids) -> dict:
+    """Records for arXiv ids (any form accepted by normalize_id), fetching the ones not seen yet. Unknown ids are left out."""
+    wanted = {normalize_id(i) for i in ids} - {None}
+    with _lock:
+        found = {i: _known[i] for i in wanted if i in _known}
+    missing = sorted(wanted - set(found))
+    if missing:
+        from rate_limiter import call_with_retry
+        try:
+            records = call_with_retry("arxiv", _fetch, missing)
+        except Exception as e:
+            logger.warning("Could not fetch arXiv records %s: %s", missing, e)
+            records = []
+        remember(records)
+        found.update({r["id"]: r for r in records if r["id"] in wanted})
+    return found
+
+
+def remember_papers(papers):
+    """Adds library papers with arXiv links as records, so a review written from the library fills in the same way."""
+    records = []
+    for paper in papers:
+        arxiv_id = normalize_id(paper.get("link")) if "arxiv.org" in (paper.get("link") or "") else None
+        if arxiv_id:
+            records.append({
+                "id": arxiv_id,
+                "title": paper["title"],
+                "authors": paper.get("authors") or [],
+                "year": paper.get("year"),
+                "abs_url": f"https://arxiv.org/abs/{arxiv_id}",
+                "pdf_url": f"https://arxiv.org/pdf/{arxiv_id}",
+                "abstract": paper.get("abstract"),
+            })
+    remember(records)
+
+
+def paper_fields(record: dict) -> dict:
+    """The SimplePaperInfo fields a record fills directly."""
+    return {
+        "title": record["title"],
+        "authors": record["authors"] or None,
+        "year": record["year"],
+        "link": record["abs_url"],
+        "abstract": record["abstract"],
+    }
@@ -0,0 +1,281 @@
+"""
+Shared backend for the Streamlit front-ends.
+
+The UIs only call the functions below. By default they run the pipelines
+in-process on the warm, lazily built clients from tools.py. Set BACKEND_URL
+to send every call to one backend server instead, so the UI processes
+never load the LLM/search stack:
+
+    python backend.py --port 8600
+    BACKEND_URL=http://localhost:8600 streamlit run review_ui.py
+"""
+import argparse
+import importlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BACKEND_URL = os.getenv("BACKEND_URL", "").rstrip("/")
+# The server has no authentication and spends the operator's Gemini/Tavily keys: local only unless asked
+BACKEND_HOST = os.getenv("BACKEND_HOST", "127.0.0.1")
+REQUEST_TIMEOUT = float(os.getenv("BACKEND_TIMEOUT", "600"))
+
+# Public name -> (module, function) that implements it in-process
+PIPELINES = {
+    "review_papers": ("review", "review_papers"),
+    "stream_review": ("review", "stream_review"),
+    "get_conferences": ("conference", "get_conferences"),
+    "upcoming_deadlines": ("conference_store", "upcoming_deadlines"),
+    "run_ideation_chat": ("ideation", "run_ideation_chat"),
+    "stream_ideation_chat": ("ideation", "stream_ideation_chat"),
+    "summarize_conversation": ("conversation_memory", "summarize_turns"),
+}
+# Pipelines that yield their output; sent as NDJSON lines ({"text": ...} for strings)
+STREAMS = {"stream_review", "stream_ideation_chat"}
+
+# Background jobs (jobs.py): the pipelines they may run, and the calls that manage them
+JOB_PIPELINES = {"review_papers", "stream_review", "get_conferences"}
+PIPELINES.update({
+    "submit_job": ("jobs", "submit"),
+    "job_status": ("jobs", "status"),
+    "cancel_job": ("jobs", "cancel"),
+})
+
+
+def _local(name):
+    module, function = PIPELINES[name]
+    return getattr(importlib.import_module(module), function)
+
+
+def _message_tuples(kwargs):
+    """JSON turns (role, text) messages into lists; the pipelines take tuples."""
+    return {k: [tuple(m) for m in v] if k in ("conversation", "history", "turns") else v for k, v in kwargs.items()}
+
+
+def warm():
+    """Builds every client and chain up front so the first request does not pay for it."""
+    import aio
+    from tools import get_llm, get_tools, get_tavily_new, get_tavily_cfp
+    from review import get_review_llm, get_review_writer
+    from work_agents import get_graph
+    from conference import get_conference_llm, get_conference_writer
+    from ideation import get_agent, get_ideation_llm
+    from vector_index import get_embedder
+    get_llm()
+    get_tools()
+    get_tavily_new()
+    get_tavily_cfp()
+    get_review_llm()
+    get_review_writer()
+    get_conference_llm()
+    get_conference_writer()
+    get_agent()
+    get_ideation_llm()
+    get_embedder()
+    aio.run(get_graph())  # starts the shared event loop and opens the graph checkpointer on it
+
+
+# -------------------------------
+# Client side (used by the UIs)
+# -------------------------------
+_session_lock = threading.Lock()
+_session = None
+
+
+def _client_session():
+    """Keep-alive connection pool to the backend server."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            _session = requests.Session()
+            _session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+            _session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=32))
+    return _session
+
+
+def _remote(name, payload):
+    try:
+        response = _client_session().post(f"{BACKEND_URL}/{name}", json=payload, timeout=REQUEST_TIMEOUT)
+        if response.headers.get("Content-Type", "").startswith("application/json"):
+            return response.json()  # pipeline result, or the server's {"error": ...}
+        response.raise_for_status()
+        return {"error": f"Unexpected backend response ({response.status_code})"}
+    except Exception as e:
+        return {"error": f"Backend request failed: {e}"}
+
+
+def _remote_stream(name, payload):
+    with _client_session().post(f"{BACKEND_URL}/{name}", json=payload, stream=True, timeout=REQUEST_TIMEOUT) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            event = json.loads(line)
+            if "error" in event:
+                raise RuntimeError(event["error"])
+            yield event["text"] if "text" in event else event
+
+
+def _call(name, **kwargs):
+    if BACKEND_URL:
+        return _remote(name, kwargs)
+    return _local(name)(**kwargs)
+
+
+def review_papers(user_query: str, system_prompt: str = None, history=(), map_reduce: bool = False):
+    kwargs = {"user_query": user_query}
+    if system_prompt:
+        kwargs["system_prompt"] = system_prompt
+    if history:
+        kwargs["history"] = [tuple(m) for m in history]
+    if map_reduce:
+        kwargs["map_reduce"] = True
+    return _call("review_papers", **kwargs)
+
+
+def stream_review(user_query: str, system_prompt: str = None, history=()):
+    """Yields {"paper": ...} as each paper of the review is written, then {"review": ...}."""
+    kwargs = {"user_query": user_query}
+    if system_prompt:
+        kwargs["system_prompt"] = system_prompt
+    if history:
+        kwargs["history"] = [tuple(m) for m in history]
+    if BACKEND_URL:
+        return _remote_stream("stream_review", kwargs)
+    return _local("stream_review")(**kwargs)
+
+
+def get_conferences(query: str):
+    return _call("get_conferences", query=query)
+
+
+def submit_job(pipeline: str, **kwargs):
+    """Runs a pipeline (one of JOB_PIPELINES) in the background; returns the job with its `id`, or {"error": ...}."""
+    if "history" in kwargs:
+        kwargs["history"] = [tuple(m) for m in kwargs["history"]]
+    return _call("submit_job", pipeline=pipeline, kwargs=kwargs)
+
+
+def job_status(job_id: str):
+    """The job's status ("queued", "running", "done", "failed" or "cancelled"), progress, items and result."""
+    return _call("job_status", job_id=job_id)
+
+
+def cancel_job(job_id: str):
+    return _call("cancel_job", job_id=job_id)
+
+
+def upcoming_deadlines(days: int = 30, topic: str = None):
+    return _call("upcoming_deadlines", days=days, topic=topic)
+
+
+def run_ideation_chat(user_query: str, conversation, session_cache: dict = None):
+    conversation = [tuple(m) for m in conversation]
+    if BACKEND_URL:
+        # The router cache is per UI session; a remote backend relies on its own caches instead
+        return _remote("run_ideation_chat", {"user_query": user_query, "conversation": conversation})
+    return _local("run_ideation_chat")(user_query, conversation, session_cache)
+
+
+def summarize_conversation(summary: str, turns):
+    """Summarizer for ConversationMemory that runs wherever the pipelines run."""
+    result = _call("summarize_conversation", summary=summary, turns=[tuple(m) for m in turns])
+    if isinstance(result, dict):
+        raise RuntimeError(result.get("error", "Summarization failed"))
+    return result
+
+
+def stream_ideation_chat(user_query: str, conversation, session_cache: dict = None):
+    conversation = [tuple(m) for m in conversation]
+    if BACKEND_URL:
+        return _remote_stream("stream_ideation_chat", {"user_query": user_query, "conversation": conversation})
+    return _local("stream_ideation_chat")(user_query, conversation, session_cache)
+
+
+# -------------------------------
+# Server side
+# -------------------------------
+class BackendHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive for the UI connection pools
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, payload):
+        data = (json.dumps(payload, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/stats":
+            import jobs
+            import prefetch
+            import rate_limiter
+            self._send_json(200, {"rate_limits": rate_limiter.stats(), "prefetch": prefetch.stats(), "jobs": jobs.stats()})
+        elif self.path == "/metrics":
+            import tracing
+            body = tracing.prometheus_text().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        name = self.path.strip("/")
+        if name not in PIPELINES:
+            self._send_json(404, {"error": f"Unknown pipeline: {name}"})
+            return
+        try:
+            kwargs = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        except ValueError as e:
+            self._send_json(400, {"error": f"Invalid JSON: {e}"})
+            return
+        kwargs = _message_tuples(kwargs)
+
+        if name in STREAMS:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                for item in _local(name)(**kwargs):
+                    self._send_chunk(item if isinstance(item, dict) else {"text": item})
+            except Exception as e:
+                self._send_chunk({"error": str(e)})
+            self.wfile.write(b"0\r\n\r\n")
+            return
+
+        try:
+            self._send_json(200, _local(name)(**kwargs))
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+
+
+def serve(host: str = BACKEND_HOST, port: int = 8600):
+    warm()
+    server = ThreadingHTTPServer((host, port), BackendHandler)
+    print(f"Research backend listening on http://{host}:{port}")
+    if host not in ("127.0.0.1", "localhost", "::1"):
+        print(" Warning: the backend has no authentication; anyone who can reach this address can run pipelines on your API keys")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the shared research backend server.")
+    parser.add_argument("--host", default=BACKEND_HOST, help="Interface to bind (default: 127.0.0.1; 0.0.0.0 for every interface).")
+    parser.add_argument("--port", type=int, default=8600)
+    args = parser.parse_args()
+    serve(args.host, args.port)
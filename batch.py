@@ -0,0 +1,141 @@
+"""
+Batch mode for literature reviews and conference searches.
+
+Reads one topic per line from a file (or stdin), runs the pipeline for
+several topics at once and appends one JSON line per finished topic.
+Topics that already have a successful line in the output file are
+skipped, so a crashed batch picks up where it stopped.
+
+    python batch.py review topics.txt -o reviews.jsonl --concurrency 4
+    cat topics.txt | python batch.py conferences -o conferences.jsonl
+"""
+import argparse
+import functools
+import importlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+PIPELINES = {
+    "review": ("review", "review_papers"),
+    "conferences": ("conference", "get_conferences"),
+}
+
+
+def read_topics(source):
+    """One topic per line; blank lines, '#' comments and repeats are ignored."""
+    topics, seen = [], set()
+    for line in source:
+        topic = line.strip()
+        if topic and not topic.startswith("#") and topic not in seen:
+            seen.add(topic)
+            topics.append(topic)
+    return topics
+
+
+def finished_topics(output_path: str):
+    """Topics that already have a successful result in `output_path`."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # a line cut short by a crash
+            if record.get("status") == "ok":
+                done.add(record["topic"])
+    return done
+
+
+def _run_one(pipeline, topic: str):
+    started = time.perf_counter()
+    try:
+        result = pipeline(topic)
+        status = "error" if isinstance(result, dict) and "error" in result else "ok"
+    except Exception as e:
+        result, status = {"error": str(e)}, "error"
+    return {"topic": topic, "status": status, "seconds": round(time.perf_counter() - started, 2), "result": result}
+
+
+def run_batch(kind: str, topics, output_path: str, concurrency: int = 4, resume: bool = True, **options):
+    """Runs `kind` ("review" or "conferences") for each topic and returns the new records."""
+    module, function = PIPELINES[kind]
+    pipeline = getattr(importlib.import_module(module), function)
+    if options:
+        pipeline = functools.partial(pipeline, **options)
+
+    done = finished_topics(output_path) if resume else set()
+    pending = [t for t in topics if t not in done]
+    if done:
+        print(f"Resuming: {len(topics) - len(pending)} of {len(topics)} topics already done")
+
+    records = []
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(_run_one, pipeline, topic) for topic in pending]
+        for future in as_completed(futures):
+            record = future.result()
+            # Written as each topic finishes, so a crash loses at most the topics still running
+            out.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            out.flush()
+            records.append(record)
+            print(f"[{len(records)}/{len(pending)}] {record['status']:<5} {record['seconds']:>7.1f}s  {record['topic']}")
+    return records
+
+
+def print_summary(records, wall_seconds: float):
+    if not records:
+        print("\nNothing to do.")
+        return
+    print("\nPer-topic timing:")
+    for record in sorted(records, key=lambda r: -r["seconds"]):
+        print(f"  {record['seconds']:>7.1f}s  {record['status']:<5}  {record['topic']}")
+    busy = sum(r["seconds"] for r in records)
+    times = sorted(r["seconds"] for r in records)
+    failed = sum(1 for r in records if r["status"] != "ok")
+    print(f"\nTopics: {len(records)} ({failed} failed)")
+    print(f"Wall time: {wall_seconds:.1f}s | sum of topic times: {busy:.1f}s | "
+          f"parallel speed-up: {busy / wall_seconds if wall_seconds else 0:.1f}x")
+    print(f"Per topic: min {times[0]:.1f}s, median {times[len(times) // 2]:.1f}s, max {times[-1]:.1f}s")
+
+    # Long queues or throttling mean the concurrency is above what the providers allow
+    import rate_limiter
+    for provider, s in rate_limiter.stats().items():
+        print(f"  {provider:<10} {s['calls']:>4} calls, queued {s['queued_seconds']:.1f}s "
+              f"(max {s['max_queued_seconds']:.1f}s), {s['retries']} retries, {s['throttled']} throttled")
+
+    import prefetch
+    for tool, s in prefetch.stats()["tools"].items():
+        print(f"  prefetch {tool:<10} {s.get('started', 0):>4} started, {s.get('hits', 0)} used, "
+              f"{s.get('wasted', 0)} wasted (hit rate {s['hit_rate']:.0%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run literature reviews or conference searches for many topics.")
+    parser.add_argument("kind", choices=sorted(PIPELINES))
+    parser.add_argument("topics", nargs="?", default="-", help="File with one topic per line ('-' for stdin)")
+    parser.add_argument("-o", "--output", help="JSONL output file (default: <kind>_batch.jsonl)")
+    parser.add_argument("-c", "--concurrency", type=int, default=int(os.getenv("BATCH_CONCURRENCY", "4")))
+    parser.add_argument("--no-resume", action="store_true", help="Run every topic even if it is already in the output")
+    parser.add_argument("--map-reduce", action="store_true", help="Reviews only: cover up to REVIEW_MAX_PAPERS papers per topic (synthesis.py)")
+    args = parser.parse_args()
+    if args.map_reduce and args.kind != "review":
+        parser.error("--map-reduce only applies to reviews")
+
+    if args.topics == "-":
+        topics = read_topics(sys.stdin)
+    else:
+        with open(args.topics, encoding="utf-8") as f:
+            topics = read_topics(f)
+
+    started = time.perf_counter()
+    records = run_batch(
+        args.kind, topics, args.output or f"{args.kind}_batch.jsonl",
+        concurrency=max(1, args.concurrency), resume=not args.no_resume,
+        **({"map_reduce": True} if args.map_reduce else {}),
+    )
+    print_summary(records, time.perf_counter() - started)
@@ -0,0 +1,97 @@
+"""
+Import-time benchmark for the app modules.
+
+Each module is imported in a fresh interpreter (what a `streamlit run` cold
+start pays) with outbound sockets blocked, so any network I/O at import time
+fails the run. Use --compare <git-ref> to measure an older tree side by side.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --compare HEAD~1 --runs 7
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["tools", "review", "conference", "ideation", "backend", "work_agents", "review_ui", "literature_review_chat", "conference_ui", "ideation_ui"]
+
+# Runs inside the child interpreter: block the network, then time the import.
+PROBE = r"""
+import socket, sys, time
+def _blocked(*args, **kwargs):
+    raise RuntimeError("network access during import")
+socket.socket.connect = _blocked
+socket.create_connection = _blocked
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+"""
+
+
+def time_import(module: str, cwd: str):
+    env = {**os.environ, "GEMINI_API_KEY": os.getenv("GEMINI_API_KEY", "benchmark"), "TAVILY_API_KEY": os.getenv("TAVILY_API_KEY", "benchmark")}
+    proc = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module)],
+        cwd=cwd, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        last_line = (proc.stderr.strip().splitlines() or ["unknown error"])[-1]
+        return None, last_line
+    return float(proc.stdout.strip().splitlines()[-1]), None
+
+
+def bench_tree(cwd: str, runs: int):
+    results = {}
+    for module in MODULES:
+        if not os.path.exists(os.path.join(cwd, f"{module}.py")):
+            continue
+        samples, error = [], None
+        for _ in range(runs):
+            seconds, error = time_import(module, cwd)
+            if error:
+                break
+            samples.append(seconds)
+        results[module] = (statistics.median(samples), None) if samples and not error else (None, error)
+    return results
+
+
+def export_ref(ref: str, target: str):
+    archive = os.path.join(target, "tree.tar")
+    subprocess.run(["git", "-C", REPO_ROOT, "archive", "--format=tar", "-o", archive, ref], check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(target)
+    return target
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold import time of each app module.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module (median is reported).")
+    parser.add_argument("--compare", metavar="GIT_REF", help="Also benchmark this git revision.")
+    args = parser.parse_args()
+
+    current = bench_tree(REPO_ROOT, args.runs)
+    baseline = {}
+    if args.compare:
+        with tempfile.TemporaryDirectory() as tmp:
+            baseline = bench_tree(export_ref(args.compare, tmp), args.runs)
+
+    print(f"{'module':<24}{'current (s)':>14}" + (f"{args.compare:>16}" if args.compare else ""))
+    failed = False
+    for module, (seconds, error) in current.items():
+        row = f"{module:<24}" + (f"{seconds:>14.3f}" if error is None else f"{'FAILED':>14}")
+        if args.compare:
+            base_seconds, base_error = baseline.get(module, (None, "missing"))
+            row += f"{base_seconds:>16.3f}" if base_error is None else f"{'-':>16}"
+        print(row)
+        if error:
+            failed = True
+            print(f"    {error}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
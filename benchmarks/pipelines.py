@@ -0,0 +1,216 @@
+"""
+Offline end-to-end benchmark for review_papers, get_conferences and
+run_ideation_chat.
+
+Each run replays a fixture from benchmarks/fixtures through the real
+pipeline code, with the LLM and search tools swapped for the stand-ins in
+benchmarks/replay.py (fixed latency per call, no network). Every run gets
+a fresh interpreter and empty caches, so runs are independent. Reports
+end-to-end latency, LLM round trips, tool calls and prompt/response sizes.
+
+    python benchmarks/pipelines.py
+    python benchmarks/pipelines.py --save-baseline benchmarks/baseline.json
+    python benchmarks/pipelines.py --baseline benchmarks/baseline.json   # exits 1 on a regression
+
+New fixtures come from a run against the real services (needs API keys):
+
+    python benchmarks/pipelines.py --record review_papers "graph neural networks" -o benchmarks/fixtures/review_gnn.json
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+FIXTURE_DIR = os.path.join(BENCH_DIR, "fixtures")
+
+PIPELINES = {
+    "review_papers": ("review", "review_papers"),
+    "get_conferences": ("conference", "get_conferences"),
+    "run_ideation_chat": ("ideation", "run_ideation_chat"),
+}
+COUNT_METRICS = ["llm_calls", "tool_calls", "prompt_chars", "response_chars"]
+
+# Runs inside the child interpreter: block the network, install the stand-ins, time one pipeline call.
+CHILD = r"""
+import json, socket, sys, time
+def _blocked(*args, **kwargs):
+    raise RuntimeError("network access during an offline benchmark")
+socket.socket.connect = _blocked
+socket.create_connection = _blocked
+sys.path[:0] = [{repo!r}, {bench!r}]
+import importlib, replay
+with open({fixture!r}, encoding="utf-8") as f:
+    fixture = json.load(f)
+stats = replay.install(fixture, llm_latency={llm_latency}, tool_latency={tool_latency})
+module, function = {pipeline!r}
+pipeline = getattr(importlib.import_module(module), function)
+start = time.perf_counter()
+result = pipeline(**fixture["kwargs"])
+elapsed = time.perf_counter() - start
+ok = not (isinstance(result, dict) and "error" in result)
+print(json.dumps({{"seconds": elapsed, "ok": ok, "error": None if ok else str(result.get("error")), **stats.as_dict()}}))
+"""
+
+
+def child_env(cache_dir: str):
+    env = {
+        **os.environ,
+        "RESEARCH_CACHE_DIR": cache_dir,
+        "GEMINI_API_KEY": "benchmark",
+        "TAVILY_API_KEY": "benchmark",
+        "BACKEND_URL": "",
+    }
+    # Measure the pipelines, not the provider rate limits
+    for provider in ("GEMINI", "TAVILY", "ARXIV", "WIKIPEDIA"):
+        env[f"RATE_LIMIT_{provider}"] = "1000/1000"
+    return env
+
+
+def run_once(fixture_path: str, pipeline: str, llm_latency: float, tool_latency: float):
+    code = CHILD.format(
+        repo=REPO_ROOT, bench=BENCH_DIR, fixture=fixture_path, pipeline=PIPELINES[pipeline],
+        llm_latency=llm_latency, tool_latency=tool_latency,
+    )
+    with tempfile.TemporaryDirectory() as cache_dir:
+        proc = subprocess.run(
+            [sys.executable, "-c", code], cwd=REPO_ROOT, env=child_env(cache_dir), capture_output=True, text=True,
+        )
+    if proc.returncode != 0:
+        last_line = (proc.stderr.strip().splitlines() or ["unknown error"])[-1]
+        return {"ok": False, "error": last_line}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def bench_fixture(fixture_path: str, runs: int, llm_latency: float, tool_latency: float):
+    with open(fixture_path, encoding="utf-8") as f:
+        fixture = json.load(f)
+    samples = []
+    for _ in range(runs):
+        sample = run_once(fixture_path, fixture["pipeline"], llm_latency, tool_latency)
+        if not sample["ok"]:
+            return fixture["name"], {"error": sample["error"]}
+        samples.append(sample)
+
+    result = {"pipeline": fixture["pipeline"], "seconds": round(statistics.median(s["seconds"] for s in samples), 4)}
+    # The stand-ins are deterministic, so every run makes the same calls
+    for metric in COUNT_METRICS:
+        result[metric] = samples[0][metric]
+    result["tool_calls_by_name"] = samples[0]["tool_calls_by_name"]
+    return fixture["name"], result
+
+
+def compare(current: dict, baseline: dict, latency_tolerance: float, size_tolerance: float):
+    """Returns a list of regression messages (empty when nothing got worse)."""
+    regressions = []
+    for name, base in baseline.items():
+        now = current.get(name)
+        if now is None or "error" in base:
+            continue
+        if "error" in now:
+            regressions.append(f"{name}: failed ({now['error']})")
+            continue
+        if now["seconds"] > base["seconds"] * (1 + latency_tolerance) + 0.05:
+            regressions.append(f"{name}: latency {base['seconds']:.3f}s -> {now['seconds']:.3f}s")
+        for metric in ("llm_calls", "tool_calls"):
+            if now[metric] > base[metric]:
+                regressions.append(f"{name}: {metric} {base[metric]} -> {now[metric]}")
+        for metric in ("prompt_chars", "response_chars"):
+            if now[metric] > base[metric] * (1 + size_tolerance):
+                regressions.append(f"{name}: {metric} {base[metric]} -> {now[metric]}")
+    return regressions
+
+
+def record(pipeline: str, query: str, output: str):
+    """Runs `pipeline` once against the real services and writes what they answered as a fixture."""
+    sys.path[:0] = [REPO_ROOT, BENCH_DIR]
+    os.environ["RESEARCH_CACHE_DIR"] = tempfile.mkdtemp()  # no cached tool results, every call is recorded
+    import importlib
+    import tools
+    from replay import FixtureRecorder
+
+    search_tools = [tools.get_arxiv(), tools.get_tavily(), tools.get_tavily_new(), tools.get_tavily_cfp(), tools.get_wiki()]
+    recorder = FixtureRecorder({t.name for t in search_tools})
+    tools.get_llm().callbacks = [recorder]
+    for tool in search_tools:
+        tool.callbacks = [recorder]
+
+    kwargs = {"user_query": query, "conversation": []} if pipeline == "run_ideation_chat" else (
+        {"user_query": query} if pipeline == "review_papers" else {"query": query}
+    )
+    module, function = PIPELINES[pipeline]
+    getattr(importlib.import_module(module), function)(**kwargs)
+
+    name = os.path.splitext(os.path.basename(output))[0]
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(recorder.fixture(name, pipeline, kwargs), f, indent=2, ensure_ascii=False, default=str)
+    print(f"Recorded {pipeline} for {query!r} to {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded pipeline runs offline and measure them.")
+    parser.add_argument("fixtures", nargs="*", help="Fixture files (default: benchmarks/fixtures/*.json)")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters per fixture (median latency is reported).")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds added to every LLM call.")
+    parser.add_argument("--tool-latency", type=float, default=0.3, help="Seconds added to every tool call.")
+    parser.add_argument("--baseline", help="Compare against this saved result and exit 1 on a regression.")
+    parser.add_argument("--save-baseline", metavar="PATH", help="Write this run's results as the new baseline.")
+    parser.add_argument("--latency-tolerance", type=float, default=0.2, help="Allowed latency increase (0.2 = 20%%).")
+    parser.add_argument("--size-tolerance", type=float, default=0.1, help="Allowed prompt/response size increase.")
+    parser.add_argument("--record", nargs=2, metavar=("PIPELINE", "QUERY"), help="Record a new fixture instead.")
+    parser.add_argument("-o", "--output", help="Fixture path for --record.")
+    args = parser.parse_args()
+
+    if args.record:
+        pipeline, query = args.record
+        if pipeline not in PIPELINES:
+            parser.error(f"unknown pipeline {pipeline!r}; choose from {', '.join(PIPELINES)}")
+        record(pipeline, query, args.output or os.path.join(FIXTURE_DIR, f"{pipeline}.json"))
+        return
+
+    settings = {"llm_latency": args.llm_latency, "tool_latency": args.tool_latency}
+    fixtures = args.fixtures or sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.json")))
+    current = dict(bench_fixture(path, args.runs, args.llm_latency, args.tool_latency) for path in fixtures)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            saved = json.load(f)
+        baseline = saved["results"]
+        if saved.get("settings") != settings:
+            print(f"Warning: baseline was recorded with {saved.get('settings')}, this run uses {settings}")
+
+    print(f"{'fixture':<28}{'latency (s)':>12}{'LLM calls':>11}{'tool calls':>12}{'prompt chars':>14}{'response chars':>16}")
+    failed = False
+    for name, result in current.items():
+        if "error" in result:
+            failed = True
+            print(f"{name:<28}{'FAILED':>12}\n    {result['error']}")
+            continue
+        print(f"{name:<28}{result['seconds']:>12.3f}{result['llm_calls']:>11}{result['tool_calls']:>12}"
+              f"{result['prompt_chars']:>14}{result['response_chars']:>16}")
+        base = baseline.get(name)
+        if base and "error" not in base:
+            print(f"{'  baseline':<28}{base['seconds']:>12.3f}{base['llm_calls']:>11}{base['tool_calls']:>12}"
+                  f"{base['prompt_chars']:>14}{base['response_chars']:>16}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({"settings": settings, "results": current}, f, indent=2)
+        print(f"\nSaved baseline to {args.save_baseline}")
+
+    regressions = compare(current, baseline, args.latency_tolerance, args.size_tolerance) if baseline else []
+    if regressions:
+        print("\nREGRESSIONS:")
+        for message in regressions:
+            print(f"  {message}")
+    sys.exit(1 if failed or regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Offline stand-ins for the Gemini chat model and the search tools.
+
+A fixture (benchmarks/fixtures/*.json) holds what the real services
+answered for one pipeline run:
+
+    {
+      "name": "...", "pipeline": "review_papers", "kwargs": {"user_query": "..."},
+      "llm": {
+        "tool_rounds": [[{"name": "arxiv", "args": {"query": "..."}}]],
+        "structured": {"ReviewDraft": {...}},
+        "text": "..."
+      },
+      "tools": {"arxiv": {"<query>": "<output>", "*": "<fallback output>"}}
+    }
+
+ReplayChatModel answers by what it is asked for rather than by call
+order, so a fixture keeps working when a pipeline changes how it chains
+its calls: a structured-output call gets `structured[<schema>]`, a
+tool-bound call gets the next unused tool round, anything else gets
+`text`. Streamed calls get the same answer in small chunks (tool-call
+arguments as partial JSON). `install` puts the stand-ins behind the lazy
+getters in tools.py.
+FixtureRecorder writes new fixtures from a run against the real services.
+"""
+import copy
+import json
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import BaseTool
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import BaseModel, Field
+
+from tool_cache import normalize_args
+
+
+class RunStats:
+    """Counters shared by every stand-in for one run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = Counter()
+        self.tool_calls = Counter()
+
+    def add(self, **values):
+        with self._lock:
+            self.counts.update(values)
+
+    def peak(self, name: str, value: int):
+        with self._lock:
+            self.counts[name] = max(self.counts[name], value)
+
+    def tool(self, name: str):
+        with self._lock:
+            self.tool_calls[name] += 1
+
+    def as_dict(self):
+        return {
+            "llm_calls": self.counts["llm_calls"],
+            "tool_calls": sum(self.tool_calls.values()),
+            "tool_calls_by_name": dict(sorted(self.tool_calls.items())),
+            "prompt_chars": self.counts["prompt_chars"],
+            "response_chars": self.counts["response_chars"],
+            "max_prompt_chars": self.counts["max_prompt_chars"],
+        }
+
+
+def _content_chars(message) -> int:
+    content = message.content
+    if isinstance(content, list):
+        content = "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    chars = len(content or "")
+    for call in getattr(message, "tool_calls", None) or []:
+        chars += len(json.dumps(call["args"], default=str))
+    return chars
+
+
+class ReplayChatModel(BaseChatModel):
+    fixture: Dict[str, Any]
+    stats: Any
+    latency: float = 0.0
+    model: str = "replay"
+
+    @property
+    def _llm_type(self) -> str:
+        return "replay"
+
+    def bind_tools(self, tools, *, tool_choice=None, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], tool_choice=tool_choice, **kwargs)
+
+    def _respond(self, messages, tools, tool_choice) -> AIMessage:
+        llm = self.fixture.get("llm", {})
+        tool_names = [t["function"]["name"] for t in tools or []]
+
+        if tool_choice and len(tool_names) == 1 and tool_names[0] in llm.get("structured", {}):
+            name = tool_names[0]
+            return AIMessage(content="", tool_calls=[{"name": name, "args": copy.deepcopy(llm["structured"][name]), "id": f"call_{name}"}])
+
+        if tool_names:
+            rounds_done = sum(1 for m in messages if getattr(m, "tool_calls", None))
+            rounds = llm.get("tool_rounds", [])
+            if rounds_done < len(rounds):
+                calls = [c for c in rounds[rounds_done] if c["name"] in tool_names]
+                if calls:
+                    return AIMessage(content="", tool_calls=[
+                        {"name": c["name"], "args": copy.deepcopy(c["args"]), "id": f"call_{rounds_done}_{i}"}
+                        for i, c in enumerate(calls)
+                    ])
+            # Searches done: answer through a bound schema tool if there is one
+            for name in tool_names:
+                if name in llm.get("structured", {}):
+                    return AIMessage(content="", tool_calls=[{"name": name, "args": copy.deepcopy(llm["structured"][name]), "id": f"call_{name}"}])
+
+        return AIMessage(content=llm.get("text", ""))
+
+    def _answer(self, messages, tools, tool_choice) -> AIMessage:
+        if self.latency:
+            time.sleep(self.latency)
+        response = self._respond(messages, tools, tool_choice)
+        prompt_chars = sum(_content_chars(m) for m in messages)
+        self.stats.add(llm_calls=1, prompt_chars=prompt_chars, response_chars=_content_chars(response))
+        self.stats.peak("max_prompt_chars", prompt_chars)
+        return response
+
+    def _generate(self, messages, stop=None, run_manager=None, tools=None, tool_choice=None, **kwargs) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=self._answer(messages, tools, tool_choice))])
+
+    def _stream(self, messages, stop=None, run_manager=None, tools=None, tool_choice=None, chunk_chars=80, **kwargs):
+        response = self._answer(messages, tools, tool_choice)
+        pieces = []
+        for index, call in enumerate(response.tool_calls):
+            args = json.dumps(call["args"])
+            for start in range(0, len(args), chunk_chars):
+                first = start == 0
+                pieces.append(AIMessageChunk(content="", tool_call_chunks=[{
+                    "name": call["name"] if first else None, "id": call["id"] if first else None,
+                    "args": args[start:start + chunk_chars], "index": index,
+                }]))
+        text = response.content
+        pieces += [AIMessageChunk(content=text[i:i + chunk_chars]) for i in range(0, len(text), chunk_chars)]
+        for piece in pieces or [AIMessageChunk(content="")]:
+            if run_manager:
+                run_manager.on_llm_new_token(piece.content, chunk=ChatGenerationChunk(message=piece))
+            yield ChatGenerationChunk(message=piece)
+
+
+class QueryInput(BaseModel):
+    query: str = Field(description="Search query.")
+
+
+class ReplayTool(BaseTool):
+    name: str
+    description: str = "Replayed search tool."
+    args_schema: type = QueryInput
+    outputs: Dict[str, Any] = Field(default_factory=dict)
+    stats: Any = None
+    latency: float = 0.0
+
+    def _run(self, query: str, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        self.stats.tool(self.name)
+        key = normalize_args(query)
+        if key in self.outputs:
+            return copy.deepcopy(self.outputs[key])
+        # A reworded query (e.g. a prefetch of the user's own words) gets the closest recorded result
+        from prefetch import MATCH_THRESHOLD, query_words, similarity
+        words = query_words(key)
+        scored = [(similarity(words, query_words(k)), k) for k in self.outputs if k != "*"]
+        score, closest = max(scored, default=(0.0, None))
+        if closest is not None and score >= MATCH_THRESHOLD:
+            return copy.deepcopy(self.outputs[closest])
+        if "*" in self.outputs:
+            return copy.deepcopy(self.outputs["*"])
+        return f"No good {self.name} result was found"
+
+
+# lazy getter in tools.py -> (tool name, cache metadata) it stands in for
+TOOL_GETTERS = {
+    "get_arxiv": ("arxiv", {"cache_name": "arxiv_records", "provider": "arxiv", "records": True, "index": True}),
+    "get_tavily": ("tavily_search", {"cache_name": "tavily", "provider": "tavily"}),
+    "get_tavily_new": ("tavily_search", {"cache_name": "tavily_new", "provider": "tavily", "index": True}),
+    "get_tavily_cfp": ("tavily_search", {"cache_name": "tavily_cfp", "provider": "tavily"}),
+    "get_wiki": ("wikipedia", {"cache_name": "wiki", "provider": "wikipedia"}),
+}
+
+
+def install(fixture: dict, llm_latency: float = 0.0, tool_latency: float = 0.0) -> RunStats:
+    """Puts replay stand-ins behind tools.get_llm and the tool getters; returns the stats they fill."""
+    import tools
+    stats = RunStats()
+    tools.get_llm.override(ReplayChatModel(fixture=fixture, stats=stats, latency=llm_latency))
+    recorded = fixture.get("tools", {})
+    for getter, (name, metadata) in TOOL_GETTERS.items():
+        outputs = {normalize_args(k) if k != "*" else k: v for k, v in recorded.get(name, {}).items()}
+        getattr(tools, getter).override(
+            ReplayTool(name=name, metadata=metadata, outputs=outputs, stats=stats, latency=tool_latency)
+        )
+    return stats
+
+
+class FixtureRecorder(BaseCallbackHandler):
+    """Collects LLM answers and tool outputs from a real run into the fixture format above."""
+
+    def __init__(self, search_tools):
+        self.search_tools = set(search_tools)
+        self.llm = {"tool_rounds": [], "structured": {}, "text": ""}
+        self.tools = {}
+        self._schemas = {}
+        self._tool_inputs = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, invocation_params=None, **kwargs):
+        from tracing import structured_schema_name
+        schema = structured_schema_name(invocation_params)
+        if schema:
+            self._schemas[run_id] = schema
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        message = response.generations[0][0].message
+        schema = self._schemas.pop(run_id, None)
+        calls = getattr(message, "tool_calls", None) or []
+        with self._lock:
+            if schema:
+                args = calls[0]["args"] if calls else json.loads(message.content)
+                self.llm["structured"][schema] = args
+            elif calls and {c["name"] for c in calls} <= self.search_tools:
+                self.llm["tool_rounds"].append([{"name": c["name"], "args": c["args"]} for c in calls])
+            elif calls:
+                self.llm["structured"][calls[0]["name"]] = calls[0]["args"]
+            else:
+                content = message.content
+                if isinstance(content, list):
+                    content = "".join(p.get("text", "") if isinstance(p, dict) else str(p) for p in content)
+                self.llm["text"] = content
+
+    def on_tool_start(self, serialized, input_str, *, run_id, inputs=None, **kwargs):
+        query = (inputs or {}).get("query", input_str)
+        self._tool_inputs[run_id] = (serialized.get("name"), query)
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        name, query = self._tool_inputs.pop(run_id, (None, None))
+        if name:
+            with self._lock:
+                self.tools.setdefault(name, {})[query] = getattr(output, "content", output)
+
+    def fixture(self, name: str, pipeline: str, kwargs: dict) -> dict:
+        return {"name": name, "pipeline": pipeline, "kwargs": kwargs, "llm": self.llm, "tools": self.tools}
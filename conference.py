@@ -1,26 +1,17 @@
-from dotenv import load_dotenv
-from tools import llm, tools 
+from tools import get_llm, get_arxiv, get_tavily_cfp, lazy
 from typing import Literal , Annotated,TypedDict
 from pydantic import BaseModel, Field 
 from typing import List, Optional
 from datetime import datetime
 import json
-import os 
 
-from langchain_tavily import TavilySearch
+import aio
+from conference_store import conference_store, upcoming_sorted
+from llm_cache import cached
+from single_flight import coalesced
+from tracing import traced
+from work_agents import arun_graph
 
-load_dotenv()
-os.environ["GOOGLE_API_KEY"] = os.getenv("GEMINI_API_KEY")
-os.environ["TAVILY_API_KEY"] = os.getenv("TAVILY_API_KEY")
-
-tavily_cfp = TavilySearch(
-    max_results=20,
-    search_depth="advanced",
-    include_domains=["wikicfp.com"]
-)
-conference_tool = [tools[0], tavily_cfp]  # Updating tools to include Arxiv and Tavily for conference
-
-tool_llm = llm.bind_tools(conference_tool)
 # class ConferenceSchema(BaseModel):
 #     conference_name : str = Field(description="Name of the conference.")
 #     location : str = Field(description="Location where the conference is being held.")
@@ -46,16 +37,49 @@ class ConferenceList(BaseModel):
 
 
 
-conference_llm = tool_llm.with_structured_output(ConferenceList)
+# Words the model adds to a WikiCFP search that do not change what it finds (prefetch matching)
+CFP_WORDS = {
+    "conference", "conferences", "call", "calls", "cfp", "cfps", "deadline", "deadlines", "submission",
+    "submissions", "upcoming", "workshop", "workshops", "symposium", "venue", "venues", "event", "events",
+    "international", "annual", "wikicfp",
+}
+
+
+def cfp_words():
+    year = datetime.now().year
+    return CFP_WORDS | {str(y) for y in range(year - 1, year + 3)}
+
+
+def get_conference_tools():
+    return [get_arxiv(), get_tavily_cfp()]  # Arxiv and Tavily (WikiCFP) for conferences
+
+
+@lazy
+def get_conference_llm():
+    # Searches, then answers by calling the ConferenceList tool
+    llm = get_llm()
+    return cached(llm.bind_tools([*get_conference_tools(), ConferenceList]), model=llm.model, normalize=True)
+
+
+@lazy
+def get_conference_writer():
+    # Fallback when the search loop ends without calling ConferenceList
+    llm = get_llm()
+    return cached(
+        llm.with_structured_output(ConferenceList),
+        model=llm.model,
+        schema=ConferenceList,
+        normalize=True,
+    )
 
 
-def get_conferences(query: str):
+def conference_messages(query: str):
     today = datetime.now().strftime("%Y-%m-%d")
 
     system_prompt = f"""
     You are an expert research assistant.
     Use the WikiCFP website (through the Tavily tool) to find real upcoming conferences related to the given topic.
-    Focus only on *future* events (after {today}).
+    Today is {today}.
     For each event, extract:
     - conference name
     - location
@@ -63,51 +87,64 @@ def get_conferences(query: str):
     - submission deadline
     - topics
     - website link (if available)
-    Sort the conferences by their date in ascending order.
     Return a clean structured JSON following the provided schema.
     """
 
-    messages = [
+    return [
         ("system", system_prompt),
         ("human", f"Find conferences for: {query}")
     ]
 
-    response = conference_llm.invoke(messages)
-
-    while hasattr(response, "tool_calls") and response.tool_calls:
-        for call in response.tool_calls:
-            tool_name = call["name"]
-            args = call["args"]
-            print(f" Tool invoked: {tool_name} | Args: {args}")
-            tool_fn = next(t for t in conference_tool if t.name == tool_name)
-            tool_result = tool_fn.invoke(args)
-            print(f" Tool result snippet: {str(tool_result)[:250]}...")
-            response = conference_llm.invoke([
-                *messages,
-                ("tool", f"Tool '{tool_name}' output: {tool_result}")
-            ])
 
+def conference_result(response, query: str):
+    """Turns the model's answer into a dict, stores the events and keeps the upcoming ones, sorted by date."""
     if isinstance(response, ConferenceList):
         data = response.dict()
-        print(f"\nTotal conferences found: {len(data['conferences'])}")
+    elif isinstance(response, dict):
+        data = response
+    elif hasattr(response, "content"):
+        try:
+            data = json.loads(response.content)
+        except Exception as e:
+            return {"error": str(e), "raw": str(response)}
+    else:
+        return {"error": "Unexpected output", "raw": str(response)}
 
-        filename = f"conferences_{query.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-        output_path = os.path.join(os.getcwd(), filename)
+    # Store the events, then filter and sort locally on the parsed dates
+    data["conferences"] = upcoming_sorted(conference_store.upsert(data["conferences"], query=query))
+    return data
 
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
 
-        print(f"\nSaved results to: {output_path}")
-        print("\nPreview:\n")
-        print(json.dumps(data, indent=2, ensure_ascii=False))
+def get_conferences(query: str, thread_id: str = None, timeout: float = aio.PIPELINE_TIMEOUT):
+    """
+    Finds upcoming conferences for `query` and returns them as a dict
+    ({"error": ..., "raw": ...} on failure). Results are saved to the
+    conference store; past events are dropped and the rest sorted by date.
+    Runs as the conference agent of the work_agents graph, so an
+    interrupted search resumes from its last checkpoint.
+    """
+    return aio.run(aget_conferences(query, thread_id, timeout))
 
-        return data
-    else:
-        print("Unexpected output:", response)
-        return response
+
+@traced(name="get_conferences")
+async def aget_conferences(query: str, thread_id: str = None, timeout: float = aio.PIPELINE_TIMEOUT):
+    """
+    get_conferences as a coroutine. After `timeout` seconds this caller gets
+    an error; the search stops once no caller waits for it any more.
+    """
+    try:
+        return await _search_conferences(query, thread_id, timeout=timeout)
+    except TimeoutError:
+        return {"error": f"The conference search did not finish within {timeout:g}s", "raw": query}
+
+
+@coalesced(name="get_conferences")
+async def _search_conferences(query, thread_id):
+    return await arun_graph(query, agent="conference_agent", thread_id=thread_id)
 
 
 
 if __name__ == "__main__":
     user_topic = input("Enter your research topic to find relevant conferences: ")
-    get_conferences(user_topic)
\ No newline at end of file
+    result = get_conferences(user_topic)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
\ No newline at end of file
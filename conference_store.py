@@ -0,0 +1,342 @@
+"""
+Indexed store for conferences found by get_conferences.
+
+Free-text dates such as "March 4-8, 2026" are parsed into start/end dates
+and the submission deadline into a date (the latest one when the text
+lists several, e.g. abstract and full paper), so upcoming events and deadlines
+can be filtered and sorted locally. Events are de-duplicated across runs
+by name, year and website.
+
+    python conference_store.py deadlines --days 30 --topic "medical imaging"
+    python conference_store.py upcoming --topic robotics
+    python conference_store.py import conferences_*.json
+"""
+import argparse
+import calendar
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import urlparse
+
+CACHE_DIR = os.getenv("RESEARCH_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+STORE_PATH = os.getenv("CONFERENCE_STORE_PATH", os.path.join(CACHE_DIR, "conferences.sqlite3"))
+
+MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+MONTHS.update({name.lower(): i for i, name in enumerate(calendar.month_abbr) if name})
+MONTHS["sept"] = 9
+
+MONTH_RE = r"(?:%s)\.?" % "|".join(sorted(MONTHS, key=len, reverse=True))
+ISO_RE = re.compile(r"\b(\d{4})-(\d{1,2})-(\d{1,2})\b")
+# "03/15/2026", "15.03.2026": month first unless the first field can only be a day
+NUMERIC_RE = re.compile(r"\b(\d{1,2})[/.](\d{1,2})[/.](\d{4}|\d{2})\b")
+# One date (or day range) inside a longer text, e.g. each date in "Abstract: Jan 10, 2026; Full paper: Jan 17, 2026"
+DATE_MENTION_RE = re.compile(
+    r"\b\d{4}-\d{1,2}-\d{1,2}\b|\b\d{1,2}[/.]\d{1,2}[/.](?:\d{4}|\d{2})\b"
+    r"|\b%(month)s\s+\d{1,2}(?:st|nd|rd|th)?\b(?:\s*(?:–|—|-|to)\s*\d{1,2}\b)?(?:,?\s+(?:19|20)\d{2}\b)?"
+    r"|\b\d{1,2}(?:st|nd|rd|th)?(?:\s*(?:–|—|-)\s*\d{1,2})?\s+%(month)s(?:,?\s+(?:19|20)\d{2}\b)?" % {"month": MONTH_RE},
+    re.IGNORECASE,
+)
+RANGE_SPLIT_RE = re.compile(r"\s*(?:–|—|-|\bto\b|\buntil\b|\bthrough\b)\s*", re.IGNORECASE)
+
+
+# -------------------------------
+# Date parsing
+# -------------------------------
+def _parse_part(text: str):
+    """Pulls (day, month, year) out of a fragment like "March 4", "8, 2026" or "30 November 2025"; missing parts are None."""
+    text = text.lower()
+    month = re.search(r"\b(%s)" % MONTH_RE, text)
+    year = re.search(r"\b((?:19|20)\d{2})\b", text)
+    without_year = text[:year.start()] + text[year.end():] if year else text
+    day = re.search(r"\b(\d{1,2})(?:st|nd|rd|th)?\b", without_year)
+    return (
+        int(day.group(1)) if day else None,
+        MONTHS[month.group(1).rstrip(".")] if month else None,
+        int(year.group(1)) if year else None,
+    )
+
+
+def _build(day, month, year, end_of_month=False):
+    if not (month and year):
+        return None
+    if day is None:
+        day = calendar.monthrange(year, month)[1] if end_of_month else 1
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _numeric(first, second, year):
+    first, second, year = int(first), int(second), int(year)
+    if year < 100:
+        year += 2000
+    day, month = (first, second) if first > 12 else (second, first)
+    return _build(day, month, year)
+
+
+def _infer_year(month, today):
+    # No year given: assume the next occurrence of that month
+    return today.year if month >= today.month else today.year + 1
+
+
+def parse_date_range(text, today: date = None):
+    """Returns (start, end) dates for a free-text date or date range, or (None, None)."""
+    if not text:
+        return None, None
+    today = today or date.today()
+
+    iso = ISO_RE.findall(text)
+    if iso:
+        dates = [_build(int(d), int(m), int(y)) for y, m, d in iso]
+        return dates[0], dates[-1]
+    numeric = NUMERIC_RE.findall(text)
+    if numeric:
+        dates = [_numeric(*parts) for parts in numeric]
+        return dates[0], dates[-1]
+
+    pieces = [p for p in RANGE_SPLIT_RE.split(text.strip(), maxsplit=1) if p.strip()]
+    left = _parse_part(pieces[0])
+    right = _parse_part(pieces[1]) if len(pieces) > 1 else left
+
+    # "March 4-8, 2026": the left side borrows the year; "4-8 March 2026": it also borrows the month
+    left_day, left_month, left_year = left
+    right_day, right_month, right_year = right
+    left_month = left_month or right_month
+    right_month = right_month or left_month
+    if not (left_month and right_month):
+        return None, None
+    left_year = left_year or right_year
+    right_year = right_year or left_year
+    if not left_year:
+        left_year = right_year = _infer_year(left_month, today)
+        if right_month < left_month:
+            right_year += 1
+
+    start = _build(left_day, left_month, left_year)
+    end = _build(right_day, right_month, right_year, end_of_month=True)
+    if len(pieces) == 1 and left_day is not None:
+        end = start
+    return start, end
+
+
+def parse_date(text, today: date = None):
+    """Single date (e.g. a submission deadline); for a range the last day counts."""
+    return parse_date_range(text, today)[1]
+
+
+def parse_deadline(text, today: date = None):
+    """
+    Submission deadline: the latest date in the text, so "Abstract: Jan 10,
+    2026; Full paper: Jan 17, 2026" stays open until Jan 17.
+    """
+    if not text:
+        return None
+    dates = [d for d in (parse_date(m.group(0), today) for m in DATE_MENTION_RE.finditer(text)) if d]
+    return max(dates) if dates else parse_date(text, today)
+
+
+# -------------------------------
+# Store
+# -------------------------------
+def normalize_name(name: str) -> str:
+    name = re.sub(r"\((?:[^)]*)\)", " ", name.lower())   # "(ECR 2026)"
+    name = re.sub(r"\b(?:19|20)\d{2}\b", " ", name)
+    return " ".join(re.findall(r"[a-z0-9]+", name))
+
+
+def website_host(url) -> str:
+    if not url:
+        return ""
+    host = urlparse(url if "//" in url else f"//{url}").netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class ConferenceStore:
+    def __init__(self, path: str = STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS conferences (
+                    id INTEGER PRIMARY KEY,
+                    conference_name TEXT NOT NULL,
+                    norm_name TEXT NOT NULL,
+                    host TEXT NOT NULL,
+                    year INTEGER,
+                    location TEXT,
+                    date TEXT,
+                    submission_deadline TEXT,
+                    topics TEXT,
+                    website TEXT,
+                    start_date TEXT,
+                    end_date TEXT,
+                    deadline TEXT,
+                    first_seen REAL NOT NULL,
+                    last_seen REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_conferences_name ON conferences(norm_name, year);
+                CREATE INDEX IF NOT EXISTS idx_conferences_host ON conferences(host, year);
+                CREATE INDEX IF NOT EXISTS idx_conferences_start ON conferences(start_date);
+                CREATE INDEX IF NOT EXISTS idx_conferences_deadline ON conferences(deadline);
+                CREATE TABLE IF NOT EXISTS conference_queries (
+                    query TEXT NOT NULL,
+                    conference_id INTEGER NOT NULL REFERENCES conferences(id) ON DELETE CASCADE,
+                    PRIMARY KEY (query, conference_id)
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS conferences_fts USING fts5(
+                    conference_name, topics, content='conferences', content_rowid='id', tokenize='porter unicode61'
+                );
+                CREATE TRIGGER IF NOT EXISTS conferences_ai AFTER INSERT ON conferences BEGIN
+                    INSERT INTO conferences_fts(rowid, conference_name, topics) VALUES (new.id, new.conference_name, new.topics);
+                END;
+                CREATE TRIGGER IF NOT EXISTS conferences_au AFTER UPDATE ON conferences BEGIN
+                    INSERT INTO conferences_fts(conferences_fts, rowid, conference_name, topics)
+                    VALUES ('delete', old.id, old.conference_name, old.topics);
+                    INSERT INTO conferences_fts(rowid, conference_name, topics) VALUES (new.id, new.conference_name, new.topics);
+                END;
+            """)
+            self._local.conn = conn
+        return conn
+
+    def _find(self, conn, norm_name, host, year):
+        row = conn.execute(
+            "SELECT id FROM conferences WHERE norm_name = ? AND year IS ?", (norm_name, year)
+        ).fetchone()
+        if row is None and host:
+            row = conn.execute(
+                "SELECT id FROM conferences WHERE host = ? AND year IS ?", (host, year)
+            ).fetchone()
+        return row["id"] if row else None
+
+    def upsert(self, conferences, query: str = None):
+        """Stores ConferenceInfo dicts and returns them with parsed start_date/end_date/deadline (ISO strings)."""
+        now = time.time()
+        stored = []
+        conn = self._conn()
+        with conn:
+            for conf in conferences:
+                start, end = parse_date_range(conf.get("date"))
+                deadline = parse_deadline(conf.get("submission_deadline"))
+                year = start.year if start else None
+                norm_name, host = normalize_name(conf["conference_name"]), website_host(conf.get("website"))
+                values = (
+                    conf["conference_name"], norm_name, host, year, conf.get("location"), conf.get("date"),
+                    conf.get("submission_deadline"), conf.get("topics"), conf.get("website"),
+                    start.isoformat() if start else None, end.isoformat() if end else None,
+                    deadline.isoformat() if deadline else None,
+                )
+                conference_id = self._find(conn, norm_name, host, year)
+                if conference_id is None:
+                    conference_id = conn.execute(
+                        "INSERT INTO conferences(conference_name, norm_name, host, year, location, date, submission_deadline, "
+                        "topics, website, start_date, end_date, deadline, first_seen, last_seen) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (*values, now, now),
+                    ).lastrowid
+                else:
+                    conn.execute(
+                        "UPDATE conferences SET conference_name = ?, norm_name = ?, host = ?, year = ?, "
+                        "location = COALESCE(?, location), date = COALESCE(?, date), "
+                        "submission_deadline = COALESCE(?, submission_deadline), topics = COALESCE(?, topics), "
+                        "website = COALESCE(?, website), start_date = COALESCE(?, start_date), "
+                        "end_date = COALESCE(?, end_date), deadline = COALESCE(?, deadline), last_seen = ? WHERE id = ?",
+                        (*values, now, conference_id),
+                    )
+                if query:
+                    conn.execute(
+                        "INSERT OR IGNORE INTO conference_queries(query, conference_id) VALUES (?, ?)",
+                        (" ".join(query.lower().split()), conference_id),
+                    )
+                stored.append({
+                    **conf,
+                    "start_date": values[9],
+                    "end_date": values[10],
+                    "deadline": values[11],
+                })
+        return stored
+
+    def _select(self, where: str, params, topic: str = None, order: str = "start_date", limit: int = 100):
+        sql = "SELECT c.* FROM conferences c"
+        if topic:
+            terms = re.findall(r"[a-z0-9]+", topic.lower())
+            if terms:
+                sql += (
+                    " WHERE (c.id IN (SELECT rowid FROM conferences_fts WHERE conferences_fts MATCH ?)"
+                    " OR c.id IN (SELECT conference_id FROM conference_queries WHERE query = ?)) AND "
+                )
+                params = [" ".join(f'"{t}"' for t in terms), " ".join(terms), *params]
+            else:
+                sql += " WHERE "
+        else:
+            sql += " WHERE "
+        sql += f"{where} ORDER BY {order} IS NULL, {order} LIMIT ?"
+        return [dict(row) for row in self._conn().execute(sql, (*params, limit)).fetchall()]
+
+    def upcoming(self, topic: str = None, after: date = None, limit: int = 100):
+        """Events that have not ended yet, soonest first (events without a parsed date are left out)."""
+        after = after or date.today()
+        return self._select("c.end_date >= ?", [after.isoformat()], topic, "c.start_date", limit)
+
+    def deadlines_within(self, days: int = 30, topic: str = None, today: date = None, limit: int = 100):
+        """Events whose submission deadline falls in the next `days` days, earliest deadline first."""
+        today = today or date.today()
+        return self._select(
+            "c.deadline BETWEEN ? AND ?",
+            [today.isoformat(), (today + timedelta(days=days)).isoformat()],
+            topic, "c.deadline", limit,
+        )
+
+
+def upcoming_sorted(conferences, today: date = None):
+    """Drops events that already ended and sorts the rest by start date (undated ones last)."""
+    today = (today or date.today()).isoformat()
+    kept = [c for c in conferences if not c.get("end_date") or c["end_date"] >= today]
+    return sorted(kept, key=lambda c: (c.get("start_date") is None, c.get("start_date") or ""))
+
+
+conference_store = ConferenceStore()
+
+
+def upcoming_deadlines(days: int = 30, topic: str = None):
+    return conference_store.deadlines_within(days, topic)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the local conference store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    deadlines = sub.add_parser("deadlines", help="Submission deadlines in the next N days")
+    deadlines.add_argument("--days", type=int, default=30)
+    deadlines.add_argument("--topic")
+    upcoming = sub.add_parser("upcoming", help="Events that have not ended yet")
+    upcoming.add_argument("--topic")
+    importer = sub.add_parser("import", help="Load JSON files written by older versions of conference.py")
+    importer.add_argument("files", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "import":
+        for path in args.files:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            conference_store.upsert(data["conferences"], query=data.get("topic"))
+            print(f"Imported {len(data['conferences'])} conferences from {path}")
+    else:
+        rows = (
+            conference_store.deadlines_within(args.days, args.topic)
+            if args.command == "deadlines"
+            else conference_store.upcoming(args.topic)
+        )
+        for row in rows:
+            print(f"{row['start_date'] or '?':<12} deadline {row['deadline'] or '?':<12} {row['conference_name']}")
+        print(f"{len(rows)} conferences")
@@ -1,90 +1,7 @@
 import streamlit as st
 import json
-from dotenv import load_dotenv
-from tools import llm, tools
-from pydantic import BaseModel, Field
-from typing import List, Optional
-from datetime import datetime
-import os
-from langchain_tavily import TavilySearch
-
-# -------------------------------
-# Load environment
-# -------------------------------
-load_dotenv()
-os.environ["GOOGLE_API_KEY"] = os.getenv("GEMINI_API_KEY")
-os.environ["TAVILY_API_KEY"] = os.getenv("TAVILY_API_KEY")
-
-# -------------------------------
-# Define Models and Tools
-# -------------------------------
-tavily_cfp = TavilySearch(
-    max_results=20,
-    search_depth="advanced",
-    include_domains=["wikicfp.com"]
-)
-conference_tool = [tools[0], tavily_cfp]
-tool_llm = llm.bind_tools(conference_tool)
-
-class ConferenceInfo(BaseModel):
-    conference_name: str = Field(..., description="Name of the conference.")
-    location: Optional[str] = Field(None, description="Location of the conference.")
-    date: Optional[str] = Field(None, description="Conference dates (start–end).")
-    topics: Optional[str] = Field(None, description="Main topics covered.")
-    submission_deadline: Optional[str] = Field(None, description="Paper submission deadline.")
-    website: Optional[str] = Field(None, description="Conference website or CFP link.")
-
-class ConferenceList(BaseModel):
-    topic: str = Field(..., description="User’s research area.")
-    conferences: List[ConferenceInfo] = Field(..., description="List of upcoming or relevant conferences.")
-
-conference_llm = tool_llm.with_structured_output(ConferenceList)
-
-# -------------------------------
-# Backend function
-# -------------------------------
-def get_conferences(query: str):
-    today = datetime.now().strftime("%Y-%m-%d")
-
-    system_prompt = f"""
-    You are an expert research assistant.
-    Use the WikiCFP website (through the Tavily tool) to find real upcoming conferences related to the given topic.
-    Focus only on *future* events (after {today}).
-    For each event, extract:
-    - conference name
-    - location
-    - dates
-    - submission deadline
-    - topics
-    - website link (if available)
-    Sort the conferences by their date in ascending order.
-    Return a clean structured JSON following the provided schema.
-    """
-
-    messages = [
-        ("system", system_prompt),
-        ("human", f"Find conferences for: {query}")
-    ]
-
-    response = conference_llm.invoke(messages)
-
-    while hasattr(response, "tool_calls") and response.tool_calls:
-        for call in response.tool_calls:
-            tool_name = call["name"]
-            args = call["args"]
-            tool_fn = next(t for t in conference_tool if t.name == tool_name)
-            tool_result = tool_fn.invoke(args)
-            response = conference_llm.invoke([
-                *messages,
-                ("tool", f"Tool '{tool_name}' output: {tool_result}")
-            ])
-
-    if isinstance(response, ConferenceList):
-        return response.dict()
-    elif hasattr(response, "content"):
-        return json.loads(response.content)
-    else:
-        return {"error": "Unexpected output", "raw": str(response)}
+import time
+import backend
 
 # -------------------------------
 # Streamlit UI
@@ -96,16 +13,48 @@ st.caption("Find upcoming academic conferences relevant to your topic using Arxi
 
 if "conference_data" not in st.session_state:
     st.session_state.conference_data = None
+if "conference_job" not in st.session_state:
+    st.session_state.conference_job = None  # background job (backend.submit_job) this session is waiting on
 
 topic = st.text_input("Enter your research area or topic:")
 
-if st.button("Find Conferences"):
+with st.sidebar:
+    st.subheader("⏰ Upcoming Deadlines")
+    days = st.slider("Deadlines in the next N days", 7, 180, 30, step=7)
+    deadlines = backend.upcoming_deadlines(days, topic.strip() or None)
+    if isinstance(deadlines, dict):
+        st.caption(deadlines.get("error", "Could not load deadlines."))
+    elif not deadlines:
+        st.caption("No saved conferences with a deadline in this window yet.")
+    for conf in deadlines if isinstance(deadlines, list) else []:
+        st.markdown(f"**{conf['deadline']}** · {conf['conference_name']}")
+
+if st.button("Find Conferences", disabled=st.session_state.conference_job is not None):
     if not topic.strip():
         st.warning("Please enter a research topic.")
     else:
-        with st.spinner("Searching for relevant conferences..."):
-            data = get_conferences(topic)
-            st.session_state.conference_data = data
+        job = backend.submit_job("get_conferences", query=topic)
+        st.session_state.conference_data = job if "error" in job else None
+        st.session_state.conference_job = job.get("id")
+
+# A running job survives reruns: show its progress, then poll again
+if st.session_state.conference_job:
+    job = backend.job_status(st.session_state.conference_job)
+    if job.get("status") in ("queued", "running"):
+        st.info("Waiting for a free worker..." if job["status"] == "queued" else "Searching for relevant conferences...")
+        if job["progress"]:
+            st.caption(job["progress"][-1]["message"])
+        if st.button("Cancel"):
+            backend.cancel_job(st.session_state.conference_job)
+            st.session_state.conference_job = None
+            st.rerun()
+        time.sleep(1)
+        st.rerun()
+    st.session_state.conference_job = None
+    if job.get("status") == "done":
+        st.session_state.conference_data = job["result"] or {"error": "No result was returned"}
+    else:
+        st.session_state.conference_data = {"error": job.get("error") or f"Search {job.get('status', 'failed')}"}
 
 # -------------------------------
 # Display Results
@@ -0,0 +1,131 @@
+import os
+import threading
+
+# -------------------------------
+# Settings
+# -------------------------------
+MAX_TURNS = int(os.getenv("MEMORY_MAX_TURNS", "6"))
+TOKEN_BUDGET = int(os.getenv("MEMORY_TOKEN_BUDGET", "3000"))
+
+summary_prompt = """
+You maintain a running summary of a research brainstorming conversation.
+Update the existing summary with the new messages below.
+Keep every concrete idea, constraint, decision and open question; drop greetings and repetition.
+Answer with the updated summary only, in at most {max_words} words.
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting and needs no tokenizer call
+    return len(text) // 4 + 1
+
+
+def summarize_turns(summary: str, turns, max_words: int = 200) -> str:
+    """Folds `turns` into `summary` with one LLM call; only the new turns are sent."""
+    from tools import get_llm
+    new_lines = "\n".join(f"{role}: {text}" for role, text in turns)
+    response = get_llm().invoke([
+        ("system", summary_prompt.format(max_words=max_words)),
+        ("human", f"Existing summary:\n{summary or '(empty)'}\n\nNew messages:\n{new_lines}"),
+    ])
+    content = response.content
+    if isinstance(content, list):
+        content = "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return content.strip()
+
+
+class ConversationMemory:
+    """
+    Prompt history for a chat session.
+    The last `max_turns` messages are kept verbatim; older ones are folded
+    into a rolling summary. Each fold sends only the previous summary plus
+    the evicted messages, so the summary is updated, never rebuilt. The
+    returned history stays under `token_budget` (estimated) tokens.
+
+    Folds are batched: once the window overflows (or the budget is
+    exceeded) the older half of it is folded in one summarizer call. With
+    `background` (the default) that call runs on a thread, so `add` never
+    waits for the LLM; until it finishes, the evicted messages stay in the
+    history verbatim.
+    """
+
+    def __init__(self, max_turns: int = MAX_TURNS, token_budget: int = TOKEN_BUDGET, summarizer=summarize_turns,
+                 background: bool = True):
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.summarizer = summarizer
+        self.background = background
+        self.summary = ""
+        self.turns = []
+        self._folding = []      # evicted messages whose fold is running
+        self._fold_thread = None
+        self._lock = threading.RLock()
+
+    def add(self, role: str, text: str):
+        with self._lock:
+            self.turns.append((role, text))
+            self._maybe_fold()
+
+    def _maybe_fold(self):
+        if self._folding:
+            return  # the running fold checks again when it is done
+        keep = len(self.turns)
+        if keep > self.max_turns:
+            keep = max(1, self.max_turns // 2)
+        while keep > 1 and estimate_tokens(self.summary) + _tokens(self.turns[-keep:]) > self.token_budget:
+            keep //= 2
+        if keep >= len(self.turns):
+            return
+        self._folding, self.turns = self.turns[:-keep], self.turns[-keep:]
+        if self.background:
+            self._fold_thread = threading.Thread(target=self._fold, args=(self.summary, self._folding), daemon=True)
+            self._fold_thread.start()
+        else:
+            self._fold(self.summary, self._folding)
+
+    def _fold(self, summary: str, evicted):
+        try:
+            summary = self.summarizer(summary, evicted)
+        except Exception:
+            # Never lose context because the summarizer failed; keep a clipped transcript instead
+            clipped = " ".join(f"{role}: {text[:200]}" for role, text in evicted)
+            summary = f"{summary}\n{clipped}".strip()
+        # Keep the summary itself within half the budget
+        max_chars = self.token_budget * 2
+        if len(summary) > max_chars:
+            summary = summary[-max_chars:]
+        with self._lock:
+            if self._folding is not evicted:
+                return  # cleared meanwhile
+            self.summary, self._folding = summary, []
+            self._maybe_fold()
+
+    def wait(self):
+        """Blocks until the running fold (if any) has updated the summary."""
+        while self._fold_thread is not None and self._fold_thread.is_alive():
+            self._fold_thread.join()
+
+    def tokens(self) -> int:
+        return estimate_tokens(self.summary) + _tokens(self._folding) + _tokens(self.turns)
+
+    def messages(self):
+        """History to put between the system prompt and the new user message."""
+        with self._lock:
+            history = []
+            if self.summary:
+                history.append(("system", f"Summary of the earlier conversation:\n{self.summary}"))
+            turns = self._folding + self.turns
+            # While a fold runs, its messages are still verbatim: drop the oldest if they break the budget
+            while len(turns) > 1 and estimate_tokens(self.summary) + _tokens(turns) > self.token_budget:
+                turns = turns[1:]
+            return history + turns
+
+    def clear(self):
+        with self._lock:
+            self.summary = ""
+            self.turns = []
+            self._folding = []
+
+
+def _tokens(turns) -> int:
+    return sum(estimate_tokens(text) for _, text in turns)
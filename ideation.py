@@ -0,0 +1,124 @@
+from tools import get_llm, get_tavily, get_wiki, lazy
+from typing import Literal
+from pydantic import BaseModel, Field
+import asyncio
+import aio
+from agent_loop import arun_agent, stream_agent
+from llm_cache import cached
+from router_classifier import aroute, ideation_technique, ideation_type
+from prompt_library_2 import basic_prompt, COT_prompt, product_based_prompt, depth_research_prompt
+from tracing import traced
+
+class QueryLevelSchema(BaseModel):
+    technique: Literal["Basic", "Chain-of-thought"] = Field(description="Prompting technique.")
+    type: Literal["Product_Based", "Depth_Research"] = Field(description="Type of ideation task.")
+
+@lazy
+def get_agent():
+    llm = get_llm()
+    return cached(llm.with_structured_output(QueryLevelSchema), model=llm.model, schema=QueryLevelSchema, normalize=True)
+
+def query_level(user_query: str, session_cache=None):
+    """Picks technique/type locally when confident, otherwise asks the LLM router."""
+    return aio.run(aquery_level(user_query, session_cache))
+
+async def aquery_level(user_query: str, session_cache=None):
+    return await aroute(
+        user_query,
+        {"technique": ideation_technique, "type": ideation_type},
+        QueryLevelSchema,
+        lambda: aio.call(get_agent().ainvoke(query_level_messages(user_query))),
+        session_cache,
+    )
+
+def query_level_messages(user_query: str):
+    return [
+        ("system", """
+        You are an intelligent routing agent for an ideation assistant.
+        Choose which reasoning style best fits the user query:
+        - 'Basic' for simple, unclear, or curiosity-driven questions.
+        - 'Chain-of-thought' for analytical or multi-step reasoning.
+        - 'Product_Based' for creative, innovation-oriented ideas.
+        - 'Depth_Research' for complex, exploratory, or academic ideation.
+        If a user asks a vague incomplete query, assume that it is in the direction of ideation.
+        For example: "Medical Imaging project idea" → return clear project ideas, directions, and possible scopes.
+        """),
+        ("human", user_query),
+    ]
+
+def prompt(level):
+    prompts = []
+    if level.technique == "Basic":
+        prompts.append(basic_prompt)
+    elif level.technique == "Chain-of-thought":
+        prompts.append(COT_prompt)
+    if level.type == "Product_Based":
+        prompts.append(product_based_prompt)
+    elif level.type == "Depth_Research":
+        prompts.append(depth_research_prompt)
+    return prompts
+
+def get_ideation_tools():
+    return [get_tavily(), get_wiki()]
+
+@lazy
+def get_ideation_llm():
+    return get_llm().bind_tools(get_ideation_tools())
+
+def content_text(content):
+    # Gemini may return a list of content parts instead of a plain string
+    if isinstance(content, list):
+        return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return content or ""
+
+def build_messages(user_query, conversation, session_cache=None):
+    return level_messages(query_level(user_query, session_cache), user_query, conversation)
+
+async def abuild_messages(user_query, conversation, session_cache=None):
+    return level_messages(await aquery_level(user_query, session_cache), user_query, conversation)
+
+def level_messages(level, user_query, conversation):
+    prompts = prompt(level)
+    final_prompt = "  ".join(prompts)
+
+    return [
+        ("system", final_prompt),
+        *conversation,
+        ("human", user_query),
+    ]
+
+def run_ideation_chat(user_query, conversation, session_cache=None, timeout=aio.PIPELINE_TIMEOUT):
+    """The answer text, or {"error": ..., "raw": ...} when it is not written within `timeout` seconds."""
+    return aio.run(arun_ideation_chat(user_query, conversation, session_cache, timeout))
+
+@traced(name="run_ideation_chat")
+async def arun_ideation_chat(user_query, conversation, session_cache=None, timeout=aio.PIPELINE_TIMEOUT):
+    """run_ideation_chat as a coroutine."""
+    try:
+        async with asyncio.timeout(timeout):
+            messages = await abuild_messages(user_query, conversation, session_cache)
+            response, _ = await aio.call(arun_agent(
+                get_ideation_llm(), messages, get_ideation_tools(), query=user_query, final_llm=get_llm(),
+            ))
+    except TimeoutError:
+        return {"error": f"The answer did not finish within {timeout:g}s", "raw": user_query}
+    return content_text(response.content) if hasattr(response, "content") else str(response)
+
+@traced()
+def stream_ideation_chat(user_query, conversation, session_cache=None):
+    """
+    Same as run_ideation_chat but yields answer text as the model produces it.
+    Tool calls are collected from the streamed chunks; if the model asks for
+    any, they run once the stream ends and the follow-up answer is streamed.
+    """
+    messages = build_messages(user_query, conversation, session_cache)
+    yield from stream_agent(
+        get_ideation_llm(), messages, get_ideation_tools(), query=user_query, final_llm=get_llm(),
+    )
+
+
+if __name__ == "__main__":
+    user_query = input("Describe your idea or question: ")
+    for text in stream_ideation_chat(user_query, []):
+        print(text, end="", flush=True)
+    print()
@@ -1,77 +1,6 @@
 import streamlit as st
-from dotenv import load_dotenv
-from tools import llm, tools
-from typing import Literal
-from pydantic import BaseModel, Field
-from prompt_library_2 import basic_prompt, COT_prompt, product_based_prompt, depth_research_prompt
-
-load_dotenv()
-
-class QueryLevelSchema(BaseModel):
-    technique: Literal["Basic", "Chain-of-thought"] = Field(description="Prompting technique.")
-    type: Literal["Product_Based", "Depth_Research"] = Field(description="Type of ideation task.")
-
-Agent = llm.with_structured_output(QueryLevelSchema)
-
-def query_level(user_query: str):
-    convo_messages = [
-        ("system", """
-        You are an intelligent routing agent for an ideation assistant.
-        Choose which reasoning style best fits the user query:
-        - 'Basic' for simple, unclear, or curiosity-driven questions.
-        - 'Chain-of-thought' for analytical or multi-step reasoning.
-        - 'Product_Based' for creative, innovation-oriented ideas.
-        - 'Depth_Research' for complex, exploratory, or academic ideation.
-        If a user asks a vague incomplete query, assume that it is in the direction of ideation.
-        For example: "Medical Imaging project idea" → return clear project ideas, directions, and possible scopes.
-        """),
-        ("human", user_query),
-    ]
-    return Agent.invoke(convo_messages)
-
-def prompt(level):
-    prompts = []
-    if level.technique == "Basic":
-        prompts.append(basic_prompt)
-    elif level.technique == "Chain-of-thought":
-        prompts.append(COT_prompt)
-    if level.type == "Product_Based":
-        prompts.append(product_based_prompt)
-    elif level.type == "Depth_Research":
-        prompts.append(depth_research_prompt)
-    return prompts
-
-ideation_tool = tools[1:3]
-ideation_llm = llm.bind_tools(ideation_tool)
-
-def run_ideation_chat(user_query, conversation):
-    level = query_level(user_query)
-    prompts = prompt(level)
-    final_prompt = "  ".join(prompts)
-
-    messages = [
-        ("system", final_prompt),
-        *conversation,
-        ("human", user_query),
-    ]
-
-    response = ideation_llm.invoke(messages)
-    if hasattr(response, "tool_calls") and response.tool_calls:
-        for call in response.tool_calls:
-            tool_name = call["name"]
-            args = call["args"]
-            tool_fn = next(t for t in ideation_tool if t.name == tool_name)
-            tool_result = tool_fn.invoke(args)
-            response = ideation_llm.invoke([
-                *messages,
-                ("tool", f"Tool '{tool_name}' output: {tool_result}")
-            ])
-
-    ans = response.content if hasattr(response, "content") else str(response)
-    if isinstance(ans, list):
-        ans = ans[0].get("text", str(ans))
-    return ans
-
+import backend
+from conversation_memory import ConversationMemory
 
 # --- Streamlit UI ---
 st.set_page_config(page_title="Ideation Assistant", page_icon="💡", layout="wide")
@@ -80,7 +9,13 @@ st.title("💡 Ideation Assistant")
 st.caption("Your creative partner for brainstorming project ideas and innovation directions.")
 
 if "conversation" not in st.session_state:
-    st.session_state.conversation = []
+    st.session_state.conversation = []  # full transcript, for display only
+if "router_cache" not in st.session_state:
+    st.session_state.router_cache = {}
+if "memory" not in st.session_state:
+    st.session_state.memory = ConversationMemory(summarizer=backend.summarize_conversation)
+
+stream_responses = st.sidebar.toggle("Stream responses", value=True)
 
 # Display all past messages
 for role, msg in st.session_state.conversation:
@@ -95,9 +30,20 @@ if user_query:
     with st.chat_message("user"):
         st.markdown(user_query)
 
+    # The prompt gets the bounded memory, which does not yet contain this query
+    history = st.session_state.memory.messages()
     with st.chat_message("assistant"):
-        with st.spinner("Thinking..."):
-            ans = run_ideation_chat(user_query, st.session_state.conversation)
-            st.markdown(ans)
+        if stream_responses:
+            ans = st.write_stream(backend.stream_ideation_chat(user_query, history, st.session_state.router_cache))
+        else:
+            with st.spinner("Thinking..."):
+                ans = backend.run_ideation_chat(user_query, history, st.session_state.router_cache)
+            if isinstance(ans, dict):
+                st.error(f" Error: {ans['error']}")
+                ans = "An error occurred while writing the answer."
+            else:
+                st.markdown(ans)
 
     st.session_state.conversation.append(("assistant", ans))
+    st.session_state.memory.add("human", user_query)
+    st.session_state.memory.add("assistant", ans)
@@ -0,0 +1,268 @@
+"""
+Local job queue for the long pipelines (reviews, conference searches).
+
+A job runs one backend pipeline in a pool of JOB_WORKERS worker
+processes, so a Streamlit rerun or a second user does not block on the
+script thread and the work spreads across cores. The UIs submit a job,
+keep its id in the session and poll `status` on each rerun, so a rerun
+attaches to the running job instead of starting it again.
+
+    job = submit("review_papers", {"user_query": "graph neural networks"})
+    status(job["id"])   # {"status": "running", "progress": [...], "items": [...], ...}
+    cancel(job["id"])
+
+A submission identical to a job that is still queued or running (same
+pipeline, same normalized arguments) joins that job instead of starting
+another; such joins are counted in research_coalesced_total{name="jobs"}.
+
+Whatever a job prints is recorded as its progress. A pipeline that
+yields (stream_review) adds each item to the job's `items` as it comes,
+and its last item is the result. Cancelling a queued job drops it;
+cancelling a running one stops its worker process, which is replaced.
+A job others have joined keeps running until they have all cancelled.
+Finished jobs are kept for JOB_RETENTION seconds.
+"""
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import types
+import uuid
+from collections import deque
+from multiprocessing.connection import wait
+
+import tracing
+from tool_cache import make_key
+from tools import lazy
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", str(min(4, os.cpu_count() or 1))))
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", "3600"))
+MAX_PROGRESS = 200
+
+FINISHED = ("done", "failed", "cancelled")
+
+
+# -------------------------------
+# Worker process
+# -------------------------------
+class _ProgressWriter:
+    """stdout of a worker while it runs a job: each line becomes a progress event (and is still printed)."""
+
+    def __init__(self, send, job_id, original):
+        self.send = send
+        self.job_id = job_id
+        self.original = original
+        self.buffer = ""
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        self.original.write(text)
+        with self._lock:
+            self.buffer += text
+            *lines, self.buffer = self.buffer.split("\n")
+        for line in lines:
+            if line.strip():
+                self.send("progress", self.job_id, line.strip())
+        return len(text)
+
+    def flush(self):
+        self.original.flush()
+
+
+def _worker(conn):
+    import inspect
+    import backend
+    lock = threading.Lock()
+
+    def send(*event):
+        with lock:  # pipeline threads print too
+            conn.send(event)
+
+    while True:
+        task = conn.recv()
+        if task is None:
+            return
+        job_id, pipeline, kwargs = task
+        original, sys.stdout = sys.stdout, _ProgressWriter(send, job_id, sys.stdout)
+        try:
+            output = backend._local(pipeline)(**backend._message_tuples(kwargs))
+            if inspect.isgenerator(output):
+                item = None
+                for item in output:
+                    send("item", job_id, item)
+                output = item
+            send("done", job_id, output)
+        except Exception as e:
+            send("failed", job_id, f"{type(e).__name__}: {e}")
+        finally:
+            sys.stdout = original
+
+
+# -------------------------------
+# Queue
+# -------------------------------
+class JobQueue:
+    def __init__(self, workers: int = JOB_WORKERS, retention: float = JOB_RETENTION):
+        self.retention = retention
+        self._context = multiprocessing.get_context("spawn")
+        self._lock = threading.Lock()
+        self._jobs = {}                      # id -> job dict
+        self._pending = deque()              # queued job ids
+        self._slots = [None] * max(1, workers)  # {"process", "conn", "job"} per worker, started on demand
+        threading.Thread(target=self._listen, name="jobs", daemon=True).start()
+
+    def submit(self, pipeline: str, kwargs: dict = None) -> dict:
+        job = {
+            "id": uuid.uuid4().hex[:12], "pipeline": pipeline, "kwargs": kwargs or {}, "status": "queued",
+            "key": make_key(pipeline, kwargs or {}), "subscribers": 1,
+            "submitted_at": time.time(), "started_at": None, "finished_at": None,
+            "progress": [], "items": [], "result": None, "error": None,
+        }
+        with self._lock:
+            self._prune()
+            for other in self._jobs.values():
+                if other["key"] == job["key"] and other["status"] in ("queued", "running"):
+                    other["subscribers"] += 1
+                    tracing.increment("research_coalesced_total", name="jobs")
+                    return self._view(other)
+            self._jobs[job["id"]] = job
+            self._pending.append(job["id"])
+            self._dispatch()
+            return self._view(job)
+
+    def status(self, job_id: str) -> dict:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._view(job) if job else {"error": f"Unknown job: {job_id}"}
+
+    def cancel(self, job_id: str) -> dict:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return {"error": f"Unknown job: {job_id}"}
+            if job["subscribers"] > 1 and job["status"] not in FINISHED:
+                job["subscribers"] -= 1  # someone else still waits for it
+                return self._view(job)
+            if job["status"] == "queued":
+                self._pending.remove(job_id)
+            elif job["status"] == "running":
+                for i, slot in enumerate(self._slots):
+                    if slot and slot["job"] == job_id:
+                        slot["process"].terminate()
+                        slot["conn"].close()
+                        self._slots[i] = None
+            else:
+                return self._view(job)
+            self._finish(job, "cancelled")
+            self._dispatch()
+            return self._view(job)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job["status"]] = counts.get(job["status"], 0) + 1
+            return {"workers": len(self._slots), "busy": sum(1 for s in self._slots if s and s["job"]), "jobs": counts}
+
+    # Everything below runs with self._lock held (except _listen)
+    def _view(self, job) -> dict:
+        view = {k: v for k, v in job.items() if k not in ("kwargs", "key")}
+        view["progress"] = list(job["progress"])
+        view["items"] = list(job["items"])
+        return view
+
+    def _finish(self, job, status, result=None, error=None):
+        job.update(status=status, result=result, error=error, finished_at=time.time())
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id in [j["id"] for j in self._jobs.values() if j["status"] in FINISHED and j["finished_at"] < cutoff]:
+            del self._jobs[job_id]
+
+    def _dispatch(self):
+        for i, slot in enumerate(self._slots):
+            if not self._pending:
+                return
+            if slot is not None and not slot["process"].is_alive():
+                slot = self._slots[i] = None
+            if slot is None:
+                parent, child = self._context.Pipe()
+                process = self._context.Process(target=_worker, args=(child,), name=f"job-worker-{i}", daemon=True)
+                # Spawned children re-import the parent's __main__, which under Streamlit is the UI script
+                main, sys.modules["__main__"] = sys.modules["__main__"], types.ModuleType("__main__")
+                try:
+                    process.start()
+                finally:
+                    sys.modules["__main__"] = main
+                child.close()
+                slot = self._slots[i] = {"process": process, "conn": parent, "job": None}
+            if slot["job"] is None:
+                job = self._jobs[self._pending.popleft()]
+                job.update(status="running", started_at=time.time())
+                slot["job"] = job["id"]
+                slot["conn"].send((job["id"], job["pipeline"], job["kwargs"]))
+
+    def _listen(self):
+        while True:
+            with self._lock:
+                conns = {slot["conn"]: i for i, slot in enumerate(self._slots) if slot}
+            if not conns:
+                time.sleep(0.2)
+                continue
+            try:
+                ready = wait(list(conns), timeout=1.0)
+            except (OSError, ValueError):
+                continue  # a connection was closed by cancel()
+            for conn in ready:
+                with self._lock:
+                    i = conns[conn]
+                    slot = self._slots[i]
+                    if slot is None or slot["conn"] is not conn:
+                        continue  # cancelled meanwhile
+                    try:
+                        kind, job_id, value = conn.recv()
+                    except (EOFError, OSError):
+                        # The worker died (e.g. out of memory): fail its job and start a new worker when needed
+                        job = self._jobs.get(slot["job"])
+                        if job is not None and job["status"] == "running":
+                            self._finish(job, "failed", error="Worker process exited")
+                        self._slots[i] = None
+                        self._dispatch()
+                        continue
+                    job = self._jobs.get(job_id)
+                    if job is None or job["status"] != "running":
+                        continue
+                    if kind == "progress":
+                        job["progress"] = (job["progress"] + [{"time": time.time(), "message": value}])[-MAX_PROGRESS:]
+                    elif kind == "item":
+                        job["items"].append(value)
+                    else:
+                        self._finish(job, kind, result=value if kind == "done" else None, error=value if kind == "failed" else None)
+                        slot["job"] = None
+                        self._dispatch()
+
+
+@lazy
+def get_job_queue():
+    return JobQueue()
+
+
+def submit(pipeline: str, kwargs: dict = None) -> dict:
+    """Queues a backend pipeline (e.g. "review_papers") with its keyword arguments; returns the job."""
+    from backend import JOB_PIPELINES
+    if pipeline not in JOB_PIPELINES:
+        return {"error": f"Not a job pipeline: {pipeline}"}
+    return get_job_queue().submit(pipeline, kwargs)
+
+
+def status(job_id: str) -> dict:
+    return get_job_queue().status(job_id)
+
+
+def cancel(job_id: str) -> dict:
+    return get_job_queue().cancel(job_id)
+
+
+def stats() -> dict:
+    return get_job_queue().stats()
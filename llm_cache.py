@@ -0,0 +1,177 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from langchain_core.messages import BaseMessage, convert_to_messages, messages_from_dict, messages_to_dict
+from langchain_core.runnables import Runnable
+from pydantic import BaseModel
+
+import tracing
+
+# -------------------------------
+# Settings
+# -------------------------------
+MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL", str(6 * 3600)))
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split()).casefold()
+
+
+def _message_payload(messages, normalize: bool):
+    payload = []
+    for m in messages:
+        content = m.content
+        if normalize and isinstance(content, str):
+            content = normalize_text(content)
+        payload.append({
+            "type": m.type,
+            "content": content,
+            "tool_calls": [{"name": c["name"], "args": c["args"]} for c in getattr(m, "tool_calls", None) or []],
+        })
+    return payload
+
+
+def make_key(messages, model: str, schema, normalize: bool = False, bound=None) -> str:
+    """`bound` is what the runnable was bound with (e.g. the tools and tool_choice of bind_tools)."""
+    schema_repr = schema.model_json_schema() if isinstance(schema, type) and issubclass(schema, BaseModel) else schema
+    payload = json.dumps(
+        [model, schema_repr, bound or {}, _message_payload(messages, normalize)],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """In-process LRU cache of LLM responses with a TTL, shared by every wrapped runnable."""
+
+    def __init__(self, max_entries: int = MAX_ENTRIES, ttl: int = TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if time.time() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, keys, value):
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                self._entries[key] = (now, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def record(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+llm_cache = LLMCache()
+
+
+class CachedLLM(Runnable):
+    """
+    Wraps an LLM runnable and answers repeated inputs from `llm_cache`.
+    Lookups try the exact message hash first and, when `normalize` is set,
+    a case/whitespace-insensitive hash. Pass `use_cache=False` to skip it.
+    Keys cover the model, the schema and the kwargs the runnable is bound
+    with, so runnables bound to different tools never share an answer.
+    """
+
+    def __init__(self, runnable, model: str, schema=None, normalize: bool = False, cache: LLMCache = None):
+        self.runnable = runnable
+        self.model = model
+        self.schema = schema
+        self.normalize = normalize
+        self.cache = cache or llm_cache
+        self.bound = getattr(runnable, "kwargs", None) or {}  # RunnableBinding: tools, tool_choice, ...
+
+    def _keys(self, input):
+        messages = convert_to_messages([("human", input)] if isinstance(input, str) else input)
+        keys = [make_key(messages, self.model, self.schema, bound=self.bound)]
+        if self.normalize:
+            keys.append(make_key(messages, self.model, self.schema, normalize=True, bound=self.bound))
+        return keys
+
+    def _dump(self, result):
+        if isinstance(result, BaseModel):
+            return {"kind": "model", "data": result.model_dump()}
+        if isinstance(result, BaseMessage):
+            return {"kind": "message", "data": messages_to_dict([result])}
+        return {"kind": "raw", "data": copy.deepcopy(result)}
+
+    def _load(self, stored):
+        if stored["kind"] == "model" and self.schema is not None:
+            return self.schema.model_validate(stored["data"])
+        if stored["kind"] == "message":
+            return messages_from_dict(stored["data"])[0]
+        return copy.deepcopy(stored["data"])
+
+    def _lookup(self, keys):
+        """(True, result) on a hit, else (False, None)."""
+        for key in keys:
+            stored = self.cache.get(key)
+            if stored is not None:
+                self.cache.record(hit=True)
+                with tracing.span("llm", self.model, cache_hit=True, structured=getattr(self.schema, "__name__", None)):
+                    return True, self._load(stored)
+        self.cache.record(hit=False)
+        return False, None
+
+    def invoke(self, input, config=None, use_cache: bool = True, **kwargs):
+        if not use_cache:
+            return self.runnable.invoke(input, config, **kwargs)
+
+        keys = self._keys(input)
+        found, result = self._lookup(keys)
+        if found:
+            return result
+        result = self.runnable.invoke(input, config, **kwargs)
+        self.cache.set(keys, self._dump(result))
+        return result
+
+    async def ainvoke(self, input, config=None, use_cache: bool = True, **kwargs):
+        if not use_cache:
+            return await self.runnable.ainvoke(input, config, **kwargs)
+
+        keys = self._keys(input)
+        found, result = self._lookup(keys)
+        if found:
+            return result
+        result = await self.runnable.ainvoke(input, config, **kwargs)
+        self.cache.set(keys, self._dump(result))
+        return result
+
+
+def cached(runnable, model: str, schema=None, normalize: bool = False):
+    return CachedLLM(runnable, model=model, schema=schema, normalize=normalize)
@@ -0,0 +1,182 @@
+"""
+Local library of every paper a literature review has returned.
+
+Papers live in SQLite with an FTS5 index over title, abstract and
+key_contribution. review_papers searches it before going to arXiv/Tavily.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+CACHE_DIR = os.getenv("RESEARCH_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+LIBRARY_PATH = os.getenv("PAPER_LIBRARY_PATH", os.path.join(CACHE_DIR, "paper_library.sqlite3"))
+
+# A hit is "strong" when it covers this share of the query's terms
+STRONG_COVERAGE = float(os.getenv("LIBRARY_MIN_COVERAGE", "0.6"))
+# With this many strong hits the review is written from the library alone...
+ENOUGH_HITS = int(os.getenv("LIBRARY_MIN_HITS", "5"))
+# ...if the query is specific enough (a broad one like "transformers" always searches)
+MIN_QUERY_TERMS = int(os.getenv("LIBRARY_MIN_TERMS", "3"))
+# ...and the hits were found recently enough, so new work on the topic is still picked up
+MAX_AGE_DAYS = float(os.getenv("LIBRARY_MAX_AGE_DAYS", "30"))
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "by", "for", "from", "in", "into", "is", "of", "on", "or",
+    "the", "to", "with", "using", "based", "via", "about", "papers", "paper", "research", "review",
+}
+
+
+def query_terms(text: str):
+    return [t for t in re.findall(r"[a-z0-9]+", text.lower()) if t not in STOPWORDS and len(t) > 1]
+
+
+def _stem(term: str) -> str:
+    # Light suffix stripping so "imaging" and "images" both match "image"
+    for suffix in ("ing", "ed", "es", "s", "e"):
+        if term.endswith(suffix) and len(term) - len(suffix) >= 3:
+            return term[: -len(suffix)]
+    return term
+
+
+def paper_key(paper: dict) -> str:
+    link = (paper.get("link") or "").strip().lower().rstrip("/")
+    link = re.sub(r"^https?://(www\.)?", "", link)
+    link = re.sub(r"v\d+$", "", link)  # arXiv versions
+    return link or " ".join(re.findall(r"[a-z0-9]+", paper["title"].lower()))
+
+
+class PaperLibrary:
+    def __init__(self, path: str = LIBRARY_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS papers (
+                    id INTEGER PRIMARY KEY,
+                    key TEXT UNIQUE NOT NULL,
+                    title TEXT NOT NULL,
+                    authors TEXT,
+                    year INTEGER,
+                    link TEXT,
+                    abstract TEXT,
+                    key_contribution TEXT,
+                    relevance TEXT,
+                    topic TEXT,
+                    added_at REAL NOT NULL
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+                    title, abstract, key_contribution,
+                    content='papers', content_rowid='id', tokenize='porter unicode61'
+                );
+                CREATE TRIGGER IF NOT EXISTS papers_ai AFTER INSERT ON papers BEGIN
+                    INSERT INTO papers_fts(rowid, title, abstract, key_contribution)
+                    VALUES (new.id, new.title, new.abstract, new.key_contribution);
+                END;
+                CREATE TRIGGER IF NOT EXISTS papers_ad AFTER DELETE ON papers BEGIN
+                    INSERT INTO papers_fts(papers_fts, rowid, title, abstract, key_contribution)
+                    VALUES ('delete', old.id, old.title, old.abstract, old.key_contribution);
+                END;
+                CREATE TRIGGER IF NOT EXISTS papers_au AFTER UPDATE ON papers BEGIN
+                    INSERT INTO papers_fts(papers_fts, rowid, title, abstract, key_contribution)
+                    VALUES ('delete', old.id, old.title, old.abstract, old.key_contribution);
+                    INSERT INTO papers_fts(rowid, title, abstract, key_contribution)
+                    VALUES (new.id, new.title, new.abstract, new.key_contribution);
+                END;
+            """)
+            self._local.conn = conn
+        return conn
+
+    def add_papers(self, papers, topic: str = None):
+        """Stores (or refreshes) papers from a LiteratureReview dict; existing fields are kept when the new ones are empty."""
+        conn = self._conn()
+        with conn:
+            for paper in papers:
+                conn.execute(
+                    """
+                    INSERT INTO papers(key, title, authors, year, link, abstract, key_contribution, relevance, topic, added_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(key) DO UPDATE SET
+                        title = excluded.title,
+                        authors = COALESCE(excluded.authors, papers.authors),
+                        year = COALESCE(excluded.year, papers.year),
+                        link = COALESCE(excluded.link, papers.link),
+                        abstract = COALESCE(excluded.abstract, papers.abstract),
+                        key_contribution = COALESCE(excluded.key_contribution, papers.key_contribution),
+                        relevance = COALESCE(excluded.relevance, papers.relevance)
+                    """,
+                    (
+                        paper_key(paper), paper["title"],
+                        json.dumps(paper["authors"]) if paper.get("authors") else None,
+                        paper.get("year"), paper.get("link"), paper.get("abstract"),
+                        paper.get("key_contribution"), paper.get("relevance"), topic, time.time(),
+                    ),
+                )
+
+    def search(self, query: str, limit: int = 20):
+        """BM25 search; each hit carries `score` (lower is better) and `coverage` of the query terms."""
+        terms = query_terms(query)
+        if not terms:
+            return []
+        match = " OR ".join(f'"{t}"' for t in terms)
+        rows = self._conn().execute(
+            """
+            SELECT papers.*, bm25(papers_fts, 10.0, 3.0, 2.0) AS score
+            FROM papers_fts JOIN papers ON papers.id = papers_fts.rowid
+            WHERE papers_fts MATCH ?
+            ORDER BY score LIMIT ?
+            """,
+            (match, limit),
+        ).fetchall()
+
+        hits = []
+        for row in rows:
+            paper = dict(row)
+            paper["authors"] = json.loads(paper["authors"]) if paper["authors"] else None
+            text = " ".join(filter(None, (paper["title"], paper["abstract"], paper["key_contribution"])))
+            text_stems = {_stem(t) for t in query_terms(text)}
+            paper["coverage"] = sum(1 for t in terms if _stem(t) in text_stems) / len(terms)
+            hits.append(paper)
+        return hits
+
+    def strong_hits(self, query: str, limit: int = 20):
+        return [hit for hit in self.search(query, limit) if hit["coverage"] >= STRONG_COVERAGE]
+
+    def covers(self, query: str, hits) -> bool:
+        """True when `hits` (strong_hits of `query`) are enough to write the review without searching."""
+        if len(query_terms(query)) < MIN_QUERY_TERMS:
+            return False
+        fresh_since = time.time() - MAX_AGE_DAYS * 86400
+        return sum(1 for hit in hits if hit["added_at"] >= fresh_since) >= ENOUGH_HITS
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+
+def format_papers(papers) -> str:
+    """Renders library hits for the prompt."""
+    blocks = []
+    for i, paper in enumerate(papers, start=1):
+        lines = [f"[{i}] {paper['title']} ({paper.get('year') or 'n.d.'})"]
+        if paper.get("authors"):
+            lines.append("Authors: " + ", ".join(paper["authors"]))
+        if paper.get("link"):
+            lines.append(f"Link: {paper['link']}")
+        if paper.get("abstract"):
+            lines.append(f"Abstract: {paper['abstract']}")
+        if paper.get("key_contribution"):
+            lines.append(f"Key contribution: {paper['key_contribution']}")
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+paper_library = PaperLibrary()
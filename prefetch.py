@@ -0,0 +1,143 @@
+"""
+Background prefetch of the searches a pipeline is about to ask for.
+
+A review nearly always starts with arXiv and Tavily searches for roughly
+the user's query, and a conference search with a WikiCFP search. With
+PREFETCH_SEARCHES=1 those searches start as soon as the query arrives,
+alongside the first LLM call, instead of after it. When the model then
+calls a prefetched tool with a query that matches (same words, ignoring
+order and filler words, at PREFETCH_MATCH overlap), the call waits for
+the prefetched result instead of searching again. A search may list extra
+words the model tends to add that do not change what it finds (e.g.
+"conference call for papers" on WikiCFP); they are left out of the match. Prefetches the model
+never asked for are counted as wasted.
+
+Per-tool started/hit/wasted counts are served at the backend's /stats and
+as research_prefetch_total at /metrics.
+"""
+import contextvars
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+from tool_cache import tool_cache
+
+ENABLED = os.getenv("PREFETCH_SEARCHES", "0") == "1"
+MATCH_THRESHOLD = float(os.getenv("PREFETCH_MATCH", "0.75"))
+
+FILLER_WORDS = {"a", "an", "and", "about", "for", "in", "of", "on", "the", "to", "with", "model", "models", "paper", "papers", "recent"}
+
+# Own pool: tool calls wait on prefetches, so they must not queue behind them in tools.tool_executor
+prefetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+
+_lock = threading.Lock()
+_runs = {}                       # run id -> {"pending": [...], "hits": n}
+_counts = defaultdict(Counter)   # tool label -> started / hits / wasted
+
+
+def _label(tool) -> str:
+    return (tool.metadata or {}).get("cache_name", tool.name)
+
+
+def query_words(query) -> set:
+    words = set(re.findall(r"[a-z0-9]+", str(query).lower()))
+    return words - FILLER_WORDS or words
+
+
+def similarity(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def _count(label: str, outcome: str, amount: int = 1):
+    with _lock:
+        _counts[label][outcome] += amount
+    tracing.increment("research_prefetch_total", amount, tool=label, outcome=outcome)
+
+
+def _defaults(tool) -> dict:
+    """Argument defaults from the tool's schema, e.g. {"max_results": 10} for arXiv."""
+    try:
+        return {name: spec["default"] for name, spec in tool.args.items() if "default" in spec}
+    except Exception:
+        return {}
+
+
+def _default_args(args: dict, defaults: dict) -> bool:
+    """True when every argument besides the query is unset or the tool's default, as in the prefetch."""
+    return all(value is None or (name in defaults and defaults[name] == value) for name, value in args.items() if name != "query")
+
+
+def _fetch(tool, args):
+    with tracing.span("prefetch", _label(tool), args=args):
+        return tool_cache.invoke(tool, args)
+
+
+def start(run_id: str, searches):
+    """
+    Starts `searches` ([(tool, query) or (tool, query, extra_words), ...]) in
+    the background for run `run_id` (no-op unless enabled).
+    """
+    if not ENABLED or not searches:
+        return
+    with _lock:
+        if run_id in _runs:
+            return
+        _runs[run_id] = run = {"pending": [], "hits": 0}
+        for tool, query, *extra in searches:
+            extra = set(extra[0]) if extra else set()
+            future = prefetch_executor.submit(contextvars.copy_context().run, _fetch, tool, {"query": query})
+            run["pending"].append({
+                "tool": tool.name, "label": _label(tool), "words": query_words(query) - extra or query_words(query),
+                "extra": extra, "defaults": _defaults(tool), "future": future,
+            })
+    for tool, *_ in searches:
+        _count(_label(tool), "started")
+
+
+def claim(run_id: str, tool_name: str, args):
+    """
+    The Future of a prefetched search matching this tool call, or None.
+    Other arguments must be unset or the tool's defaults (what the prefetch
+    ran with). Each prefetch is claimed once.
+    """
+    if not isinstance(args, dict) or not isinstance(args.get("query"), str):
+        return None
+    words = query_words(args["query"])
+    with _lock:
+        run = _runs.get(run_id)
+        if run is None:
+            return None
+        scored = [
+            (similarity(words - p["extra"] or words, p["words"]), p) for p in run["pending"]
+            if p["tool"] == tool_name and _default_args(args, p["defaults"])
+        ]
+        score, best = max(scored, key=lambda item: item[0], default=(0.0, None))
+        if best is None or score < MATCH_THRESHOLD:
+            return None
+        run["pending"].remove(best)
+        run["hits"] += 1
+    _count(best["label"], "hits")
+    return best["future"]
+
+
+def finish(run_id: str) -> dict:
+    """Ends run `run_id`; prefetches it never claimed count as wasted. Returns {"hits", "wasted"} for the run."""
+    with _lock:
+        run = _runs.pop(run_id, None)
+    if run is None:
+        return {}
+    for p in run["pending"]:
+        _count(p["label"], "wasted")
+    return {"hits": run["hits"], "wasted": len(run["pending"])}
+
+
+def stats():
+    with _lock:
+        counts = {label: dict(c) for label, c in sorted(_counts.items())}
+    for c in counts.values():
+        started = c.get("started", 0)
+        c["hit_rate"] = round(c.get("hits", 0) / started, 3) if started else 0.0
+    return {"enabled": ENABLED, "tools": counts}
@@ -0,0 +1,262 @@
+"""
+Process-wide rate limits for the LLM and search providers.
+
+Every provider (gemini, tavily, arxiv, wikipedia) has one token bucket
+shared by all threads. Tool calls go through `call_with_retry`, which waits
+for a token, retries rate-limit and transient errors with jittered
+exponential backoff and halves the provider's rate after a 429 (it creeps
+back up on success). The Gemini chat model gets the same bucket through
+`langchain_rate_limiter`; its own client retries 429/5xx responses, and
+`langchain_feedback` halves the bucket's rate when a call still fails
+with a 429 (and lets it recover on success).
+
+Limits are requests per second with an optional burst, e.g.
+RATE_LIMIT_TAVILY="5/10" or RATE_LIMIT_ARXIV="0.34".
+"""
+import asyncio
+import os
+import random
+import re
+import threading
+import time
+
+import tracing
+
+# provider -> (requests per second, burst)
+DEFAULT_LIMITS = {
+    "gemini": (4.0, 4),
+    "tavily": (5.0, 5),
+    "arxiv": (1 / 3, 1),   # arXiv asks for one request every three seconds
+    "wikipedia": (10.0, 10),
+}
+MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "4"))
+BACKOFF_BASE = float(os.getenv("RATE_LIMIT_BACKOFF_BASE", "1.0"))
+BACKOFF_MAX = float(os.getenv("RATE_LIMIT_BACKOFF_MAX", "30"))
+
+THROTTLED = re.compile(r"\b429\b|rate.?limit|too many requests|resource.?exhausted|quota", re.IGNORECASE)
+TRANSIENT = re.compile(
+    r"\b(500|502|503|504)\b|timed? ?out|temporar|unavailable|connection (reset|aborted|error|refused)|bad gateway",
+    re.IGNORECASE,
+)
+
+
+def _limit(provider: str):
+    rate, burst = DEFAULT_LIMITS.get(provider, (5.0, 5))
+    setting = os.getenv(f"RATE_LIMIT_{provider.upper()}")
+    if setting:
+        rate_text, _, burst_text = setting.partition("/")
+        rate = float(rate_text)
+        burst = int(burst_text) if burst_text else max(1, int(rate))
+    return rate, burst
+
+
+class TokenBucket:
+    """
+    Token bucket where each caller reserves the next free slot and then
+    sleeps outside the lock, so waiting callers are served in order.
+    """
+
+    def __init__(self, provider: str, rate: float, burst: int = 1):
+        self.provider = provider
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.queued_seconds = 0.0
+        self.max_queued = 0.0
+        self.retries = 0
+        self.throttled_count = 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, blocking: bool = True):
+        """Takes a token and returns how long to wait for it, or None when not blocking and none is free."""
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens < 1 and not blocking:
+                return None
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.calls += 1
+            self.queued_seconds += wait
+            self.max_queued = max(self.max_queued, wait)
+            return wait
+
+    def acquire(self, blocking: bool = True) -> bool:
+        wait = self.reserve(blocking)
+        if wait is None:
+            return False
+        if wait:
+            time.sleep(wait)
+        return True
+
+    async def aacquire(self, blocking: bool = True) -> bool:
+        wait = self.reserve(blocking)
+        if wait is None:
+            return False
+        if wait:
+            await asyncio.sleep(wait)
+        return True
+
+    def throttled(self):
+        # The provider pushed back: halve the rate and drop any saved-up burst
+        with self._lock:
+            self.throttled_count += 1
+            self.rate = max(self.max_rate / 16, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+
+    def succeeded(self):
+        if self.rate < self.max_rate:
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def stats(self):
+        return {
+            "calls": self.calls,
+            "queued_seconds": round(self.queued_seconds, 3),
+            "avg_queued_seconds": round(self.queued_seconds / self.calls, 3) if self.calls else 0.0,
+            "max_queued_seconds": round(self.max_queued, 3),
+            "retries": self.retries,
+            "throttled": self.throttled_count,
+            "rate": round(self.rate, 3),
+            "max_rate": round(self.max_rate, 3),
+        }
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(provider: str) -> TokenBucket:
+    bucket = _buckets.get(provider)
+    if bucket is None:
+        with _buckets_lock:
+            bucket = _buckets.get(provider)
+            if bucket is None:
+                bucket = _buckets[provider] = TokenBucket(provider, *_limit(provider))
+    return bucket
+
+
+def backoff_delay(attempt: int) -> float:
+    """Exponential backoff with jitter: a random delay between half and all of base * 2**attempt."""
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+    return random.uniform(delay / 2, delay)
+
+
+def is_retryable(error) -> bool:
+    text = str(error)
+    return bool(THROTTLED.search(text) or TRANSIENT.search(text))
+
+
+def call_with_retry(provider: str, fn, *args, is_error=None, max_retries: int = MAX_RETRIES, **kwargs):
+    """
+    Calls `fn(*args, **kwargs)` under `provider`'s rate limit.
+    Raised exceptions and, with `is_error`, returned error values (the search
+    wrappers return errors instead of raising) are retried when they look
+    like rate limiting or a transient failure. The last result is returned
+    or re-raised once the retries run out.
+    """
+    bucket = get_bucket(provider)
+    for attempt in range(max_retries + 1):
+        queued = time.perf_counter()
+        bucket.acquire()
+        active = tracing.current()
+        if active is not None:
+            active.add(queued_seconds=time.perf_counter() - queued, attempts=1)
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == max_retries or not is_retryable(e):
+                raise
+            error = e
+        else:
+            if not (is_error and is_error(result) and is_retryable(result)):
+                bucket.succeeded()
+                return result
+            if attempt == max_retries:
+                return result
+            error = result
+
+        if THROTTLED.search(str(error)):
+            bucket.throttled()
+        bucket.retries += 1
+        time.sleep(backoff_delay(attempt))
+
+
+async def acall_with_retry(provider: str, fn, *args, is_error=None, max_retries: int = MAX_RETRIES, **kwargs):
+    """call_with_retry for a coroutine function `fn`; waits for the bucket and backs off without blocking the loop."""
+    bucket = get_bucket(provider)
+    for attempt in range(max_retries + 1):
+        queued = time.perf_counter()
+        await bucket.aacquire()
+        active = tracing.current()
+        if active is not None:
+            active.add(queued_seconds=time.perf_counter() - queued, attempts=1)
+        try:
+            result = await fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == max_retries or not is_retryable(e):
+                raise
+            error = e
+        else:
+            if not (is_error and is_error(result) and is_retryable(result)):
+                bucket.succeeded()
+                return result
+            if attempt == max_retries:
+                return result
+            error = result
+
+        if THROTTLED.search(str(error)):
+            bucket.throttled()
+        bucket.retries += 1
+        await asyncio.sleep(backoff_delay(attempt))
+
+
+_langchain_limiters = {}
+
+
+def langchain_rate_limiter(provider: str):
+    """The provider's bucket as a langchain BaseRateLimiter, for `ChatModel(rate_limiter=...)`."""
+    if provider not in _langchain_limiters:
+        from langchain_core.rate_limiters import BaseRateLimiter
+
+        class SharedRateLimiter(BaseRateLimiter):
+            def __init__(self, bucket: TokenBucket):
+                self.bucket = bucket
+
+            def acquire(self, *, blocking: bool = True) -> bool:
+                return self.bucket.acquire(blocking)
+
+            async def aacquire(self, *, blocking: bool = True) -> bool:
+                return await self.bucket.aacquire(blocking)
+
+        limiter = SharedRateLimiter(get_bucket(provider))
+        with _buckets_lock:
+            _langchain_limiters.setdefault(provider, limiter)
+    return _langchain_limiters[provider]
+
+
+def langchain_feedback(provider: str):
+    """Callback handler (for `ChatModel(callbacks=[...])`) that reports each call's outcome to the provider's bucket."""
+    from langchain_core.callbacks import BaseCallbackHandler
+    bucket = get_bucket(provider)
+
+    class RateFeedback(BaseCallbackHandler):
+        def on_llm_end(self, response, **kwargs):
+            bucket.succeeded()
+
+        def on_llm_error(self, error, **kwargs):
+            # e.g. GoogleRateLimitError "... (RESOURCE_EXHAUSTED)", raised from a 429 ClientError
+            if getattr(error.__cause__, "code", None) == 429 or THROTTLED.search(str(error)):
+                bucket.throttled()
+
+    return RateFeedback()
+
+
+def stats():
+    return {provider: bucket.stats() for provider, bucket in sorted(_buckets.items())}
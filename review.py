@@ -1,19 +1,19 @@
-from dotenv import load_dotenv
-from tools import llm, tools 
+from tools import get_llm, get_arxiv, get_tavily_new, lazy
 from typing import Literal , Annotated,TypedDict
 from pydantic import BaseModel, Field 
 from typing import List, Optional
-import os 
+import asyncio
 import json 
 
-from langchain_tavily import TavilySearch
-
-load_dotenv()
-os.environ["GOOGLE_API_KEY"] = os.getenv("GEMINI_API_KEY")
-os.environ["TAVILY_API_KEY"] = os.getenv("TAVILY_API_KEY")
-
-tavily_new = TavilySearch(max_results=10, search_depth="advanced")
-review_tool = [tools[0], tavily_new]  # Updating tools to include Arxiv and Tavily for review
+import aio
+import arxiv_records
+from agent_loop import partial_answer
+from llm_cache import cached
+from paper_library import format_papers, paper_key, paper_library
+from prompt_library_2 import review_prompt
+from single_flight import coalesced
+from tracing import traced
+from work_agents import arun_graph, stream_graph
 
 
 
@@ -31,90 +31,267 @@ class LiteratureReview(BaseModel):
     topic: str = Field(..., description="The topic or query for the literature review.")
     papers: List[SimplePaperInfo] = Field(..., description="List of relevant papers for this topic.")
     summary: Optional[str] = Field(None, description="Overall summary or synthesis of findings across papers.")
-    
+
+
+# What the model writes: arXiv papers by id only, their metadata comes from the arXiv records
+class PaperDraft(BaseModel):
+    arxiv_id: Optional[str] = Field(None, description="arXiv id (e.g. 2102.04306) when the paper came from an arXiv result. Leave title, authors, year, link and abstract empty for these.")
+    title: Optional[str] = Field(None, description="Title, only for papers without an arXiv id.")
+    authors: Optional[List[str]] = Field(None, description="Authors, only for papers without an arXiv id.")
+    year: Optional[int] = Field(None, description="Publication year, only for papers without an arXiv id.")
+    link: Optional[str] = Field(None, description="Link, only for papers without an arXiv id.")
+    abstract: Optional[str] = Field(None, description="Brief abstract, only for papers without an arXiv id.")
+    key_contribution: Optional[str] = Field(None, description="Main idea or contribution of the paper.")
+    relevance: str = Field(..., description="Why this paper is relevant to the user’s topic.")
+
+
+class ReviewDraft(BaseModel):
+    """Final literature review. Cite arXiv papers by arxiv_id only; their title, authors, year, link and abstract are filled in from arXiv."""
+    topic: str = Field(..., description="The topic or query for the literature review.")
+    papers: List[PaperDraft] = Field(..., description="List of relevant papers for this topic.")
+    summary: Optional[str] = Field(None, description="Overall summary or synthesis of findings across papers.")
+
 
 # structured_llm = llm.with_structured_output(json_schema)
 # review_llm = structured_llm.bind_tools(review_tool)
 
-tool_llm = llm.bind_tools(review_tool)
-review_llm = tool_llm.with_structured_output(LiteratureReview)
+def get_review_tools():
+    return [get_arxiv(), get_tavily_new()]  # Arxiv and Tavily for review
 
 
+@lazy
+def get_review_llm():
+    # Searches, then answers by calling the ReviewDraft tool
+    llm = get_llm()
+    return cached(llm.bind_tools([*get_review_tools(), ReviewDraft]), model=llm.model, normalize=True)
 
 
-####################################################################################
+@lazy
+def get_review_search_llm():
+    # Streamed reviews: searches only, then get_review_writer streams the answer as JSON
+    llm = get_llm()
+    return cached(llm.bind_tools(get_review_tools()), model=llm.model, normalize=True)
 
 
-def review_papers(user_query: str):
-    """
-    Handles the entire LLM → tool → structured output process.
-    """
+@lazy
+def get_review_writer():
+    # Structured output only: library-only reviews, and the fallback when the search loop ends without an answer
+    llm = get_llm()
+    return cached(
+        llm.with_structured_output(ReviewDraft),
+        model=llm.model,
+        schema=ReviewDraft,
+        normalize=True,
+    )
 
-    system_prompt = """
-    You are a literature review agent specialized in academic research.
-    Use the tools (arxiv, tavily) to fetch and analyze papers related to the user's query.
-    Retrieve factual information (titles, abstracts, methods, results, etc.)
-    and return it strictly as a JSON object following the provided schema.
-    """
 
-    messages = [
-        ("system", system_prompt),
-        ("human", user_query),
-    ]
+library_only_prompt = """
+The local paper library already holds these papers matching the query.
+Write the literature review from them only; do not search.
+
+{papers}
+"""
+
+library_hint_prompt = """
+The local paper library already holds these papers matching the query.
+Include the relevant ones and only search for what they do not cover.
 
-    # Step 1: LLM initial reasoning + tool usage
-    response = review_llm.invoke(messages)
+{papers}
+"""
 
-    # Step 2: If tool calls are generated, execute and feed results back
-    while hasattr(response, "tool_calls") and response.tool_calls:
-        for call in response.tool_calls:
-            tool_name = call["name"]
-            args = call["args"]
 
-            print(f" Model invoked tool: {tool_name} | Args: {args}")
+related_prompt = """
+These papers came up in earlier searches and are close in meaning to the query, even if worded differently.
+Include the relevant ones (cite arXiv papers by arxiv_id).
 
-            # Find matching tool
-            tool_fn = next(t for t in review_tool if t.name == tool_name)
-            tool_result = tool_fn.invoke(args)
+{papers}
+"""
 
-            print(f" Tool result snippet: {str(tool_result)[:300]}...")
+RELATED_PAPERS = 5
 
-            # Feed tool result back into the conversation
-            response = review_llm.invoke([
-                *messages,
-                ("tool", f"Tool '{tool_name}' output: {tool_result}")
-            ])
 
-    # Step 3: Final structured result
-    # Step 3: Handle structured result
+####################################################################################
+
+
+def related_papers(user_query: str, known_papers=(), k: int = RELATED_PAPERS):
+    """Semantically close papers from earlier searches (vector index), other than `known_papers`."""
+    from vector_index import RELATED_MIN_SCORE, paper_index
+    known = {paper_key(p) for p in known_papers}
+    hits = paper_index.search(user_query, k=k + len(known), min_score=RELATED_MIN_SCORE)
+    return [hit for hit in hits if hit["key"] not in known][:k]
+
+
+def review_messages(user_query: str, system_prompt: str = review_prompt, history=()):
+    """
+    Builds the review prompt and checks the local library first (Step 0).
+    Returns (messages, library_only): with library_only the library covers
+    the topic and the review is written without searching.
+    """
+    messages = [
+        ("system", system_prompt),
+        *history,
+        ("human", user_query),
+    ]
+    known_papers = paper_library.strong_hits(user_query)
+    arxiv_records.remember_papers(known_papers)
+    if paper_library.covers(user_query, known_papers):
+        print(f" Local library has {len(known_papers)} strong matches, skipping search tools")
+        messages.insert(1, ("system", library_only_prompt.format(papers=format_papers(known_papers))))
+        return messages, True
+    if known_papers:
+        print(f" Local library has {len(known_papers)} strong matches")
+        messages.insert(1, ("system", library_hint_prompt.format(papers=format_papers(known_papers))))
+    related = related_papers(user_query, known_papers)
+    if related:
+        print(f" Vector index has {len(related)} related papers from earlier searches")
+        arxiv_records.remember_papers(related)
+        messages.insert(1, ("system", related_prompt.format(papers=format_papers(related))))
+    return messages, False
+
+
+def fill_papers(papers):
+    """
+    Completes drafted papers: one with a known arXiv id takes its title,
+    authors, year, link and abstract from the arXiv record; the others
+    keep what the model wrote, and are dropped if that has no title.
+    """
+    records = arxiv_records.lookup(p["arxiv_id"] for p in papers if p.get("arxiv_id"))
+    filled = []
+    for paper in papers:
+        record = records.get(arxiv_records.normalize_id(paper.get("arxiv_id")))
+        facts = arxiv_records.paper_fields(record) if record else {
+            field: paper.get(field) for field in ("title", "authors", "year", "link", "abstract")
+        }
+        if facts["title"]:
+            filled.append({**facts, "key_contribution": paper.get("key_contribution"), "relevance": paper.get("relevance")})
+    return filled
+
+
+def review_result(response, user_query: str):
+    """Turns the model's answer into a dict (Step 3) and keeps its papers in the local library (Step 4)."""
     try:
+        # A draft from the model: fill the paper metadata from the arXiv records
+        if isinstance(response, ReviewDraft):
+            response = response.model_dump()
+        if isinstance(response, dict) and isinstance(response.get("papers"), list):
+            response = {**response, "papers": fill_papers(response["papers"])}
+
         # If it's already a Pydantic object
         if isinstance(response, LiteratureReview):
             data = response.dict()
-            print(json.dumps(data, indent=2))
-            return data
 
         # If it’s a JSON string inside response.content
         elif hasattr(response, "content"):
             data = json.loads(response.content)
-            print(json.dumps(data, indent=2))
-            return data
 
         # If it’s a dict already
         elif isinstance(response, dict):
-            print(json.dumps(response, indent=2))
-            return response
+            data = response
 
         else:
-            print(" Unexpected response type:", type(response))
-            print(response)
-            return response
+            return {"error": "Unexpected response format", "raw": str(response)}
 
     except Exception as e:
-        print("Error while parsing response:", e)
-        print("Raw output:")
-        print(response)
-        return response
+        return {"error": str(e), "raw": str(response)}
+
+    if isinstance(data.get("papers"), list):
+        try:
+            paper_library.add_papers(data["papers"], topic=user_query)
+        except Exception as e:
+            print(f" Could not store papers in the local library: {e}")
+
+    return data
+
+
+class PaperStream:
+    """
+    Papers of a streaming review: feed() takes each message chunk and
+    returns the papers completed since the last call, filled and
+    validated as SimplePaperInfo dicts.
+    """
+
+    def __init__(self):
+        self.messages = {}  # message id -> chunks added so far
+        self.sent = {}      # message id -> papers already returned
+
+    def feed(self, chunk):
+        key = chunk.id
+        message = self.messages[key] = self.messages[key] + chunk if key in self.messages else chunk
+        draft, complete = partial_answer(message, ReviewDraft)
+        papers = (draft or {}).get("papers")
+        if not isinstance(papers, list):
+            return []
+        # The last paper may still be streaming unless the answer has moved on to another field
+        done = len(papers) if complete or list(draft)[-1] != "papers" else len(papers) - 1
+        new = []
+        for paper in papers[self.sent.get(key, 0):done]:
+            try:
+                filled = fill_papers([PaperDraft.model_validate(paper).model_dump()])
+                new += [SimplePaperInfo.model_validate(p).model_dump() for p in filled]
+            except ValueError:
+                continue  # left for the final result
+        self.sent[key] = max(done, self.sent.get(key, 0))
+        return new
+
+
+def review_papers(user_query: str, system_prompt: str = review_prompt, history=(), thread_id: str = None,
+                  map_reduce: bool = False, timeout: float = aio.PIPELINE_TIMEOUT):
+    """
+    Handles the entire LLM → tool → structured output process.
+    `history` is earlier chat context (e.g. ConversationMemory.messages()).
+    Runs as the literature review agent of the work_agents graph, which
+    checkpoints every step: calling again with the same arguments (or
+    `thread_id`) after an interruption resumes instead of starting over.
+    With `map_reduce`, broad topics are reviewed by synthesis.py instead
+    (up to REVIEW_MAX_PAPERS papers, one note each, then the summary).
+    Always returns a dict: the review, or {"error": ..., "raw": ...}.
+    """
+    return aio.run(areview_papers(user_query, system_prompt, history, thread_id, map_reduce, timeout))
+
+
+@traced(name="review_papers")
+async def areview_papers(user_query: str, system_prompt: str = review_prompt, history=(), thread_id: str = None,
+                         map_reduce: bool = False, timeout: float = aio.PIPELINE_TIMEOUT):
+    """
+    review_papers as a coroutine. After `timeout` seconds this caller gets
+    an error; the run stops once no caller waits for it any more.
+    """
+    try:
+        return await _review(user_query, system_prompt, list(history), thread_id, map_reduce, timeout=timeout)
+    except TimeoutError:
+        return {"error": f"The review did not finish within {timeout:g}s", "raw": user_query}
+
+
+@coalesced(name="review_papers")
+async def _review(user_query, system_prompt, history, thread_id, map_reduce):
+    if map_reduce:
+        from synthesis import map_reduce_review
+        # synthesis runs its own thread pool, which is not cancelled with the run
+        return await asyncio.to_thread(lambda: review_result(map_reduce_review(user_query), user_query))
+    return await arun_graph(
+        user_query, agent="literature_review_agent", thread_id=thread_id,
+        system_prompt=system_prompt, history=history,
+    )
+
+
+@traced()
+def stream_review(user_query: str, system_prompt: str = review_prompt, history=(), thread_id: str = None):
+    """
+    review_papers as a generator: yields {"paper": {...}} for each paper as
+    soon as it is complete in the streamed answer, then {"review": result}
+    with the full review (or error) once it is validated and stored.
+    """
+    papers = PaperStream()
+    events = stream_graph(
+        user_query, agent="literature_review_agent", thread_id=thread_id,
+        system_prompt=system_prompt, history=list(history),
+    )
+    for kind, value in events:
+        if kind == "chunk":
+            for paper in papers.feed(value):
+                yield {"paper": paper}
+        else:
+            yield {"review": value}
 
 
 
@@ -124,6 +301,7 @@ def review_papers(user_query: str):
 if __name__ == "__main__":
     user_query = input("Enter your literature review topic: ")
     result = review_papers(user_query)
+    print(json.dumps(result, indent=2, ensure_ascii=False))
 
 
 
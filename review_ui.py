@@ -1,83 +1,8 @@
 import streamlit as st
 import json
-from dotenv import load_dotenv
-from tools import llm, tools
-from pydantic import BaseModel, Field
-from typing import List, Optional
-import os
-from langchain_tavily import TavilySearch
-
-# -------------------------------
-# Load environment
-# -------------------------------
-load_dotenv()
-os.environ["GOOGLE_API_KEY"] = os.getenv("GEMINI_API_KEY")
-os.environ["TAVILY_API_KEY"] = os.getenv("TAVILY_API_KEY")
-
-# -------------------------------
-# Define models and tools
-# -------------------------------
-tavily_new = TavilySearch(max_results=10, search_depth="advanced")
-review_tool = [tools[0], tavily_new]
-
-class SimplePaperInfo(BaseModel):
-    title: str = Field(..., description="Title of the paper.")
-    authors: Optional[List[str]] = Field(None, description="Authors of the paper, if available.")
-    year: Optional[int] = Field(None, description="Publication year, if known.")
-    link: Optional[str] = Field(None, description="Link to the paper (arXiv or other).")
-    abstract: Optional[str] = Field(None, description="Brief abstract or summary of the paper.")
-    key_contribution: Optional[str] = Field(None, description="Main idea or contribution of the paper.")
-    relevance: str = Field(..., description="Why this paper is relevant to the user’s topic.")
-
-class LiteratureReview(BaseModel):
-    topic: str = Field(..., description="The topic or query for the literature review.")
-    papers: List[SimplePaperInfo] = Field(..., description="List of relevant papers for this topic.")
-    summary: Optional[str] = Field(None, description="Overall summary or synthesis of findings across papers.")
-
-tool_llm = llm.bind_tools(review_tool)
-review_llm = tool_llm.with_structured_output(LiteratureReview)
-
-# -------------------------------
-# Backend function
-# -------------------------------
-def review_papers(user_query: str):
-    system_prompt = """
-    You are a literature review agent specialized in academic research.
-    Use the tools (arxiv, tavily) to fetch and analyze papers related to the user's query.
-    Retrieve factual information (titles, abstracts, methods, results, etc.)
-    and return it strictly as a JSON object following the provided schema.
-    If the user query is very broad, ask the user and try to narrow it down and focus on the most relevant aspects.
-    """
-
-    messages = [
-        ("system", system_prompt),
-        ("human", user_query),
-    ]
-
-    response = review_llm.invoke(messages)
-
-    while hasattr(response, "tool_calls") and response.tool_calls:
-        for call in response.tool_calls:
-            tool_name = call["name"]
-            args = call["args"]
-            tool_fn = next(t for t in review_tool if t.name == tool_name)
-            tool_result = tool_fn.invoke(args)
-            response = review_llm.invoke([
-                *messages,
-                ("tool", f"Tool '{tool_name}' output: {tool_result}")
-            ])
-
-    try:
-        if isinstance(response, LiteratureReview):
-            return response.dict()
-        elif hasattr(response, "content"):
-            return json.loads(response.content)
-        elif isinstance(response, dict):
-            return response
-        else:
-            return {"error": "Unexpected response format", "raw": str(response)}
-    except Exception as e:
-        return {"error": str(e), "raw": str(response)}
+import time
+import backend
+from prompt_library_2 import review_narrowing_prompt
 
 # -------------------------------
 # Streamlit UI
@@ -90,16 +15,64 @@ st.caption("Automatically find and summarize academic papers for your research t
 # Session state for caching results
 if "review_data" not in st.session_state:
     st.session_state.review_data = None
+if "review_job" not in st.session_state:
+    st.session_state.review_job = None  # background job (backend.submit_job) this session is waiting on
+
+
+def show_paper(i, paper):
+    with st.expander(f"**{i}. {paper['title']}**"):
+        st.write(f"**Authors:** {', '.join(paper.get('authors', [])) if paper.get('authors') else 'N/A'}")
+        st.write(f"**Year:** {paper.get('year', 'N/A')}")
+        st.write(f"**Key Contribution:** {paper.get('key_contribution', 'N/A')}")
+        st.write(f"**Relevance:** {paper['relevance']}")
+        if paper.get("abstract"):
+            st.markdown(f"**Abstract:**\n{paper['abstract']}")
+        if paper.get("link"):
+            st.markdown(f"[🔗 View Paper]({paper['link']})")
+
+
+def job_result(job):
+    """The review of a finished job (stream_review jobs end with {"review": ...})."""
+    if job.get("status") != "done":
+        return {"error": job.get("error") or f"Review {job.get('status', 'failed')}"}
+    result = job["result"] or {"error": "No review was returned"}
+    return result.get("review", result)
+
 
 topic = st.text_input("Enter your research topic or query:")
+broad = st.checkbox("Broad review (up to 100 papers, slower the first time)")
 
-if st.button("Generate Literature Review"):
+if st.button("Generate Literature Review", disabled=st.session_state.review_job is not None):
     if not topic.strip():
         st.warning("Please enter a research topic.")
     else:
-        with st.spinner("Fetching and analyzing papers..."):
-            result = review_papers(topic)
-            st.session_state.review_data = result
+        if broad:
+            job = backend.submit_job("review_papers", user_query=topic, system_prompt=review_narrowing_prompt, map_reduce=True)
+        else:
+            job = backend.submit_job("stream_review", user_query=topic, system_prompt=review_narrowing_prompt)
+        st.session_state.review_data = job if "error" in job else None
+        st.session_state.review_job = job.get("id")
+
+# A running job survives reruns: show its progress and the papers written so far, then poll again
+if st.session_state.review_job:
+    job = backend.job_status(st.session_state.review_job)
+    if job.get("status") in ("queued", "running"):
+        st.info("Waiting for a free worker..." if job["status"] == "queued" else "Fetching and analyzing papers...")
+        if job["progress"]:
+            st.caption(job["progress"][-1]["message"])
+        if st.button("Cancel"):
+            backend.cancel_job(st.session_state.review_job)
+            st.session_state.review_job = None
+            st.rerun()
+        papers = [item["paper"] for item in job["items"] if "paper" in item]
+        if papers:
+            st.markdown("###  Relevant Papers")
+            for i, paper in enumerate(papers, start=1):
+                show_paper(i, paper)
+        time.sleep(1)
+        st.rerun()
+    st.session_state.review_job = None
+    st.session_state.review_data = job_result(job)
 
 # Display Results
 if st.session_state.review_data:
@@ -116,15 +89,7 @@ if st.session_state.review_data:
 
         st.markdown("###  Relevant Papers")
         for i, paper in enumerate(data["papers"], start=1):
-            with st.expander(f"**{i}. {paper['title']}**"):
-                st.write(f"**Authors:** {', '.join(paper.get('authors', [])) if paper.get('authors') else 'N/A'}")
-                st.write(f"**Year:** {paper.get('year', 'N/A')}")
-                st.write(f"**Key Contribution:** {paper.get('key_contribution', 'N/A')}")
-                st.write(f"**Relevance:** {paper['relevance']}")
-                if paper.get("abstract"):
-                    st.markdown(f"**Abstract:**\n{paper['abstract']}")
-                if paper.get("link"):
-                    st.markdown(f"[🔗 View Paper]({paper['link']})")
+            show_paper(i, paper)
 
         st.divider()
         json_str = json.dumps(data, indent=2)
@@ -0,0 +1,264 @@
+"""
+Offline fast path for the LLM routers (ideation QueryLevelSchema and
+work_agents RouterAgentSchema).
+
+Each routed field has a LocalClassifier: weighted keyword rules, blended
+with a multinomial Naive Bayes model trained on the decisions the LLM
+router made earlier (logged to .cache/router_decisions.jsonl, of which the last
+ROUTER_MAX_DECISIONS are kept). `route`
+only calls the LLM when a classifier is not confident, and caches the
+decision for the session.
+"""
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict, deque
+
+CACHE_DIR = os.getenv("RESEARCH_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+DECISION_LOG = os.getenv("ROUTER_DECISION_LOG", os.path.join(CACHE_DIR, "router_decisions.jsonl"))
+CONFIDENCE_THRESHOLD = float(os.getenv("ROUTER_CONFIDENCE", "0.75"))
+MIN_TRAINING_EXAMPLES = 20
+MAX_DECISIONS = int(os.getenv("ROUTER_MAX_DECISIONS", "5000"))
+
+_lock = threading.Lock()
+stats = Counter()
+
+
+def tokenize(text: str):
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+def normalize(text: str) -> str:
+    return " ".join(tokenize(text))
+
+
+class LocalClassifier:
+    """Keyword scorer plus an incrementally trained Naive Bayes model for one routed field."""
+
+    def __init__(self, name: str, keywords: dict, default: str, threshold: float = CONFIDENCE_THRESHOLD, short_query_label: str = None):
+        self.name = name
+        self.labels = list(keywords)
+        self.keywords = keywords
+        self.default = default
+        self.threshold = threshold
+        self.short_query_label = short_query_label
+        self.word_counts = defaultdict(Counter)
+        self.label_counts = Counter()
+
+    # ---- keyword rules
+    def keyword_scores(self, text: str):
+        padded = f" {normalize(text)} "
+        scores = {label: 0.0 for label in self.labels}
+        for label, phrases in self.keywords.items():
+            for phrase, weight in phrases.items():
+                if f" {phrase} " in padded:
+                    scores[label] += weight
+        if self.short_query_label and len(tokenize(text)) <= 4:
+            scores[self.short_query_label] += 1.0
+        return scores
+
+    # ---- Naive Bayes on logged decisions
+    def learn(self, text: str, label: str):
+        if label not in self.labels:
+            return
+        self.label_counts[label] += 1
+        self.word_counts[label].update(tokenize(text))
+
+    def nb_probabilities(self, text: str):
+        total = sum(self.label_counts.values())
+        if total < MIN_TRAINING_EXAMPLES:
+            return None
+        vocabulary = set().union(*self.word_counts.values())
+        log_scores = {}
+        for label in self.labels:
+            words = self.word_counts[label]
+            denominator = sum(words.values()) + len(vocabulary)
+            score = math.log((self.label_counts[label] + 1) / (total + len(self.labels)))
+            for token in tokenize(text):
+                score += math.log((words[token] + 1) / denominator)
+            log_scores[label] = score
+        return _softmax(log_scores)
+
+    def predict(self, text: str):
+        """
+        Returns (label, confidence). When nothing in the text points anywhere
+        (no keyword, no trained model) it is (default, 1 / number of labels).
+        """
+        scores = self.keyword_scores(text)
+        nb_probs = self.nb_probabilities(text)
+        if max(scores.values()) == 0:
+            if not nb_probs:
+                return self.default, 1 / len(self.labels)
+            keyword_probs = {label: 1 / len(self.labels) for label in self.labels}
+        else:
+            keyword_probs = _softmax({label: 2 * s for label, s in scores.items()})
+
+        if nb_probs:
+            probs = {label: (keyword_probs[label] + nb_probs[label]) / 2 for label in self.labels}
+        else:
+            probs = keyword_probs
+
+        label = max(probs, key=probs.get)
+        return label, probs[label]
+
+
+def _softmax(scores: dict):
+    top = max(scores.values())
+    exps = {k: math.exp(v - top) for k, v in scores.items()}
+    total = sum(exps.values())
+    return {k: v / total for k, v in exps.items()}
+
+
+# -------------------------------
+# Classifiers for each router
+# -------------------------------
+ideation_technique = LocalClassifier(
+    "ideation_technique",
+    {
+        "Basic": {"idea": 1, "ideas": 1, "project idea": 1.5, "suggest": 1, "brainstorm": 1, "simple": 1, "quick": 1,
+                  "short": 1, "what is": 1, "inspire": 1, "any": 0.5, "give me": 0.5},
+        "Chain-of-thought": {"how": 1, "why": 1, "step": 1.5, "steps": 1.5, "step by step": 2, "compare": 1.5,
+                             "analyze": 1.5, "analyse": 1.5, "analysis": 1.5, "evaluate": 1.5, "trade off": 1.5,
+                             "tradeoffs": 1.5, "pros and cons": 2, "architecture": 1, "design": 1, "plan": 1,
+                             "methodology": 1.5, "pipeline": 1, "versus": 1, "vs": 1, "detailed": 1, "in detail": 1.5},
+    },
+    default="Basic",
+    short_query_label="Basic",
+)
+
+ideation_type = LocalClassifier(
+    "ideation_type",
+    {
+        "Product_Based": {"product": 2, "app": 1.5, "startup": 2, "build": 1, "market": 1.5, "users": 1, "customers": 1.5,
+                          "business": 1.5, "platform": 1, "prototype": 1.5, "mvp": 2, "monetize": 2, "service": 1,
+                          "device": 1, "hackathon": 1.5, "launch": 1, "tool": 1},
+        "Depth_Research": {"research": 1.5, "paper": 1.5, "papers": 1.5, "thesis": 2, "study": 1, "literature": 1.5,
+                           "gap": 1.5, "gaps": 1.5, "novel": 1, "dataset": 1, "algorithm": 1, "theory": 1.5,
+                           "experiment": 1, "survey": 1, "publish": 1.5, "academic": 1.5, "phd": 2,
+                           "dissertation": 2, "state of the art": 1.5, "sota": 1.5, "benchmark": 1},
+    },
+    default="Depth_Research",
+)
+
+agent_router = LocalClassifier(
+    "agent_router",
+    {
+        "ideation_agent": {"idea": 1.5, "ideas": 1.5, "brainstorm": 2, "project": 1, "understand": 1, "explain": 1,
+                           "what is": 1, "learn": 1, "concept": 1, "direction": 1, "in short": 1},
+        "literature_review_agent": {"paper": 1.5, "papers": 1.5, "literature": 2, "review": 1.5, "survey": 1.5,
+                                    "related work": 2, "arxiv": 2, "state of the art": 1.5, "studies": 1, "citations": 1.5},
+        "conference_agent": {"conference": 2.5, "conferences": 2.5, "cfp": 2.5, "call for papers": 2.5, "submit": 1.5,
+                             "submission": 1.5, "deadline": 2, "deadlines": 2, "venue": 1.5, "workshop": 1.5,
+                             "symposium": 2},
+    },
+    default="ideation_agent",
+)
+
+classifiers = {c.name: c for c in (ideation_technique, ideation_type, agent_router)}
+
+
+_logged = 0  # lines in the decision log
+
+
+def _compact_decision_log():
+    """Cuts the decision log down to its last MAX_DECISIONS lines; returns them."""
+    global _logged
+    if not os.path.exists(DECISION_LOG):
+        return []
+    total, tail = 0, deque(maxlen=MAX_DECISIONS)
+    with open(DECISION_LOG, encoding="utf-8") as f:
+        for line in f:
+            total += 1
+            tail.append(line)
+    if total > len(tail):
+        temp = f"{DECISION_LOG}.{os.getpid()}.tmp"
+        with open(temp, "w", encoding="utf-8") as f:
+            f.writelines(tail)
+        os.replace(temp, DECISION_LOG)
+    _logged = len(tail)
+    return tail
+
+
+def _load_decision_log():
+    for line in _compact_decision_log():
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if entry.get("classifier") in classifiers:
+            classifiers[entry["classifier"]].learn(entry["text"], entry["label"])
+
+
+def _log_decision(classifier: LocalClassifier, text: str, label: str):
+    global _logged
+    classifier.learn(text, label)
+    os.makedirs(os.path.dirname(DECISION_LOG), exist_ok=True)
+    with open(DECISION_LOG, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"classifier": classifier.name, "text": text, "label": label}) + "\n")
+    _logged += 1
+    if _logged >= 2 * MAX_DECISIONS:
+        _compact_decision_log()  # a long-running process: keep the file bounded too
+
+
+_loaded = False
+
+
+def _ensure_loaded():
+    global _loaded
+    with _lock:
+        if not _loaded:
+            _load_decision_log()
+            _loaded = True
+
+
+def route(text: str, fields: dict, schema, llm_fallback, session_cache: dict = None):
+    """
+    Fills `schema` for `text`.
+    `fields` maps each schema field to its LocalClassifier. If every field is
+    predicted confidently the LLM is skipped; otherwise `llm_fallback()` is
+    called and its answer is logged as training data. Decisions are cached in
+    `session_cache` (e.g. a dict in st.session_state) by normalized text.
+    """
+    result = _route_locally(text, fields, schema, session_cache)
+    if result is None:
+        result = _remember(text, fields, llm_fallback(), session_cache)
+    return result
+
+
+async def aroute(text: str, fields: dict, schema, allm_fallback, session_cache: dict = None):
+    """`route` with a coroutine function as the LLM fallback."""
+    result = _route_locally(text, fields, schema, session_cache)
+    if result is None:
+        result = _remember(text, fields, await allm_fallback(), session_cache)
+    return result
+
+
+def _route_locally(text, fields, schema, session_cache):
+    """The cached or confidently predicted decision, else None (the LLM has to decide)."""
+    _ensure_loaded()
+    key = normalize(text)
+    if session_cache is not None and key in session_cache:
+        stats["session_hits"] += 1
+        return schema(**session_cache[key])
+
+    predictions = {field: clf.predict(text) for field, clf in fields.items()}
+    if not all(confidence >= fields[field].threshold for field, (_, confidence) in predictions.items()):
+        stats["llm"] += 1
+        return None
+    stats["local"] += 1
+    result = schema(**{field: label for field, (label, _) in predictions.items()})
+    if session_cache is not None:
+        session_cache[key] = result.model_dump()
+    return result
+
+
+def _remember(text, fields, result, session_cache):
+    """Logs the LLM's decision as training data and caches it for the session."""
+    with _lock:
+        for field, clf in fields.items():
+            _log_decision(clf, text, getattr(result, field))
+    if session_cache is not None:
+        session_cache[normalize(text)] = result.model_dump()
+    return result
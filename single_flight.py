@@ -0,0 +1,136 @@
+"""
+Request coalescing: identical calls that overlap in time run once.
+
+When a class types the same topic within a minute, every request after
+the first finds the same call already in flight, waits for it and gets
+a copy of its result instead of starting another Gemini + search run.
+Calls are identical when their normalized arguments match (case and
+whitespace in strings are ignored, as in tool_cache). Nothing is kept
+once the call returns; caching finished results is the job of the
+LLM/tool caches and the graph checkpoints.
+
+Coroutine functions are coalesced the same way (`ado`): the call runs as
+its own task on the shared event loop (aio.py) and every caller waits for
+it with its own `timeout`. A caller that times out or is cancelled only
+stops waiting; the call is cancelled once no caller is left.
+
+Waiters are counted in research_coalesced_total{name=...} at /metrics.
+"""
+import asyncio
+import copy
+import functools
+import inspect
+import threading
+from concurrent.futures import Future
+
+import aio
+import tracing
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.RLock()  # a cancelled call's done callback runs under it
+        self._calls = {}  # key -> Future of the running call ({"future", "waiters"} for coroutines)
+
+    def do(self, key: str, fn, *args, **kwargs):
+        """Runs fn(*args, **kwargs), or waits for the running call with the same key and returns a copy of its result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+        if not leader:
+            tracing.increment("research_coalesced_total", name=self.name)
+            tracing.annotate(coalesced=True)
+            return copy.deepcopy(call.result())  # the caller may change its copy
+        try:
+            result = fn(*args, **kwargs)
+            call.set_result(copy.deepcopy(result))  # the waiters' copy, safe from changes by this caller
+            return result
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    async def ado(self, key: str, fn, *args, timeout: float = None, **kwargs):
+        """
+        `do` for a coroutine function. Callers on any thread or event loop
+        wait up to their own `timeout` (then TimeoutError) for one shared run
+        of `fn(*args, **kwargs)`, and each gets a copy of its result.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = {"future": aio.submit(fn(*args, **kwargs)), "waiters": 0}
+                call["future"].add_done_callback(lambda _: self._drop(key, call))
+            else:
+                tracing.increment("research_coalesced_total", name=self.name)
+                tracing.annotate(coalesced=True)
+            call["waiters"] += 1
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(_follow(call["future"])), timeout)
+        finally:
+            with self._lock:
+                call["waiters"] -= 1
+                if not call["waiters"] and not call["future"].done():
+                    call["future"].cancel()  # nobody waits for it any more
+        return copy.deepcopy(result)  # callers may change their copy
+
+    def _drop(self, key, call):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+
+
+def _follow(call: Future) -> Future:
+    """A Future that follows `call`: cancelling it (a waiter giving up) leaves `call` alone."""
+    follower = Future()
+
+    def copy_result(done):
+        if done.cancelled():
+            follower.cancel()
+            return
+        if not follower.set_running_or_notify_cancel():
+            return
+        if done.exception() is not None:
+            follower.set_exception(done.exception())
+        else:
+            follower.set_result(done.result())
+    call.add_done_callback(copy_result)
+    return follower
+
+
+def coalesced(name: str = None, ignore=()):
+    """
+    Decorator: overlapping calls with the same arguments (except `ignore`)
+    share one run. Callers of a coroutine function may pass `timeout=`
+    (seconds they wait for the shared run; it is not passed to it).
+    """
+    from tool_cache import make_key  # tool_cache coalesces its own calls with SingleFlight
+
+    def decorate(fn):
+        flight = SingleFlight(name or fn.__name__)
+        signature = inspect.signature(fn)
+
+        def call_key(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            return make_key(flight.name, {k: v for k, v in bound.arguments.items() if k not in ignore})
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, timeout: float = None, **kwargs):
+                return await flight.ado(call_key(args, kwargs), fn, *args, timeout=timeout, **kwargs)
+            async_wrapper.flight = flight
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return flight.do(call_key(args, kwargs), fn, *args, **kwargs)
+
+        wrapper.flight = flight
+        return wrapper
+    return decorate
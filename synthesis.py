@@ -0,0 +1,265 @@
+"""
+Map-reduce literature reviews, for topics that need far more papers than
+one structured generation can hold.
+
+    gather -> map (one note per paper, in parallel) -> reduce (summary)
+
+`gather` collects candidate papers without the agent loop: arXiv records,
+Tavily results, strong local-library hits and related papers from the
+vector index, with duplicates collapsed. `map` asks the model for a short
+note per paper (is it relevant, key contribution, why it matters), with at
+most MAP_CONCURRENCY calls in flight; a failed paper costs only its own
+note. Notes are stored per (paper, topic) in .cache/paper_notes.sqlite3,
+so re-running or widening a review only summarizes the new papers.
+`reduce` writes the summary from the notes, in groups of REDUCE_GROUP
+and then from the group summaries when the set is large.
+
+    python synthesis.py "graph neural networks for drug discovery" --max-papers 120
+"""
+import argparse
+import contextvars
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from pydantic import BaseModel, Field
+
+import arxiv_records
+import tracing
+import vector_index
+from llm_cache import cached, normalize_text
+from paper_library import paper_key, paper_library
+from tool_cache import tool_cache
+from tool_compaction import parse_records
+from tools import get_llm, get_arxiv, get_tavily_new, lazy
+
+CACHE_DIR = os.getenv("RESEARCH_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+NOTES_PATH = os.getenv("PAPER_NOTES_PATH", os.path.join(CACHE_DIR, "paper_notes.sqlite3"))
+MAX_PAPERS = int(os.getenv("REVIEW_MAX_PAPERS", "100"))
+MAP_CONCURRENCY = int(os.getenv("MAP_CONCURRENCY", "8"))
+REDUCE_GROUP = int(os.getenv("REDUCE_GROUP", "25"))
+GROUP_FALLBACK_CHARS = 3000  # a group whose summary failed goes up as its own notes, clipped to this
+
+
+class PaperNote(BaseModel):
+    relevant: bool = Field(..., description="Whether the paper is relevant to the topic.")
+    key_contribution: str = Field(..., description="Main idea or contribution of the paper, in one or two sentences.")
+    relevance: str = Field(..., description="Why this paper matters for the topic, in one sentence.")
+
+
+map_prompt = """
+You are helping write a literature review on: {topic}
+
+Read this paper and write a short note about it.
+
+Title: {title}
+Year: {year}
+Abstract: {abstract}
+"""
+
+group_prompt = """
+Below are notes on papers for a literature review on: {topic}
+
+Summarize the themes, methods and findings they share, and where they disagree, in one paragraph.
+Mention papers by their number.
+
+{notes}
+"""
+
+reduce_prompt = """
+Write the overall summary of a literature review on: {topic}
+
+Synthesize the findings across the material below (one or two paragraphs): main approaches,
+what works, open problems and directions. Do not list papers one by one.
+
+{notes}
+"""
+
+
+@lazy
+def get_note_writer():
+    llm = get_llm()
+    return cached(llm.with_structured_output(PaperNote), model=llm.model, schema=PaperNote, normalize=True)
+
+
+# -------------------------------
+# Note cache
+# -------------------------------
+class NoteStore:
+    """Per (paper, topic) notes from the map step."""
+
+    def __init__(self, path: str = NOTES_PATH):
+        self.path = path
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS paper_notes (
+                    paper TEXT NOT NULL,
+                    topic TEXT NOT NULL,
+                    note TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (paper, topic)
+                )
+            """)
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, papers, topic: str) -> dict:
+        keys = [paper_key(p) for p in papers]
+        if not keys:
+            return {}
+        rows = self._conn().execute(
+            f"SELECT paper, note FROM paper_notes WHERE topic = ? AND paper IN ({','.join('?' * len(keys))})",
+            [normalize_text(topic), *keys],
+        ).fetchall()
+        return {paper: json.loads(note) for paper, note in rows}
+
+    def set(self, paper: dict, topic: str, note: dict):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO paper_notes(paper, topic, note, created_at) VALUES (?, ?, ?, ?)",
+                (paper_key(paper), normalize_text(topic), json.dumps(note), time.time()),
+            )
+
+
+note_store = NoteStore()
+
+
+# -------------------------------
+# Gather
+# -------------------------------
+def gather_papers(topic: str, max_papers: int = MAX_PAPERS):
+    """Candidate papers for `topic` as SimplePaperInfo-style dicts, arXiv first, duplicates collapsed."""
+    records = tool_cache.invoke(get_arxiv(), {"query": topic, "max_results": max_papers})
+    arxiv_records.remember(records)
+    papers = [arxiv_records.paper_fields(r) for r in records] if isinstance(records, list) else []
+    papers += paper_library.strong_hits(topic)
+    papers += vector_index.paper_index.search(topic, k=10, min_score=vector_index.RELATED_MIN_SCORE)
+    web = tool_cache.invoke(get_tavily_new(), {"query": topic})
+    papers += [{"title": r["title"], "link": r["url"], "abstract": r["text"]} for r in parse_records(web) if r["title"]]
+
+    fields = ("title", "authors", "year", "link", "abstract")
+    papers = [{field: p.get(field) for field in fields} for p in papers if p.get("title")]
+    unique = vector_index.SeenRecords().collapse(papers)
+    vector_index.paper_index.add(unique, source="synthesis")
+    return unique[:max_papers]
+
+
+# -------------------------------
+# Map
+# -------------------------------
+def _note(paper: dict, topic: str) -> dict:
+    with tracing.span("map", "paper_note"):
+        note = get_note_writer().invoke(map_prompt.format(
+            topic=topic, title=paper["title"], year=paper.get("year") or "n.d.",
+            abstract=(paper.get("abstract") or "No abstract available.")[:3000],
+        ))
+    note = note.model_dump()
+    note_store.set(paper, topic, note)
+    return note
+
+
+def map_papers(papers, topic: str, concurrency: int = MAP_CONCURRENCY):
+    """Note per paper (None where the model call failed); cached notes are reused. Returns (notes, new_count)."""
+    known = note_store.get_many(papers, topic)
+    notes = [known.get(paper_key(p)) for p in papers]
+    todo = [i for i, note in enumerate(notes) if note is None]
+    if todo:
+        print(f" Summarizing {len(todo)} new papers ({len(papers) - len(todo)} cached)")
+        with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="map") as pool:
+            futures = {i: pool.submit(contextvars.copy_context().run, _note, papers[i], topic) for i in todo}
+            for i, future in futures.items():
+                try:
+                    notes[i] = future.result()
+                except Exception as e:
+                    print(f" Could not summarize '{papers[i]['title']}': {e}")
+    return notes, len(todo)
+
+
+# -------------------------------
+# Reduce
+# -------------------------------
+def _text(response) -> str:
+    content = getattr(response, "content", response)
+    if isinstance(content, list):
+        return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+    return content or ""
+
+
+def reduce_notes(entries, topic: str, group_size: int = REDUCE_GROUP) -> str:
+    """
+    Summary from "[i] title: note" entries. Larger sets are summarized per
+    group first, and then from the group summaries (repeated as needed).
+    A group whose call fails is passed up as its clipped entries instead.
+    """
+    llm = get_llm()
+    while len(entries) > group_size:
+        groups = [entries[i:i + group_size] for i in range(0, len(entries), group_size)]
+        with ThreadPoolExecutor(max_workers=max(1, min(len(groups), MAP_CONCURRENCY)), thread_name_prefix="reduce") as pool:
+            futures = [
+                pool.submit(contextvars.copy_context().run, llm.invoke, group_prompt.format(topic=topic, notes="\n".join(group)))
+                for group in groups
+            ]
+            entries = [_group_summary(n, f, group) for n, (f, group) in enumerate(zip(futures, groups), start=1)]
+    with tracing.span("reduce", "summary", inputs=len(entries)):
+        return _text(llm.invoke(reduce_prompt.format(topic=topic, notes="\n".join(entries))))
+
+
+def _group_summary(n: int, future, group) -> str:
+    try:
+        return f"Group {n}: {_text(future.result())}"
+    except Exception as e:
+        print(f" Could not summarize group {n}, keeping its notes: {e}")
+        return f"Group {n} (notes): " + " ".join(group)[:GROUP_FALLBACK_CHARS]
+
+
+@tracing.traced()
+def map_reduce_review(topic: str, max_papers: int = MAX_PAPERS, concurrency: int = MAP_CONCURRENCY):
+    """Literature review dict ({"topic", "papers", "summary"}) built by gather -> map -> reduce."""
+    papers = gather_papers(topic, max_papers)
+    if not papers:
+        return {"error": "No papers found", "raw": topic}
+    notes, new = map_papers(papers, topic, concurrency)
+
+    # Papers whose note failed are left out (and retried next time, as nothing was cached for them)
+    reviewed, entries, failed, irrelevant = [], [], 0, 0
+    for paper, note in zip(papers, notes):
+        if note is None:
+            failed += 1
+            continue
+        if not note["relevant"]:
+            irrelevant += 1
+            continue
+        reviewed.append({**paper, "key_contribution": note["key_contribution"], "relevance": note["relevance"]})
+        entries.append(f"[{len(reviewed)}] {paper['title']} ({paper.get('year') or 'n.d.'}): {note['key_contribution']} {note['relevance']}")
+
+    tracing.annotate(papers=len(papers), new_notes=new, failed_notes=failed, irrelevant=irrelevant)
+    if failed == len(papers):
+        return {"error": "Could not summarize any paper", "raw": topic}
+    try:
+        summary = reduce_notes(entries, topic) if entries else None
+    except Exception as e:
+        # The paper notes are the expensive part; keep them
+        print(f" Could not write the summary: {e}")
+        tracing.annotate(summary_error=str(e))
+        summary = f"The summary could not be written ({e}); the reviewed papers are listed with their notes."
+    return {"topic": topic, "papers": reviewed, "summary": summary}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Map-reduce literature review for a broad topic.")
+    parser.add_argument("topic")
+    parser.add_argument("--max-papers", type=int, default=MAX_PAPERS)
+    parser.add_argument("-c", "--concurrency", type=int, default=MAP_CONCURRENCY)
+    args = parser.parse_args()
+    print(json.dumps(map_reduce_review(args.topic, args.max_papers, args.concurrency), indent=2, ensure_ascii=False))
@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import tracing
+from rate_limiter import acall_with_retry, call_with_retry
+from single_flight import SingleFlight
+
+# -------------------------------
+# Settings
+# -------------------------------
+CACHE_DIR = os.getenv("RESEARCH_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+CACHE_PATH = os.getenv("TOOL_CACHE_PATH", os.path.join(CACHE_DIR, "tool_cache.sqlite3"))
+MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", "5000"))
+
+# How long (seconds) a result stays fresh for each provider.
+PROVIDER_TTL = {
+    "arxiv": 7 * 24 * 3600,      # papers do not change once listed
+    "wikipedia": 3 * 24 * 3600,
+    "tavily": 6 * 3600,          # web search, CFP pages move quickly
+}
+DEFAULT_TTL = 3600
+
+
+def normalize_args(args):
+    """Lower-cases and collapses whitespace in string arguments so trivial variations share a key."""
+    if isinstance(args, str):
+        return " ".join(args.split()).lower()
+    if isinstance(args, dict):
+        return {k: normalize_args(v) for k, v in sorted(args.items())}
+    if isinstance(args, (list, tuple)):
+        return [normalize_args(v) for v in args]
+    return args
+
+
+def make_key(cache_name: str, args) -> str:
+    payload = json.dumps([cache_name, normalize_args(args)], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def _run_tool(tool, args):
+    # Sync invoke in a worker thread rather than tool.ainvoke: langchain_tavily's async path opens
+    # a new aiohttp session per call, while the sync one uses the pooled session (tools.use_pooled_http)
+    return await asyncio.to_thread(tool.invoke, args)
+
+
+def is_error_result(result) -> bool:
+    """Failed lookups are returned as values by the wrappers; never cache them."""
+    if isinstance(result, dict):
+        return "error" in result
+    if isinstance(result, str):
+        return result.startswith("Arxiv exception") or result.startswith("Error")
+    return False
+
+
+class ToolCache:
+    """
+    SQLite cache for search tool results, shared across processes.
+    Entries expire per provider TTL and the least recently used ones are
+    evicted once the table grows past `max_entries`.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = MAX_ENTRIES, ttl: dict = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = {**PROVIDER_TTL, **(ttl or {})}
+        self._local = threading.local()
+        self._flight = SingleFlight("tool_calls")  # identical misses in flight share one provider call
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS tool_results (
+                    key TEXT PRIMARY KEY,
+                    provider TEXT NOT NULL,
+                    tool TEXT NOT NULL,
+                    args TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_tool_results_last_used ON tool_results(last_used);
+                CREATE TABLE IF NOT EXISTS tool_cache_stats (
+                    provider TEXT PRIMARY KEY,
+                    hits INTEGER NOT NULL DEFAULT 0,
+                    misses INTEGER NOT NULL DEFAULT 0
+                );
+            """)
+            self._local.conn = conn
+        return conn
+
+    def _count(self, conn, provider: str, column: str):
+        conn.execute(
+            f"INSERT INTO tool_cache_stats(provider, {column}) VALUES (?, 1) "
+            f"ON CONFLICT(provider) DO UPDATE SET {column} = {column} + 1",
+            (provider,),
+        )
+
+    def get(self, provider: str, key: str):
+        """Returns (True, value) on a fresh hit, (False, None) otherwise."""
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            row = conn.execute("SELECT value, created_at FROM tool_results WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] <= self.ttl.get(provider, DEFAULT_TTL):
+                conn.execute("UPDATE tool_results SET last_used = ? WHERE key = ?", (now, key))
+                self._count(conn, provider, "hits")
+                return True, json.loads(row[0])
+            if row:
+                conn.execute("DELETE FROM tool_results WHERE key = ?", (key,))
+            self._count(conn, provider, "misses")
+        return False, None
+
+    def set(self, provider: str, key: str, tool_name: str, args, value):
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO tool_results(key, provider, tool, args, value, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, tool_name, json.dumps(args, default=str), json.dumps(value, default=str), now, now),
+            )
+            # LRU eviction once the table is over budget
+            conn.execute(
+                "DELETE FROM tool_results WHERE key IN ("
+                "  SELECT key FROM tool_results ORDER BY last_used ASC"
+                "  LIMIT max(0, (SELECT COUNT(*) FROM tool_results) - ?))",
+                (self.max_entries,),
+            )
+
+    def invoke(self, tool, args):
+        """
+        Runs `tool` with `args`, serving the result from cache when possible.
+        Tools opt in through `metadata={"cache_name": ..., "provider": ...}`;
+        misses run under the provider's rate limit (see rate_limiter.py).
+        """
+        metadata = tool.metadata or {}
+        cache_name = metadata.get("cache_name")
+        if not cache_name:
+            return tool.invoke(args)
+
+        provider = metadata.get("provider", cache_name)
+        key = make_key(cache_name, args)
+        found, value = self.get(provider, key)
+        tracing.annotate(cache_hit=found, provider=provider)
+        if found:
+            return value
+
+        return self._flight.do(key, self._fetch, tool, args, provider, key, cache_name)
+
+    def _fetch(self, tool, args, provider, key, cache_name):
+        value = call_with_retry(provider, tool.invoke, args, is_error=is_error_result)
+        if not is_error_result(value):
+            self.set(provider, key, cache_name, args, value)
+        return value
+
+    async def ainvoke(self, tool, args):
+        """`invoke` as a coroutine; the tool call and the SQLite reads and writes run in a worker thread."""
+        metadata = tool.metadata or {}
+        cache_name = metadata.get("cache_name")
+        if not cache_name:
+            return await _run_tool(tool, args)
+
+        provider = metadata.get("provider", cache_name)
+        key = make_key(cache_name, args)
+        found, value = await asyncio.to_thread(self.get, provider, key)
+        tracing.annotate(cache_hit=found, provider=provider)
+        if found:
+            return value
+
+        return await self._flight.ado(key, self._afetch, tool, args, provider, key, cache_name)
+
+    async def _afetch(self, tool, args, provider, key, cache_name):
+        value = await acall_with_retry(provider, _run_tool, tool, args, is_error=is_error_result)
+        if not is_error_result(value):
+            await asyncio.to_thread(self.set, provider, key, cache_name, args, value)
+        return value
+
+    def stats(self):
+        rows = self._conn().execute("SELECT provider, hits, misses FROM tool_cache_stats").fetchall()
+        size = self._conn().execute("SELECT COUNT(*) FROM tool_results").fetchone()[0]
+        return {
+            "entries": size,
+            "providers": {p: {"hits": h, "misses": m} for p, h, m in rows},
+        }
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM tool_results")
+            conn.execute("DELETE FROM tool_cache_stats")
+
+
+# Process-wide instance; the database file itself is shared by every app.
+tool_cache = ToolCache()
+
+
+if __name__ == "__main__":
+    print(json.dumps(tool_cache.stats(), indent=2))
@@ -0,0 +1,201 @@
+"""
+Shrinks raw tool output before it goes back into the prompt.
+
+Results are parsed into records (one per Tavily hit, arXiv entry or
+Wikipedia page), boilerplate and duplicates are dropped, the records are
+ranked against the user query with BM25 and the best ones are kept up to a
+token budget.
+"""
+import logging
+import math
+import os
+import re
+from collections import Counter
+
+from conversation_memory import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+TOKEN_BUDGET = int(os.getenv("TOOL_OUTPUT_TOKEN_BUDGET", "2000"))
+
+BOILERPLATE = re.compile(
+    r"cookie|subscribe|sign in|sign up|log in|all rights reserved|privacy policy|terms of use|"
+    r"enable javascript|share on|follow us|skip to (main )?content|advertisement|newsletter",
+    re.IGNORECASE,
+)
+
+
+def _tokens(text: str):
+    return re.findall(r"[a-z0-9]+", text.lower())
+
+
+# -------------------------------
+# Parsing
+# -------------------------------
+def _parse_fields(block: str, fields):
+    record = {}
+    pattern = r"^(%s):\s*" % "|".join(fields)
+    parts = re.split(pattern, block.strip(), flags=re.MULTILINE)
+    # parts = ["", field, value, field, value, ...]
+    for field, value in zip(parts[1::2], parts[2::2]):
+        record[field.lower()] = value.strip()
+    return record
+
+
+def parse_records(result):
+    """Turns a raw tool result into a list of {"title", "url", "meta", "text"} records."""
+    if isinstance(result, dict) and isinstance(result.get("results"), list):
+        return [
+            {"title": r.get("title") or "", "url": r.get("url") or "", "meta": "", "text": r.get("content") or ""}
+            for r in result["results"]
+        ]
+
+    if isinstance(result, list) and result and all(isinstance(r, dict) and "abs_url" in r for r in result):
+        # Structured arXiv records (arxiv_records.py); the id is what the review model cites
+        return [
+            {
+                "title": r["title"],
+                "url": r["abs_url"],
+                "meta": " | ".join(filter(None, (f"arXiv:{r['id']}", ", ".join(r["authors"][:5]), str(r["year"] or "")))),
+                "text": r["abstract"] or "",
+            }
+            for r in result
+        ]
+
+    text = str(result)
+    if text.startswith("Published:"):
+        records = []
+        for block in re.split(r"\n\n(?=Published: )", text):
+            fields = _parse_fields(block, ["Published", "Title", "Authors", "Summary"])
+            meta = " | ".join(v for v in (fields.get("authors"), fields.get("published")) if v)
+            records.append({"title": fields.get("title", ""), "url": "", "meta": meta, "text": fields.get("summary", "")})
+        return records
+
+    if text.startswith("Page:"):
+        records = []
+        for block in re.split(r"\n\n(?=Page: )", text):
+            fields = _parse_fields(block, ["Page", "Summary"])
+            records.append({"title": fields.get("page", ""), "url": "", "meta": "", "text": fields.get("summary", "")})
+        return records
+
+    return [{"title": "", "url": "", "meta": "", "text": text}]
+
+
+# -------------------------------
+# Cleaning and de-duplication
+# -------------------------------
+def clean_text(text: str) -> str:
+    sentences = re.split(r"(?<=[.!?])\s+|\n+", text)
+    kept = [s.strip() for s in sentences if s.strip() and not BOILERPLATE.search(s)]
+    return " ".join(" ".join(kept).split())
+
+
+def _shingles(text: str, size: int = 5):
+    words = _tokens(text)
+    return {tuple(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+
+
+def dedupe(records, threshold: float = 0.8):
+    seen_keys, seen_shingles, unique = set(), [], []
+    for record in records:
+        keys = {k for k in (record["url"].rstrip("/").lower(), " ".join(_tokens(record["title"]))) if k}
+        if keys & seen_keys:
+            continue
+        shingles = _shingles(record["text"])
+        if any(len(shingles & other) / max(1, len(shingles | other)) >= threshold for other in seen_shingles):
+            continue
+        seen_keys |= keys
+        seen_shingles.append(shingles)
+        unique.append(record)
+    return unique
+
+
+# -------------------------------
+# BM25 ranking
+# -------------------------------
+def bm25_scores(query: str, documents, k1: float = 1.5, b: float = 0.75):
+    docs = [_tokens(d) for d in documents]
+    if not docs:
+        return []
+    avg_len = sum(len(d) for d in docs) / len(docs) or 1
+    df = Counter(term for d in docs for term in set(d))
+    query_terms = _tokens(query)
+    scores = []
+    for d in docs:
+        tf = Counter(d)
+        score = 0.0
+        for term in query_terms:
+            if term not in tf:
+                continue
+            idf = math.log(1 + (len(docs) - df[term] + 0.5) / (df[term] + 0.5))
+            score += idf * tf[term] * (k1 + 1) / (tf[term] + k1 * (1 - b + b * len(d) / avg_len))
+        scores.append(score)
+    return scores
+
+
+def render(record) -> str:
+    header = record["title"] or "Result"
+    if record["url"]:
+        header += f" ({record['url']})"
+    lines = [header]
+    if record["meta"]:
+        lines.append(record["meta"])
+    if record["text"]:
+        lines.append(record["text"])
+    return "\n".join(lines)
+
+
+def compact(result, query: str, token_budget: int = TOKEN_BUDGET, tool_name: str = "tool", seen=None) -> str:
+    """
+    Returns a compact text rendering of `result` ranked for `query` and trimmed to `token_budget`.
+    With `seen` (vector_index.SeenRecords), records that repeat a paper already shown are dropped.
+    Never returns an empty string: with nothing left to show it says why, so the model does not search again.
+    """
+    raw = str(result)
+    records = parse_records(result)
+    total = len(records)
+    for record in records:
+        record["text"] = clean_text(record["text"])
+    records = dedupe([r for r in records if r["title"] or r["text"]])
+    found = records
+    if seen is not None:
+        records = seen.collapse(records)
+
+    scores = bm25_scores(query, [f"{r['title']} {r['title']} {r['text']}" for r in records])
+    ranked = [r for _, r in sorted(zip(scores, records), key=lambda pair: -pair[0])]
+
+    parts, used = [], 0
+    for record in ranked:
+        text = render(record)
+        cost = estimate_tokens(text)
+        if used + cost > token_budget:
+            remaining_chars = (token_budget - used) * 4
+            if remaining_chars > 200:
+                parts.append(text[:remaining_chars].rsplit(" ", 1)[0] + " ...")
+            break
+        parts.append(text)
+        used += cost
+    if seen is not None:
+        seen.add(ranked[:len(parts)])
+
+    compacted = "\n\n".join(f"[{i}] {part}" for i, part in enumerate(parts, start=1))
+    if not ranked:
+        compacted = _empty_note(found, tool_name)
+    before, after = estimate_tokens(raw), estimate_tokens(compacted)
+    logger.info(
+        "Compacted %s output: %d -> %d tokens (saved %d), %d of %d records kept",
+        tool_name, before, after, before - after, len(parts), total,
+    )
+    return compacted
+
+
+def _empty_note(found, tool_name: str, listed: int = 10) -> str:
+    """What the model gets instead of an empty result: the papers it has already seen, or that there was nothing."""
+    if not found:
+        return f"No results from {tool_name} for this query."
+    names = [
+        (r["title"] or r["url"] or r["text"][:80]) + (f" ({r['meta'].split(' | ')[0]})" if r["meta"].startswith("arXiv:") else "")
+        for r in found[:listed]
+    ]
+    more = f" and {len(found) - listed} more" if len(found) > listed else ""
+    return f"All {len(found)} results repeat papers already shown: {'; '.join(names)}{more}."
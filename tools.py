@@ -1,45 +1,309 @@
-import os 
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_community.tools import ArxivQueryRun, WikipediaQueryRun
-from langchain_community.utilities import WikipediaAPIWrapper, ArxivAPIWrapper
-# from langchain_community.tools.tavily_search import TavilySearchResults
-from langchain_tavily import TavilySearch
+import tracing
+from tool_cache import tool_cache
 
-load_dotenv()
-os.environ["GOOGLE_API_KEY"] = os.getenv("GEMINI_API_KEY")
-os.environ["TAVILY_API_KEY"] = os.getenv("TAVILY_API_KEY")
+# Clients below are built on first use and then shared by the whole process,
+# so importing this module (or any app) costs no client setup or network I/O.
 
-arx_wrapper = ArxivAPIWrapper(top_k_results=10, doc_content_chars_max=2500)
-arxiv = ArxivQueryRun(api_wrapper=arx_wrapper, description="Searching relevant research papers on arXiv.")
+_lock = threading.RLock()
+_env_loaded = False
 
-# # tavily = TavilySearchResults()
-tavily = TavilySearch(max_results=3, search_depth="basic")
 
-wiki_wrapper = WikipediaAPIWrapper(top_k_results=3, doc_content_chars_max=150)
-wiki = WikipediaQueryRun(api_wrapper=wiki_wrapper, description="Searching relevant information on Wikipedia.")
+def load_env():
+    """Loads .env once and maps our key names onto the ones the SDKs expect, without overwriting."""
+    global _env_loaded
+    if _env_loaded:
+        return
+    with _lock:
+        load_dotenv()
+        if os.getenv("GEMINI_API_KEY"):
+            os.environ.setdefault("GOOGLE_API_KEY", os.environ["GEMINI_API_KEY"])
+        _env_loaded = True
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    max_tokens=None,
-)
 
-# arxiv_results = arxiv.invoke("Top papers on Quantum Computing")
-# print("----------------------------------------------------------------------------------------------\n")
-# print(arxiv_results)
+def lazy(factory):
+    """Turns a zero-argument factory into a process-wide singleton built on first call."""
+    instance = []
 
-# print("----------------------------------------------------------------------------------------------\n")
-# wiki_results = wiki.invoke("Python programming language")
-# print(wiki_results)
+    @wraps(factory)
+    def get():
+        if not instance:
+            with _lock:
+                if not instance:
+                    load_env()
+                    instance.append(factory())
+        return instance[0]
 
-# print("----------------------------------------------------------------------------------------------\n")
-# tavily_results = tavily.invoke({"query": "Latest advancements in artificial intelligence"})
-# # tavily_results = tavily.invoke("Latest advancements in artificial intelligence")
-# print(tavily_results)
+    def override(value):
+        """Replaces the singleton (e.g. with an offline stand-in for benchmarks)."""
+        with _lock:
+            instance[:] = [value]
 
-tools = [arxiv, tavily, wiki]
-llm_with_tools = llm.bind_tools(tools)
+    get.reset = instance.clear
+    get.override = override
+    return get
 
-if __name__ == "__main__":  
-    results = llm_with_tools.invoke("Explain the concept of reinforcement learning and provide recent research papers on knowledge graphs.")
+
+@lazy
+def get_http_session():
+    """One keep-alive connection pool for every search provider in this process."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class _PooledRequests:
+    """Stands in for the `requests` module inside SDKs that call requests.get/post directly."""
+
+    def __init__(self, session):
+        self._session = session
+
+    def get(self, *args, **kwargs):
+        return self._session.get(*args, **kwargs)
+
+    def post(self, *args, **kwargs):
+        return self._session.post(*args, **kwargs)
+
+    def __getattr__(self, name):
+        import requests
+        return getattr(requests, name)
+
+
+@lazy
+def use_pooled_http():
+    # Tavily and Wikipedia open a fresh connection per call; route them through the shared session.
+    import langchain_tavily._utilities
+    import wikipedia.wikipedia
+    pooled = _PooledRequests(get_http_session())
+    langchain_tavily._utilities.requests = pooled
+    wikipedia.wikipedia.requests = pooled
+    return pooled
+
+
+@lazy
+def get_arxiv_client():
+    import arxiv
+    return arxiv.Client()
+
+
+@lazy
+def get_llm():
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from rate_limiter import MAX_RETRIES, langchain_feedback, langchain_rate_limiter
+    return ChatGoogleGenerativeAI(
+        model="gemini-2.5-flash",
+        max_tokens=None,
+        # A 429 the client gives up on halves the "gemini" rate, as for the search tools
+        callbacks=[tracing.llm_tracer(), langchain_feedback("gemini")],
+        # Shares the "gemini" bucket; the client itself retries 429/5xx with jittered backoff
+        rate_limiter=langchain_rate_limiter("gemini"),
+        max_retries=MAX_RETRIES + 1,
+    )
+
+
+@lazy
+def get_arxiv():
+    # Typed records (id, title, authors, year, links, abstract) instead of a truncated text blob; see arxiv_records.py
+    from langchain_core.tools import StructuredTool
+    import arxiv_records
+    return StructuredTool.from_function(
+        arxiv_records.search,
+        name="arxiv",
+        description="Searching relevant research papers on arXiv. Each result carries its arXiv id.",
+        metadata={"cache_name": "arxiv_records", "provider": "arxiv", "records": True, "index": True},
+    )
+
+
+@lazy
+def get_tavily():
+    from langchain_tavily import TavilySearch
+    use_pooled_http()
+    return TavilySearch(max_results=3, search_depth="basic", metadata={"cache_name": "tavily", "provider": "tavily"})
+
+
+@lazy
+def get_tavily_new():
+    # Deeper web search used by the literature review agents
+    from langchain_tavily import TavilySearch
+    use_pooled_http()
+    return TavilySearch(
+        max_results=10,
+        search_depth="advanced",
+        metadata={"cache_name": "tavily_new", "provider": "tavily", "index": True},
+    )
+
+
+@lazy
+def get_tavily_cfp():
+    # WikiCFP-only search used by the conference agents
+    from langchain_tavily import TavilySearch
+    use_pooled_http()
+    return TavilySearch(
+        max_results=20,
+        search_depth="advanced",
+        include_domains=["wikicfp.com"],
+        metadata={"cache_name": "tavily_cfp", "provider": "tavily"},
+    )
+
+
+@lazy
+def get_wiki():
+    from langchain_community.tools import WikipediaQueryRun
+    from langchain_community.utilities import WikipediaAPIWrapper
+    use_pooled_http()
+    wiki_wrapper = WikipediaAPIWrapper(top_k_results=3, doc_content_chars_max=150)
+    return WikipediaQueryRun(
+        api_wrapper=wiki_wrapper,
+        description="Searching relevant information on Wikipedia.",
+        metadata={"cache_name": "wiki", "provider": "wikipedia"},
+    )
+
+
+def get_tools():
+    return [get_arxiv(), get_tavily(), get_wiki()]
+
+
+@lazy
+def get_llm_with_tools():
+    return get_llm().bind_tools(get_tools())
+
+
+# Older scripts still do `from tools import llm, tools`; resolve those names lazily.
+_legacy_names = {
+    "llm": get_llm,
+    "llm_with_tools": get_llm_with_tools,
+    "tools": get_tools,
+    "arxiv": get_arxiv,
+    "tavily": get_tavily,
+    "wiki": get_wiki,
+}
+
+
+def __getattr__(name):
+    if name in _legacy_names:
+        return _legacy_names[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# Shared pool so the tool calls of one model turn run side by side.
+tool_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tool")
+
+
+def _compact_results(tool_calls, results, tools_by_name, query: str, run_id: str = None):
+    """
+    Compacts each output for `query` and drops papers already shown in the
+    run (vector_index.SeenRecords). Structured arXiv results go first, so
+    their copy of a paper wins over a web page about it. Outputs of tools
+    marked "index" are added to the vector index.
+    """
+    import arxiv_records
+    import vector_index
+    from tool_compaction import compact, parse_records
+    seen = vector_index.seen_for(run_id) if run_id else vector_index.SeenRecords()
+    compacted = list(results)
+    order = sorted(range(len(tool_calls)), key=lambda i: not (tools_by_name[tool_calls[i]["name"]].metadata or {}).get("records"))
+    for i in order:
+        tool_name = tool_calls[i]["name"]
+        metadata = tools_by_name[tool_name].metadata or {}
+        with tracing.span("compact", tool_name) as active:
+            compacted[i] = compact(results[i], query, tool_name=tool_name, seen=seen)
+            active.set(compacted_chars=len(compacted[i]))
+        if metadata.get("index"):
+            if metadata.get("records") and isinstance(results[i], list):
+                papers = [arxiv_records.paper_fields(r) for r in results[i] if isinstance(r, dict)]
+            else:
+                papers = parse_records(results[i])
+            vector_index.paper_index.add(papers, source=metadata.get("cache_name"))
+    return compacted
+
+
+def run_tool_calls(tool_calls, available_tools, query: str = None, run_id: str = None):
+    """
+    Runs every tool call from one model turn concurrently and returns the
+    matching ToolMessages in the order the model asked for them.
+    With `query`, each output is compacted and ranked against it first.
+    `run_id` names the pipeline run: calls matching a search prefetched for
+    it (see prefetch.py) take that result instead of searching again, and
+    papers shown in earlier turns of the run are not repeated.
+    """
+    import arxiv_records
+    import prefetch
+    tools_by_name = {t.name: t for t in available_tools}
+
+    def run_one(call):
+        tool_name = call["name"]
+        with tracing.span("tool", tool_name, args=call["args"]) as active:
+            try:
+                prefetched = prefetch.claim(run_id, tool_name, call["args"]) if run_id else None
+                if prefetched is not None:
+                    active.set(prefetch_hit=True)
+                    tool_result = prefetched.result()
+                else:
+                    tool_result = tool_cache.invoke(tools_by_name[tool_name], call["args"])
+                if (tools_by_name[tool_name].metadata or {}).get("records"):
+                    arxiv_records.remember(tool_result)  # cached and prefetched results too
+            except Exception as e:
+                active.error = f"{type(e).__name__}: {e}"
+                tool_result = f"Error: {e}"
+            active.set(response_chars=len(str(tool_result)))
+        return tool_result
+
+    # Each call gets a copy of the caller's context so its span nests under the pipeline run
+    futures = [tool_executor.submit(contextvars.copy_context().run, run_one, call) for call in tool_calls]
+    results = [future.result() for future in futures]
+    if query:
+        results = _compact_results(tool_calls, results, tools_by_name, query, run_id)
+    return _tool_messages(tool_calls, results)
+
+
+async def arun_tool_calls(tool_calls, available_tools, query: str = None, run_id: str = None):
+    """run_tool_calls as a coroutine: the calls run as tasks (see tool_cache.ainvoke)."""
+    import arxiv_records
+    import prefetch
+    tools_by_name = {t.name: t for t in available_tools}
+
+    async def run_one(call):
+        tool_name = call["name"]
+        with tracing.span("tool", tool_name, args=call["args"]) as active:
+            try:
+                prefetched = prefetch.claim(run_id, tool_name, call["args"]) if run_id else None
+                if prefetched is not None:
+                    active.set(prefetch_hit=True)
+                    tool_result = await asyncio.wrap_future(prefetched)
+                else:
+                    tool_result = await tool_cache.ainvoke(tools_by_name[tool_name], call["args"])
+                if (tools_by_name[tool_name].metadata or {}).get("records"):
+                    arxiv_records.remember(tool_result)
+            except Exception as e:
+                active.error = f"{type(e).__name__}: {e}"
+                tool_result = f"Error: {e}"
+            active.set(response_chars=len(str(tool_result)))
+        return tool_result
+
+    results = await asyncio.gather(*(run_one(call) for call in tool_calls))
+    if query:
+        # Ranking and the vector index are CPU work: keep them off the event loop
+        results = await asyncio.to_thread(_compact_results, tool_calls, results, tools_by_name, query, run_id)
+    return _tool_messages(tool_calls, results)
+
+
+def _tool_messages(tool_calls, results):
+    from langchain_core.messages import ToolMessage
+    return [
+        ToolMessage(content=f"Tool '{call['name']}' output: {result}", name=call["name"], tool_call_id=call["id"])
+        for call, result in zip(tool_calls, results)
+    ]
+
+if __name__ == "__main__":
+    results = get_llm_with_tools().invoke("Explain the concept of reinforcement learning and provide recent research papers on knowledge graphs.")
     print(results)
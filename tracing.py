@@ -0,0 +1,364 @@
+"""
+Spans and metrics for pipeline runs, LLM calls and tool calls.
+
+Every finished span is appended to a JSON-lines file (TRACE_FILE, default
+.cache/traces.jsonl; "off" disables it), which is rotated to
+traces.jsonl.1 once it reaches TRACE_MAX_BYTES, and folded into in-process
+counters and latency histograms, served in Prometheus text format at the
+backend's /metrics. Spans nest through a context variable, so an LLM or
+tool span records the pipeline run it belongs to.
+
+    python tracing.py            # latency percentiles per span from the trace file
+"""
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+CACHE_DIR = os.getenv("RESEARCH_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join(CACHE_DIR, "traces.jsonl"))
+TRACE_MAX_BYTES = int(os.getenv("TRACE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_current = contextvars.ContextVar("current_span", default=None)
+_lock = threading.Lock()
+_trace_file = None
+
+
+class Span:
+    def __init__(self, kind: str, name: str, parent=None, **attrs):
+        self.kind = kind
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attrs = attrs
+        self.error = None
+        self.start = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, **amounts):
+        for key, amount in amounts.items():
+            self.attrs[key] = self.attrs.get(key, 0) + amount
+
+    def finish(self, error=None):
+        self.duration = time.perf_counter() - self._started
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}" if isinstance(error, BaseException) else str(error)
+        _export(self)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "kind": self.kind,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_s": round(self.duration, 6),
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+            "attrs": self.attrs,
+        }
+
+
+def current():
+    return _current.get()
+
+
+def annotate(**attrs):
+    """Sets attributes on the current span, if there is one."""
+    active = _current.get()
+    if active is not None:
+        active.set(**attrs)
+
+
+def start_span(kind: str, name: str, parent=None, **attrs) -> Span:
+    """Starts a span without making it current (for callbacks that finish it elsewhere)."""
+    return Span(kind, name, parent if parent is not None else _current.get(), **attrs)
+
+
+@contextmanager
+def span(kind: str, name: str, **attrs):
+    active = start_span(kind, name, **attrs)
+    token = _current.set(active)
+    try:
+        yield active
+    except BaseException as e:
+        _current.reset(token)
+        active.finish(e)
+        raise
+    _current.reset(token)
+    active.finish()
+
+
+def traced(kind: str = "pipeline", name: str = None):
+    """Decorator that runs a function (generator, coroutine) inside a span; a returned {"error": ...} marks it failed."""
+    def decorate(fn):
+        span_name = name or fn.__name__
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(kind, span_name) as active:
+                    result = await fn(*args, **kwargs)
+                    if isinstance(result, dict) and "error" in result:
+                        active.error = str(result["error"])
+                    return result
+            return async_wrapper
+
+        if inspect.isasyncgenfunction(fn):
+            @functools.wraps(fn)
+            async def async_gen_wrapper(*args, **kwargs):
+                active = start_span(kind, span_name)
+                error = None
+                try:
+                    iterator = fn(*args, **kwargs)
+                    while True:
+                        token = _current.set(active)
+                        try:
+                            item = await iterator.__anext__()
+                        except StopAsyncIteration:
+                            break
+                        finally:
+                            _current.reset(token)
+                        active.add(chunks=1)
+                        yield item
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    active.finish(error)
+            return async_gen_wrapper
+
+        if inspect.isgeneratorfunction(fn):
+            @functools.wraps(fn)
+            def gen_wrapper(*args, **kwargs):
+                active = start_span(kind, span_name)
+                error = None
+                try:
+                    iterator = fn(*args, **kwargs)
+                    while True:
+                        token = _current.set(active)
+                        try:
+                            item = next(iterator)
+                        except StopIteration:
+                            break
+                        finally:
+                            _current.reset(token)
+                        active.add(chunks=1)
+                        yield item
+                except BaseException as e:
+                    error = e
+                    raise
+                finally:
+                    active.finish(error)
+            return gen_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(kind, span_name) as active:
+                result = fn(*args, **kwargs)
+                if isinstance(result, dict) and "error" in result:
+                    active.error = str(result["error"])
+                return result
+        return wrapper
+    return decorate
+
+
+# -------------------------------
+# Metrics
+# -------------------------------
+_counters = defaultdict(float)      # (metric, labels) -> value
+_histograms = {}                    # (kind, name) -> [bucket counts..., sum, count]
+
+
+def _labels(**labels):
+    return tuple(sorted(labels.items()))
+
+
+def increment(metric: str, amount: float = 1, **labels):
+    """Adds to a counter served at /metrics (for events that are not spans)."""
+    with _lock:
+        _counters[(metric, _labels(**labels))] += amount
+
+
+def _record(active: Span):
+    key = (active.kind, active.name)
+    status = "error" if active.error else "ok"
+    attrs = active.attrs
+    with _lock:
+        _counters[("research_spans_total", _labels(kind=active.kind, name=active.name, status=status))] += 1
+        if attrs.get("cache_hit"):
+            _counters[("research_cache_hits_total", _labels(kind=active.kind, name=active.name))] += 1
+        for direction in ("input", "output"):
+            tokens = attrs.get(f"{direction}_tokens")
+            if tokens:
+                _counters[("research_tokens_total", _labels(name=active.name, direction=direction))] += tokens
+        for field in ("prompt_chars", "response_chars"):
+            if attrs.get(field):
+                _counters[(f"research_{field}_total", _labels(kind=active.kind, name=active.name))] += attrs[field]
+        histogram = _histograms.setdefault(key, [0] * (len(BUCKETS) + 2))
+        for i, bound in enumerate(BUCKETS):
+            if active.duration <= bound:
+                histogram[i] += 1
+        histogram[-2] += active.duration
+        histogram[-1] += 1
+
+
+def _export(active: Span):
+    global _trace_file
+    _record(active)
+    if TRACE_FILE == "off":
+        return
+    line = json.dumps(active.to_dict(), default=str) + "\n"
+    with _lock:
+        _rotate()
+        if _trace_file is None:
+            os.makedirs(os.path.dirname(TRACE_FILE), exist_ok=True)
+            _trace_file = open(TRACE_FILE, "a", encoding="utf-8")
+        _trace_file.write(line)
+        _trace_file.flush()
+
+
+def _rotate():
+    """Moves a full trace file to TRACE_FILE.1 (replacing the older one); reopens after any process rotated it."""
+    global _trace_file
+    try:
+        stat = os.stat(TRACE_FILE)
+    except OSError:
+        stat = None
+    if stat is not None and stat.st_size >= TRACE_MAX_BYTES:
+        try:
+            os.replace(TRACE_FILE, TRACE_FILE + ".1")
+            stat = None
+        except OSError:
+            pass  # e.g. open in another process on Windows; try again with the next span
+    if _trace_file is not None and (stat is None or os.fstat(_trace_file.fileno()).st_ino != stat.st_ino):
+        _trace_file.close()
+        _trace_file = None
+
+
+def _format_labels(labels) -> str:
+    return ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in labels)
+
+
+def prometheus_text() -> str:
+    """Counters and span latency histograms in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted((k, list(v)) for k, v in _histograms.items())
+    seen = set()
+    for (metric, labels), value in counters:
+        if metric not in seen:
+            seen.add(metric)
+            lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric}{{{_format_labels(labels)}}} {value:g}")
+
+    lines.append("# TYPE research_span_duration_seconds histogram")
+    for (kind, name), histogram in histograms:
+        labels = _format_labels(_labels(kind=kind, name=name))
+        for bound, count in zip(BUCKETS, histogram):
+            lines.append(f'research_span_duration_seconds_bucket{{{labels},le="{bound}"}} {count}')
+        lines.append(f'research_span_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram[-1]}')
+        lines.append(f"research_span_duration_seconds_sum{{{labels}}} {histogram[-2]:.6f}")
+        lines.append(f"research_span_duration_seconds_count{{{labels}}} {histogram[-1]}")
+    return "\n".join(lines) + "\n"
+
+
+# -------------------------------
+# LLM callbacks
+# -------------------------------
+def structured_schema_name(invocation_params):
+    """Schema name when a call is with_structured_output (one tool, forced), else None."""
+    params = invocation_params or {}
+    tools = params.get("tools") or []
+    if params.get("tool_choice") and len(tools) == 1:
+        tool = tools[0]
+        return (tool.get("function") or tool).get("name") if isinstance(tool, dict) else getattr(tool, "__name__", None)
+    return None
+
+
+def llm_tracer():
+    """Callback handler that opens a span for every chat model call (attach with `callbacks=[...]`)."""
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class LLMTracer(BaseCallbackHandler):
+        def __init__(self):
+            self._spans = {}
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, invocation_params=None, **kwargs):
+            metadata = metadata or {}
+            prompt_chars = sum(len(str(m.content)) for batch in messages for m in batch)
+            self._spans[run_id] = start_span(
+                "llm", metadata.get("ls_model_name") or "chat_model",
+                prompt_chars=prompt_chars,
+                messages=sum(len(batch) for batch in messages),
+                structured=structured_schema_name(invocation_params),
+            )
+
+        def on_llm_end(self, response, *, run_id, **kwargs):
+            active = self._spans.pop(run_id, None)
+            if active is None:
+                return
+            generation = response.generations[0][0] if response.generations and response.generations[0] else None
+            message = getattr(generation, "message", None)
+            usage = getattr(message, "usage_metadata", None) or {}
+            active.set(
+                response_chars=len(str(message.content)) if message is not None else 0,
+                tool_calls=len(getattr(message, "tool_calls", None) or []),
+                input_tokens=usage.get("input_tokens"),
+                output_tokens=usage.get("output_tokens"),
+                cache_hit=False,
+            )
+            active.finish()
+
+        def on_llm_error(self, error, *, run_id, **kwargs):
+            active = self._spans.pop(run_id, None)
+            if active is not None:
+                active.finish(error)
+
+    return LLMTracer()
+
+
+def summarize(path: str = TRACE_FILE):
+    """Latency percentiles per (kind, name) from a trace file (and its rotated predecessor)."""
+    durations = defaultdict(list)
+    errors = defaultdict(int)
+    for part in (path + ".1", path):
+        if not os.path.exists(part):
+            continue
+        with open(part, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                key = (record["kind"], record["name"])
+                durations[key].append(record["duration_s"])
+                errors[key] += record["status"] == "error"
+
+    def pct(values, q):
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    print(f"{'kind':<10}{'name':<28}{'count':>7}{'errors':>8}{'p50 (s)':>10}{'p95 (s)':>10}{'p99 (s)':>10}")
+    for key, values in sorted(durations.items(), key=lambda item: -sum(item[1])):
+        values.sort()
+        print(f"{key[0]:<10}{key[1][:27]:<28}{len(values):>7}{errors[key]:>8}"
+              f"{pct(values, 0.5):>10.3f}{pct(values, 0.95):>10.3f}{pct(values, 0.99):>10.3f}")
+
+
+if __name__ == "__main__":
+    summarize()
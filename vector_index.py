@@ -0,0 +1,358 @@
+"""
+Embedding index over every abstract the review tools have retrieved.
+
+Vectors are float32 rows in a memory-mapped matrix (.cache/vector_index/vectors.f32);
+titles, links and abstracts sit next to it in SQLite, row for row. Search
+is cosine top-k over the matrix in batches, so the index never has to fit
+in memory at once. review_papers uses it to add semantically close papers
+from earlier runs to the prompt, and tool results go through SeenRecords,
+which drops a paper already shown in the same run (e.g. found by both
+arXiv and Tavily) before it reaches the LLM.
+
+The embedder is pluggable: VECTOR_EMBEDDER="module:factory" loads any
+object with `name`, `dim` and `embed(texts) -> float32 array`. The
+default HashingEmbedder needs no model or network. Changing the embedder
+re-embeds the stored abstracts on first use.
+
+    python vector_index.py "graph neural networks for molecules"
+"""
+import hashlib
+import importlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+import numpy as np
+
+from paper_library import STOPWORDS, paper_key
+
+CACHE_DIR = os.getenv("RESEARCH_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+INDEX_DIR = os.getenv("VECTOR_INDEX_DIR", os.path.join(CACHE_DIR, "vector_index"))
+EMBEDDER = os.getenv("VECTOR_EMBEDDER", "hashing")
+RELATED_MIN_SCORE = float(os.getenv("VECTOR_RELATED_MIN_SCORE", "0.25"))
+# Two records are the same paper when their titles or their full texts are this close
+DUPLICATE_TITLE_SCORE = float(os.getenv("VECTOR_DUPLICATE_TITLE_SCORE", "0.85"))
+DUPLICATE_SCORE = float(os.getenv("VECTOR_DUPLICATE_SCORE", "0.9"))
+BATCH_ROWS = 65536
+
+
+# -------------------------------
+# Embedders
+# -------------------------------
+def _features(text: str):
+    words = [w for w in re.findall(r"[a-z0-9]+", text.lower()) if w not in STOPWORDS and len(w) > 1]
+    # Light stemming so "segmentation"/"segmentations" and "image"/"images" share a feature
+    words = [w[:-1] if w.endswith("s") and len(w) > 4 else w for w in words]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+class HashingEmbedder:
+    """Signed feature hashing of words and word pairs, log-scaled and L2-normalized."""
+
+    def __init__(self, dim: int = 1024):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _slot(self, feature: str):
+        digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        return value % self.dim, 1.0 if value >> 63 else -1.0
+
+    def embed(self, texts):
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for feature in _features(text or ""):
+                slot, sign = self._slot(feature)
+                matrix[i, slot] += sign
+        np.copyto(matrix, np.sign(matrix) * np.log1p(np.abs(matrix)))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms == 0, 1, norms)
+
+
+_embedder = []
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """The configured embedder (VECTOR_EMBEDDER), built once per process."""
+    with _embedder_lock:
+        if not _embedder:
+            if EMBEDDER == "hashing":
+                _embedder.append(HashingEmbedder())
+            else:
+                module, factory = EMBEDDER.split(":")
+                _embedder.append(getattr(importlib.import_module(module), factory)())
+        return _embedder[0]
+
+
+def record_text(record) -> str:
+    return f"{record.get('title') or ''}. {record.get('abstract') or record.get('text') or ''}"
+
+
+def _title(record) -> str:
+    # Web copies often append " - overview", " | Journal" and the like
+    return re.split(r"\s+[-|–]\s+(?=[^-|–]*$)", record.get("title") or "")[0]
+
+
+# -------------------------------
+# Index
+# -------------------------------
+class VectorIndex:
+    def __init__(self, directory: str = INDEX_DIR, embedder=None):
+        self.directory = directory
+        self._embedder = embedder
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self._matrix = None
+        self._checked = False
+
+    @property
+    def embedder(self):
+        return self._embedder or get_embedder()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(self.directory, exist_ok=True)
+            conn = sqlite3.connect(os.path.join(self.directory, "docs.sqlite3"), timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS docs (
+                    row INTEGER PRIMARY KEY,
+                    key TEXT UNIQUE NOT NULL,
+                    title TEXT,
+                    authors TEXT,
+                    year INTEGER,
+                    link TEXT,
+                    abstract TEXT,
+                    source TEXT,
+                    added_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS index_meta (name TEXT PRIMARY KEY, value TEXT);
+            """)
+            self._local.conn = conn
+        return conn
+
+    @property
+    def _path(self):
+        return os.path.join(self.directory, "vectors.f32")
+
+    def _rows(self, conn) -> int:
+        return conn.execute("SELECT COALESCE(MAX(row), 0) FROM docs").fetchone()[0]
+
+    def _open(self, rows: int):
+        """Memory-maps the vector file with room for at least `rows` rows, growing it by doubling."""
+        dim = self.embedder.dim
+        if self._matrix is not None and self._matrix.shape[0] >= rows:
+            return self._matrix
+        capacity = max(1024, self._matrix.shape[0] if self._matrix is not None else 0)
+        on_disk = os.path.getsize(self._path) // (4 * dim) if os.path.exists(self._path) else 0
+        capacity = max(capacity, on_disk)
+        while capacity < rows:
+            capacity *= 2
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        with open(self._path, "ab") as f:
+            if f.tell() < capacity * dim * 4:
+                f.truncate(capacity * dim * 4)
+        self._matrix = np.memmap(self._path, dtype=np.float32, mode="r+", shape=(capacity, dim))
+        return self._matrix
+
+    def _check_embedder(self, conn):
+        """Re-embeds every stored abstract when the embedder changed since the vectors were written."""
+        if self._checked:
+            return
+        self._checked = True
+        row = conn.execute("SELECT value FROM index_meta WHERE name = 'embedder'").fetchone()
+        if row and row[0] == self.embedder.name:
+            return
+        docs = conn.execute("SELECT row, title, abstract FROM docs ORDER BY row").fetchall()
+        if os.path.exists(self._path):
+            os.remove(self._path)
+        self._matrix = None
+        if docs:
+            matrix = self._open(docs[-1]["row"])
+            for start in range(0, len(docs), 1024):
+                batch = docs[start:start + 1024]
+                vectors = self.embedder.embed([record_text(dict(d)) for d in batch])
+                matrix[[d["row"] - 1 for d in batch]] = vectors
+            matrix.flush()
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO index_meta(name, value) VALUES ('embedder', ?)", (self.embedder.name,))
+
+    def add(self, records, source: str = None) -> int:
+        """
+        Stores records ({"title", "abstract" or "text", "link" or "url", ...})
+        not already indexed, skipping near-duplicates of stored ones.
+        Returns how many were added.
+        """
+        records = [r for r in records if r.get("title") and (r.get("abstract") or r.get("text"))]
+        if not records:
+            return 0
+        conn = self._conn()
+        with self._lock:
+            self._check_embedder(conn)
+            keys = [paper_key({"title": r["title"], "link": r.get("link") or r.get("url")}) for r in records]
+            known = {row[0] for row in conn.execute(
+                f"SELECT key FROM docs WHERE key IN ({','.join('?' * len(keys))})", keys,
+            )}
+            fresh = [(k, r) for k, r in zip(keys, records) if k not in known]
+            if not fresh:
+                return 0
+            vectors = self.embedder.embed([record_text(r) for _, r in fresh])
+            similar = vectors @ vectors.T
+            keep = []
+            for i, best in enumerate(self._best_scores(conn, vectors)):
+                if best < DUPLICATE_SCORE and (not keep or similar[i, keep].max() < DUPLICATE_SCORE):
+                    keep.append(i)
+            if not keep:
+                return 0
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")  # row numbers are shared with other processes
+                first = self._rows(conn) + 1
+                for offset, i in enumerate(keep):
+                    key, r = fresh[i]
+                    conn.execute(
+                        "INSERT INTO docs(row, key, title, authors, year, link, abstract, source, added_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            first + offset, key, r["title"],
+                            json.dumps(r["authors"]) if r.get("authors") else None, r.get("year"),
+                            r.get("link") or r.get("url"), r.get("abstract") or r.get("text"), source, time.time(),
+                        ),
+                    )
+                matrix = self._open(first + len(keep) - 1)
+                matrix[first - 1:first - 1 + len(keep)] = vectors[keep]
+                matrix.flush()
+        return len(keep)
+
+    def _best_scores(self, conn, vectors):
+        """Highest cosine similarity of each vector against the stored ones."""
+        rows = self._rows(conn)
+        best = np.full(len(vectors), -1.0, dtype=np.float32)
+        if rows == 0:
+            return best
+        matrix = self._open(rows)
+        for start in range(0, rows, BATCH_ROWS):
+            scores = matrix[start:min(rows, start + BATCH_ROWS)] @ vectors.T
+            np.maximum(best, scores.max(axis=0), out=best)
+        return best
+
+    def search(self, query: str, k: int = 5, min_score: float = 0.0):
+        """Top-k distinct stored papers by cosine similarity to `query`, each with its `score`."""
+        hits = self._search(query, 2 * k, min_score)
+        if not hits:
+            return hits
+        titles = self.embedder.embed([_title(hit) for hit in hits])
+        distinct = []
+        for i, hit in enumerate(hits):
+            if all(float(titles[i] @ titles[j]) < DUPLICATE_TITLE_SCORE for j in distinct):
+                distinct.append(i)
+        return [hits[i] for i in distinct[:k]]
+
+    def _search(self, query: str, k: int, min_score: float):
+        conn = self._conn()
+        with self._lock:
+            self._check_embedder(conn)
+            rows = self._rows(conn)
+            if rows == 0:
+                return []
+            vector = self.embedder.embed([query])[0]
+            matrix = self._open(rows)
+            top_scores, top_rows = np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+            for start in range(0, rows, BATCH_ROWS):
+                scores = matrix[start:min(rows, start + BATCH_ROWS)] @ vector
+                count = min(k, len(scores))
+                best = np.argpartition(-scores, count - 1)[:count]
+                top_scores = np.concatenate([top_scores, scores[best]])
+                top_rows = np.concatenate([top_rows, best + start])
+        order = np.argsort(-top_scores)[:k]
+        hits = []
+        for score, row in zip(top_scores[order], top_rows[order]):
+            if score < min_score:
+                break
+            doc = conn.execute("SELECT * FROM docs WHERE row = ?", (int(row) + 1,)).fetchone()
+            if doc is not None:
+                paper = dict(doc)
+                paper["authors"] = json.loads(paper["authors"]) if paper["authors"] else None
+                paper["score"] = round(float(score), 4)
+                hits.append(paper)
+        return hits
+
+    def count(self) -> int:
+        return self._rows(self._conn())
+
+
+class SeenRecords:
+    """Papers already shown to the model in one run; collapse() drops new records that duplicate them."""
+
+    def __init__(self, embedder=None):
+        self.embedder = embedder or get_embedder()
+        self.titles = np.zeros((0, self.embedder.dim), dtype=np.float32)
+        self.texts = np.zeros((0, self.embedder.dim), dtype=np.float32)
+        self.collapsed = 0
+        self._lock = threading.Lock()
+
+    def _embed(self, records):
+        return self.embedder.embed([_title(r) for r in records]), self.embedder.embed([record_text(r) for r in records])
+
+    def collapse(self, records):
+        """Returns `records` without the near-duplicates of papers seen before (or earlier in the list)."""
+        if not records:
+            return records
+        titles, texts = self._embed(records)
+        kept = []
+        with self._lock:
+            for i, record in enumerate(records):
+                title_scores = np.concatenate([self.titles @ titles[i], titles[kept] @ titles[i]])
+                text_scores = np.concatenate([self.texts @ texts[i], texts[kept] @ texts[i]])
+                has_title = bool(_title(record).strip())
+                if (has_title and title_scores.size and title_scores.max() >= DUPLICATE_TITLE_SCORE) or (
+                        text_scores.size and text_scores.max() >= DUPLICATE_SCORE):
+                    self.collapsed += 1
+                    continue
+                kept.append(i)
+        return [records[i] for i in kept]
+
+    def add(self, records):
+        if records:
+            titles, texts = self._embed(records)
+            with self._lock:
+                self.titles = np.vstack([self.titles, titles])
+                self.texts = np.vstack([self.texts, texts])
+
+
+_runs = {}
+_runs_lock = threading.Lock()
+
+
+def seen_for(run_id: str) -> SeenRecords:
+    """The SeenRecords of a pipeline run, created on first use."""
+    with _runs_lock:
+        if run_id not in _runs:
+            _runs[run_id] = SeenRecords()
+        return _runs[run_id]
+
+
+def forget(run_id: str) -> int:
+    """Drops a finished run's SeenRecords; returns how many records it collapsed."""
+    with _runs_lock:
+        seen = _runs.pop(run_id, None)
+    return seen.collapsed if seen else 0
+
+
+# Process-wide instance; the files themselves are shared by every app.
+paper_index = VectorIndex()
+
+
+if __name__ == "__main__":
+    query = " ".join(sys.argv[1:]) or input("Query: ")
+    print(f"{paper_index.count()} papers indexed")
+    for hit in paper_index.search(query, k=10):
+        print(f"  {hit['score']:.3f}  {hit['title']} ({hit['link'] or 'no link'})")
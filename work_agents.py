@@ -1,26 +1,488 @@
-from langgraph.graph import StateGraph
-from tools import llm,llm_with_tools
-from dotenv import load_dotenv
+"""
+Router plus a LangGraph graph that runs the review, conference and ideation agents.
+
+    router -> prepare -> agent <-> tools -> structured
+
+`router` picks the agent (unless the caller already chose one), `prepare`
+builds its prompt, `agent` is one model turn, `tools` runs the searches the
+model asked for, and `structured` writes the final answer (from the model's
+schema-tool call, or from the gathered notes) and turns it into the result
+dict. The loop stops at the same iteration/token budget as agent_loop.
+
+Every node's output is saved by a SQLite checkpointer (.cache/agent_checkpoints.sqlite3),
+keyed by a thread id derived from the agent and its inputs. Calling
+run_graph again after a crash, a refresh or a restart resumes the
+unfinished run from its last completed node instead of starting over;
+a finished run is returned as is for GRAPH_RESULT_TTL seconds. A run
+holds a lease on its thread, renewed while it runs: another run of the
+same thread (a batch run and a job worker, say) waits for it instead of
+resuming it in parallel, and only a thread whose lease went stale for
+GRAPH_LEASE_TTL seconds (its owner died) is taken over.
+
+stream_graph runs the same graph but yields the model output of the
+agent and structured nodes chunk by chunk, so callers can show the answer
+while it is written. Streamed review runs search with the search tools
+only and let the writer write the answer, since Gemini returns
+tool-call arguments in one piece but streams JSON text.
+
+The nodes are coroutines (ainvoke on the models and tools) and the graph
+runs on the shared event loop of aio.py, which owns its aiosqlite
+checkpointer; arun_graph awaits it from any loop, run_graph and
+stream_graph are the sync entry points.
+"""
+import asyncio
+import contextlib
+import hashlib
+import json
 import os
-from typing import Literal , Annotated
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Literal, Optional, TypedDict
 
-from typing import TypedDict
-from pydantic import BaseModel, Field 
-import operator
+from pydantic import BaseModel, Field
 
-load_dotenv()
-os.environ["GOOGLE_API_KEY"] = os.getenv("GEMINI_API_KEY")
-os.environ["TAVILY_API_KEY"] = os.getenv("TAVILY_API_KEY")
+import aio
+import prefetch
+import tracing
+from agent_loop import (
+    MAX_ITERATIONS, MAX_TOKENS, aanswer_tool_calls, count_tokens, finish_prompt, notes_messages, schema_answer,
+    search_finish_prompt, with_finish_prompt,
+)
+from tools import get_llm, get_tavily_cfp, lazy
+from llm_cache import cached
+from router_classifier import agent_router, aroute, route
+
+CACHE_DIR = os.getenv("RESEARCH_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+CHECKPOINT_DB = os.getenv("GRAPH_CHECKPOINT_DB", os.path.join(CACHE_DIR, "agent_checkpoints.sqlite3"))
+GRAPH_RESULT_TTL = float(os.getenv("GRAPH_RESULT_TTL", "3600"))
+LEASE_TTL = float(os.getenv("GRAPH_LEASE_TTL", "60"))
+LEASE_POLL = 1.0
 
 class RouterAgentSchema(BaseModel):
 
     trigger_agent : Literal["ideation_agent", "literature_review_agent","conference_agent"] = Field(description="The agent to trigger based on the user's query.")
     # trigger_agent : Annotated[str, Field(description="The agent to trigger based on the user's query."),operator.update]
 
-Router_Agent = llm.with_structured_output(RouterAgentSchema)
+@lazy
+def get_router_agent():
+    llm = get_llm()
+    return cached(llm.with_structured_output(RouterAgentSchema), model=llm.model, schema=RouterAgentSchema, normalize=True)
+
+
+def route_agent(user_query: str, session_cache=None):
+    """Chooses the agent locally when confident, otherwise asks Router_Agent."""
+    return route(
+        user_query,
+        {"trigger_agent": agent_router},
+        RouterAgentSchema,
+        lambda: get_router_agent().invoke(user_query),
+        session_cache,
+    )
+
+
+async def aroute_agent(user_query: str, session_cache=None):
+    return await aroute(
+        user_query,
+        {"trigger_agent": agent_router},
+        RouterAgentSchema,
+        lambda: get_router_agent().ainvoke(user_query),
+        session_cache,
+    )
+
+
+# -------------------------------
+# Agents
+# -------------------------------
+# Imported inside the functions: review and conference import this module.
+def _review_agent():
+    import review
+    return {
+        "llm": review.get_review_llm(),
+        "search_llm": review.get_review_search_llm(),
+        "tools": review.get_review_tools(),
+        "schema": review.ReviewDraft,
+        "writer": review.get_review_writer(),
+        "messages": lambda query, options: review.review_messages(query, **options),
+        "prefetch": lambda query: [(tool, query) for tool in review.get_review_tools()],
+        "result": review.review_result,
+    }
+
+
+def _conference_agent():
+    import conference
+    return {
+        "llm": conference.get_conference_llm(),
+        "tools": conference.get_conference_tools(),
+        "schema": conference.ConferenceList,
+        "writer": conference.get_conference_writer(),
+        "messages": lambda query, options: (conference.conference_messages(query), False),
+        "prefetch": lambda query: [(get_tavily_cfp(), query, conference.cfp_words())],
+        "result": conference.conference_result,
+    }
+
+
+def _ideation_agent():
+    import ideation
+    return {
+        "llm": ideation.get_ideation_llm(),
+        "tools": ideation.get_ideation_tools(),
+        "schema": None,
+        "writer": get_llm(),
+        "messages": lambda query, options: (ideation.build_messages(query, options.get("conversation", ())), False),
+        "prefetch": lambda query: [],
+        "result": lambda answer, query: {"answer": answer},
+    }
+
+
+AGENTS = {
+    "literature_review_agent": _review_agent,
+    "conference_agent": _conference_agent,
+    "ideation_agent": _ideation_agent,
+}
+
+
+class AgentState(TypedDict, total=False):
+    query: str
+    agent: Optional[str]
+    options: dict               # extra pipeline arguments (system_prompt, history, conversation)
+    stream: bool                # answer through the streaming writer (agents with a search_llm)
+    messages: list              # request, then every model turn and tool result
+    request_length: int         # how many of `messages` are the request itself
+    library_only: bool          # review answered from the local library, no search
+    tool_results: dict          # call key -> note, so repeated calls are not run again
+    iterations: int
+    tokens: int
+    answer: Any                 # schema answer as a dict, or the final text
+    result: Optional[dict]
+    finished_at: Optional[float]
+
+
+# -------------------------------
+# Nodes
+# -------------------------------
+async def router_node(state: AgentState):
+    if state.get("agent"):
+        return {}
+    return {"agent": (await aroute_agent(state["query"])).trigger_agent}
+
+
+def _thread_id(config) -> str:
+    return config["configurable"]["thread_id"]
+
+
+async def prepare_node(state: AgentState, config):
+    from langchain_core.messages import convert_to_messages
+    spec = AGENTS[state["agent"]]()
+    # Library lookups and the ideation router are sync: keep them off the event loop
+    messages, library_only = await asyncio.to_thread(spec["messages"], state["query"], state.get("options") or {})
+    if spec["schema"] is not None and not library_only:
+        streamed = state.get("stream") and "search_llm" in spec
+        messages = with_finish_prompt(messages, spec["schema"], search_finish_prompt if streamed else finish_prompt)
+    if not library_only:
+        # Likely first searches run while the agent node waits on the model
+        prefetch.start(_thread_id(config), spec["prefetch"](state["query"]))
+    messages = convert_to_messages(messages)
+    return {
+        "messages": messages,
+        "request_length": len(messages),
+        "library_only": library_only,
+        "tool_results": {},
+        "iterations": 0,
+        "tokens": 0,
+        "answer": None,
+        "result": None,
+        "finished_at": None,
+    }
+
+
+async def agent_node(state: AgentState):
+    spec = AGENTS[state["agent"]]()
+    prompt = list(state["messages"])
+    llm = spec["search_llm"] if state.get("stream") and "search_llm" in spec else spec["llm"]
+    response = await llm.ainvoke(prompt)
+    update = {"messages": prompt + [response], "tokens": state["tokens"] + count_tokens(prompt, response)}
+    if spec["schema"] is not None:
+        answer = schema_answer(response, spec["schema"])
+        if answer is not None:
+            update["answer"] = answer.model_dump()
+    elif not response.tool_calls:
+        update["answer"] = response.content
+    return update
+
+
+async def tools_node(state: AgentState, config):
+    spec = AGENTS[state["agent"]]()
+    tool_messages, new_results, _ = await aanswer_tool_calls(
+        state["messages"][-1].tool_calls, spec["tools"], state["query"], state["tool_results"],
+        verbose=spec["schema"] is not None, run_id=_thread_id(config), schema=spec["schema"],
+    )
+    return {
+        "messages": state["messages"] + tool_messages,
+        "tool_results": {**state["tool_results"], **new_results},
+        "iterations": state["iterations"] + 1,
+    }
+
+
+async def structured_node(state: AgentState, config):
+    spec = AGENTS[state["agent"]]()
+    answer, tokens = state.get("answer"), state["tokens"]
+    if answer is None:
+        # Budget ran out, or the model replied without calling the schema tool: write from the notes
+        request = state["messages"][:state["request_length"]]
+        if spec["schema"] is not None and not state["library_only"]:
+            request = request[:1] + request[2:]  # the finish prompt is for the search turns
+        prompt = notes_messages(request, state["tool_results"])
+        response = await spec["writer"].ainvoke(prompt)
+        tokens += count_tokens(prompt, response)
+        if spec["schema"] is None:
+            answer = response.content
+        else:
+            answer = response.model_dump() if hasattr(response, "model_dump") else response
+    if spec["schema"] is None:
+        from ideation import content_text
+        answer = content_text(answer)
+    stop = "max_iterations" if state["iterations"] >= MAX_ITERATIONS else "max_tokens" if tokens >= MAX_TOKENS else "done"
+    import vector_index
+    prefetched = {f"prefetch_{k}": v for k, v in prefetch.finish(_thread_id(config)).items()}
+    tracing.annotate(
+        agent=state["agent"], agent_iterations=state["iterations"], agent_tokens=tokens, agent_stop=stop,
+        collapsed_duplicates=vector_index.forget(_thread_id(config)), **prefetched,
+    )
+    return {
+        "answer": answer,
+        "tokens": tokens,
+        "result": await asyncio.to_thread(spec["result"], answer, state["query"]),
+        "finished_at": time.time(),
+    }
+
+
+def after_prepare(state: AgentState):
+    return "structured" if state["library_only"] else "agent"
+
+
+def after_agent(state: AgentState):
+    if state.get("answer") is not None or not state["messages"][-1].tool_calls:
+        return "structured"
+    return "tools"
+
+
+def after_tools(state: AgentState):
+    if state["iterations"] >= MAX_ITERATIONS or state["tokens"] >= MAX_TOKENS:
+        if AGENTS[state["agent"]]()["schema"] is not None:
+            print(" Agent loop stopped early (budget)")
+        return "structured"
+    return "agent"
+
+
+
+_graph = None
+
+
+async def get_graph():
+    """
+    The compiled graph, built on first call. Its checkpointer (aiosqlite)
+    belongs to the loop it was opened on, so this runs on aio's shared loop.
+    """
+    global _graph
+    if _graph is None:
+        import aiosqlite
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        os.makedirs(os.path.dirname(CHECKPOINT_DB), exist_ok=True)
+        conn = await aiosqlite.connect(CHECKPOINT_DB)
+        if _graph is None:
+            _graph = _builder().compile(checkpointer=AsyncSqliteSaver(conn))
+        else:
+            await conn.close()  # another run built it meanwhile
+    return _graph
+
+
+def _builder():
+    from langgraph.graph import END, START, StateGraph
+    builder = StateGraph(AgentState)
+    builder.add_node("router", router_node)
+    builder.add_node("prepare", prepare_node)
+    builder.add_node("agent", agent_node)
+    builder.add_node("tools", tools_node)
+    builder.add_node("structured", structured_node)
+    builder.add_edge(START, "router")
+    builder.add_edge("router", "prepare")
+    builder.add_conditional_edges("prepare", after_prepare, ["agent", "structured"])
+    builder.add_conditional_edges("agent", after_agent, ["tools", "structured"])
+    builder.add_conditional_edges("tools", after_tools, ["agent", "structured"])
+    builder.add_edge("structured", END)
+    return builder
+
+
+# -------------------------------
+# Thread leases
+# -------------------------------
+class RunLeases:
+    """Which run (host, process, run) is driving each checkpoint thread, with its last heartbeat."""
+
+    def __init__(self, path: str = CHECKPOINT_DB, ttl: float = LEASE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS graph_leases (
+                    thread_id TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    heartbeat REAL NOT NULL
+                )
+            """)
+            self._local.conn = conn
+        return conn
+
+    def acquire(self, thread_id: str, owner: str) -> bool:
+        """Takes (or renews) the lease unless another owner's is still fresh; True if `owner` holds it."""
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT INTO graph_leases(thread_id, owner, heartbeat) VALUES (?, ?, ?) "
+                "ON CONFLICT(thread_id) DO UPDATE SET owner = excluded.owner, heartbeat = excluded.heartbeat "
+                "WHERE graph_leases.owner = excluded.owner OR graph_leases.heartbeat < ?",
+                (thread_id, owner, now, now - self.ttl),
+            )
+            row = conn.execute("SELECT owner FROM graph_leases WHERE thread_id = ?", (thread_id,)).fetchone()
+        return row is not None and row[0] == owner
+
+    def release(self, thread_id: str, owner: str):
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM graph_leases WHERE thread_id = ? AND owner = ?", (thread_id, owner))
+
+
+run_leases = RunLeases()
+
+
+@contextlib.asynccontextmanager
+async def _leased(config):
+    """Holds the thread's lease (waiting while another live run holds it) and renews it until the block ends."""
+    thread_id = _thread_id(config)
+    owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+    waited = time.perf_counter()
+    while not await asyncio.to_thread(run_leases.acquire, thread_id, owner):
+        await asyncio.sleep(LEASE_POLL)
+    waited = time.perf_counter() - waited
+    if waited >= LEASE_POLL:
+        tracing.annotate(lease_wait_s=round(waited, 3))
+
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(run_leases.ttl / 3)
+            await asyncio.to_thread(run_leases.acquire, thread_id, owner)
+
+    beat = asyncio.create_task(heartbeat())
+    try:
+        yield
+    finally:
+        beat.cancel()
+        await asyncio.to_thread(run_leases.release, thread_id, owner)
+
+
+def thread_key(query: str, agent: str = None, **options) -> str:
+    """Checkpoint thread id for a run: the same agent and inputs give the same thread."""
+    payload = json.dumps([agent, query, options], sort_keys=True, default=str)
+    return f"{agent or 'auto'}-{hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]}"
+
+
+def run_graph(query: str, agent: str = None, thread_id: str = None, **options):
+    """
+    Runs one agent through the graph and returns its result dict. An
+    unfinished run on the same thread is resumed from its last checkpoint;
+    a finished one younger than GRAPH_RESULT_TTL is returned without
+    running again.
+    """
+    return aio.run(arun_graph(query, agent, thread_id, **options))
+
+
+async def arun_graph(query: str, agent: str = None, thread_id: str = None, timeout: float = None, **options):
+    """run_graph as a coroutine; raises TimeoutError (and stops the run) after `timeout` seconds."""
+    return await aio.call(_arun_graph(query, agent, thread_id, options), timeout)
+
+
+async def _arun_graph(query, agent, thread_id, options):
+    graph = await get_graph()
+    config = {"configurable": {"thread_id": thread_id or thread_key(query, agent, **options)}}
+    with tracing.span("graph", agent or "auto"):
+        async with _leased(config):
+            inputs, result = await _graph_input(graph, config, query, agent, options)
+            if result is not None:
+                return result
+            try:
+                final = await graph.ainvoke(inputs, config)
+            finally:
+                _end_run(config)
+    return final["result"]
+
+
+def _end_run(config):
+    """
+    Drops the run's prefetches and SeenRecords once the graph call is over,
+    also when it failed, timed out or was cancelled (structured_node only
+    runs on success). They live in this process only, so a later resume
+    from the checkpoint starts them afresh either way.
+    """
+    import vector_index
+    prefetch.finish(_thread_id(config))
+    vector_index.forget(_thread_id(config))
+
+
+async def _graph_input(graph, config, query, agent, options, stream=False):
+    """
+    (input, None) to run the thread: None as input resumes an unfinished run.
+    (None, result) when a finished result is still fresh.
+    Called with the thread's lease held, so an unfinished run found here
+    has no live owner.
+    """
+    saved = await graph.aget_state(config)
+    result = saved.values.get("result")
+    if saved.next:
+        tracing.annotate(resumed=True, resumed_at=",".join(saved.next))
+        return None, None
+    if result and "error" not in result and time.time() - (saved.values.get("finished_at") or 0) < GRAPH_RESULT_TTL:
+        tracing.annotate(checkpoint_hit=True)
+        return None, result
+    return {"query": query, "agent": agent, "options": options, "stream": stream}, None
+
+
+@tracing.traced("graph")
+def stream_graph(query: str, agent: str = None, thread_id: str = None, **options):
+    """
+    run_graph as a generator: yields ("chunk", AIMessageChunk) for the model
+    output of the agent and structured nodes as it arrives, then
+    ("result", result dict). A cached or checkpointed answer yields no chunks.
+    """
+    yield from aio.iterate(_astream_graph(query, agent, thread_id, options))
 
-result = Router_Agent.invoke("I want to understand about knowledge graphs in short. which agent should I use?")
-print(result)
 
+async def _astream_graph(query, agent, thread_id, options):
+    graph = await get_graph()
+    config = {"configurable": {"thread_id": thread_id or thread_key(query, agent, stream=True, **options)}}
+    async with _leased(config):
+        inputs, result = await _graph_input(graph, config, query, agent, options, stream=True)
+        if result is None:
+            try:
+                async for mode, item in graph.astream(inputs, config, stream_mode=["messages", "values"]):
+                    if mode == "values":
+                        result = item.get("result")
+                    elif item[1].get("langgraph_node") in ("agent", "structured"):
+                        yield "chunk", item[0]
+            finally:
+                _end_run(config)
+    yield "result", result
 
 
+if __name__ == "__main__":
+    result = route_agent("I want to understand about knowledge graphs in short. which agent should I use?")
+    print(result)